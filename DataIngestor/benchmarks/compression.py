@@ -0,0 +1,102 @@
+"""
+Compression ratio and encode/decode throughput of every codec Data ingestor supports
+
+Usage(from DataIngestor folder): python -m benchmarks.compression path/to/report.csv [more.csv ...]
+"""
+import argparse
+import json
+import time
+
+from src.compression import DEFAULT_LEVELS, compressor, decompressor
+
+
+def _timed(func, repeat: int) -> tuple:
+    """
+    Run func repeat times and keep the fastest run
+    :param func: function without arguments
+    :param repeat: number of runs
+    :return: best time in seconds and the result of the last run
+    :rtype: tuple
+    """
+    best = None
+    result = None
+    for _ in range(repeat):
+        started = time.perf_counter()
+        result = func()
+        elapsed = time.perf_counter() - started
+        best = elapsed if best is None else min(best, elapsed)
+    return best, result
+
+
+def benchmark(data: bytes, codec: str, level: int, chunk_size: int, repeat: int) -> dict:
+    """
+    Compress and decompress data chunk by chunk like the streaming ingest does
+    :param data: content of a report
+    :param codec: gzip or zstd
+    :param level: compression level
+    :param chunk_size: size of the chunks fed to the codec
+    :param repeat: number of runs, the fastest one is reported
+    :return: result row
+    :rtype: dict
+    """
+    def encode():
+        stream = compressor(codec, level)
+        parts = [stream.compress(data[i:i + chunk_size]) for i in range(0, len(data), chunk_size)]
+        parts.append(stream.flush())
+        return b''.join(parts)
+
+    encode_seconds, compressed = _timed(encode, repeat)
+
+    def decode():
+        stream = decompressor(codec)
+        return b''.join(stream.decompress(compressed[i:i + chunk_size])
+                        for i in range(0, len(compressed), chunk_size))
+
+    decode_seconds, decompressed = _timed(decode, repeat)
+    assert decompressed == data, f"{codec} round trip changed the content"
+    mb = len(data) / 1024 / 1024
+    return {
+        'codec': codec,
+        'level': level,
+        'bytes': len(data),
+        'compressed_bytes': len(compressed),
+        'ratio': round(len(data) / len(compressed), 2),
+        'encode_mb_per_second': round(mb / encode_seconds, 1),
+        'decode_mb_per_second': round(mb / decode_seconds, 1),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('files', nargs='+', help='CSV files to compress')
+    parser.add_argument('--levels', default=None,
+                        help='comma separated codec:level pairs, e.g. gzip:1,gzip:6,zstd:3,zstd:19')
+    parser.add_argument('--chunk-size', type=int, default=8 * 1024 * 1024)
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--json', action='store_true', help='print results as JSON')
+    args = parser.parse_args()
+    if args.levels:
+        levels = [(pair.split(':')[0], int(pair.split(':')[1])) for pair in args.levels.split(',')]
+    else:
+        levels = list(DEFAULT_LEVELS.items())
+    data = b''
+    for file_name in args.files:
+        with open(file_name, 'rb') as f:
+            data += f.read()
+    results = []
+    for codec, level in levels:
+        try:
+            results.append(benchmark(data, codec, level, args.chunk_size, args.repeat))
+        except ImportError as e:
+            print(f"Skipping {codec}: {e}")
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return
+    print(f"{'codec':<6} {'level':>5} {'ratio':>7} {'encode MB/s':>12} {'decode MB/s':>12}")
+    for row in results:
+        print(f"{row['codec']:<6} {row['level']:>5} {row['ratio']:>7} {row['encode_mb_per_second']:>12} "
+              f"{row['decode_mb_per_second']:>12}")
+
+
+if __name__ == '__main__':
+    main()
@@ -1,4 +1,5 @@
 import atexit
+import os
 from src import DataIngestor
 from apscheduler.schedulers.blocking import BlockingScheduler
 
@@ -11,13 +12,36 @@ def main():
     :return: None
     """
     ingestor = DataIngestor()
-    file_name = ingestor.download()
-    ingestor.upload_file(file_name)
+    if ingestor.ingest_mode == 'stream':
+        ingestor.stream_upload()
+    else:
+        file_name = ingestor.download()
+        # Unchanged sources are neither downloaded nor uploaded again
+        if file_name is None:
+            return
+        result = ingestor.upload_file(file_name)
+        # A failed provider is retried on the next run, the report is not marked as uploaded
+        if not result.ok:
+            print(f"Upload of {file_name} failed: {result.errors}")
+            return
+        columnar = ingestor.upload_columnar(file_name)
+        # The sidecar is retried like the report, the report is not marked as uploaded without it
+        if columnar is not None and not columnar.ok:
+            print(f"Columnar upload of {file_name} failed: {columnar.errors}")
+            return
+        providers = [provider.provider for provider in result.providers]
+        ingestor.update_manifest(result.object_name, providers, ingestor.pending_checksum)
+        ingestor.publish_ready(result.object_name, providers, ingestor.pending_checksum)
+        ingestor.save_validators()
 
 
 if __name__ == '__main__':
+    # A backfill is a one shot run, the scheduler is not started afterwards
+    if os.environ.get('BACKFILL_START'):
+        DataIngestor().backfill()
+        exit(0)
     main()
-    cron.add_job(main, 'interval', hours=24)
+    cron.add_job(main, 'interval', minutes=DataIngestor().ingest_interval_minutes)
     cron.start()
     # Shut down the scheduler when exiting the app
     atexit.register(lambda: cron.shutdown(wait=False))
@@ -0,0 +1,178 @@
+import json
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from datetime import date, datetime, timedelta
+
+import requests
+from requests.adapters import HTTPAdapter
+
+
+# Format of the daily report names in BASE_URL, e.g. 01-22-2021.csv
+DATE_FORMAT = '%m-%d-%Y'
+
+
+def parse_date(value: str) -> date:
+    """
+    Parse a date given as YYYY-MM-DD(ENV format) or MM-DD-YYYY(daily report format)
+    :param value: date string
+    :return: date
+    :rtype: date
+    """
+    for date_format in ('%Y-%m-%d', DATE_FORMAT):
+        try:
+            return datetime.strptime(value, date_format).date()
+        except ValueError:
+            continue
+    raise ValueError(f"Unsupported date {value}, use YYYY-MM-DD")
+
+
+def date_range(start: date, end: date) -> list:
+    """
+    All dates between start and end, both included
+    :param start: first date
+    :param end: last date
+    :return: dates
+    :rtype: list
+    """
+    return [start + timedelta(days=i) for i in range((end - start).days + 1)]
+
+
+class BackfillManifest(object):
+    """
+    This class keeps the dates which were already downloaded and uploaded in a JSON file so an interrupted backfill
+    resumes where it stopped
+    """
+
+    def __init__(self, path: str):
+        """
+        :param path: path of the manifest file, created on the first completed date
+        """
+        self._path = path
+        self._lock = threading.Lock()
+        self._completed = {}
+        if os.path.isfile(path):
+            with open(path) as f:
+                self._completed = json.load(f).get('completed', {})
+
+    def is_completed(self, day: date) -> bool:
+        """
+        :param day: date to check
+        :return: True | False
+        :rtype: bool
+        """
+        with self._lock:
+            return day.isoformat() in self._completed
+
+    def mark_completed(self, day: date, object_name: str, size: int):
+        """
+        Record a date and rewrite the manifest, the file is replaced atomically so a crash never leaves it half written
+        :param day: completed date
+        :param object_name: name of the uploaded object
+        :param size: size of the object in bytes
+        :return: None
+        """
+        with self._lock:
+            self._completed[day.isoformat()] = {'object_name': object_name, 'bytes': size}
+            tmp_path = f"{self._path}.tmp"
+            with open(tmp_path, 'w') as f:
+                json.dump({'completed': self._completed}, f, indent=2, sort_keys=True)
+            os.replace(tmp_path, self._path)
+
+
+def download_report(url: str, download_path: str, session: requests.Session = None):
+    """
+    Download one daily report into download_path
+    :param url: url of the report
+    :param download_path: folder to save the report into
+    :param session: requests session to reuse connections between reports, optional
+    :return: file path and size in bytes, None if the report does not exist upstream
+    :rtype: tuple
+    """
+    getter = session or requests
+    file_path = os.path.join(download_path, url.split('/')[-1])
+    with getter.get(url, stream=True) as r:
+        if r.status_code == 404:
+            return None
+        r.raise_for_status()
+        size = 0
+        with open(file_path, 'wb') as f:
+            for chunk in r.iter_content(chunk_size=1024 * 1024):
+                f.write(chunk)
+                size += len(chunk)
+    return file_path, size
+
+
+def backfill(ingestor, start: date, end: date, workers: int, manifest_path: str) -> dict:
+    """
+    Download and upload every daily report between start and end through a bounded thread pool
+    :param ingestor: DataIngestor used for the uploads
+    :param start: first date
+    :param end: last date
+    :param workers: number of dates processed at the same time
+    :param manifest_path: path of the manifest of completed dates
+    :return: statistics of the run
+    :rtype: dict
+    """
+    manifest = BackfillManifest(manifest_path)
+    download_path = ingestor.download_path or os.getcwd()
+    if not os.path.exists(download_path):
+        os.makedirs(download_path)
+    pending = [day for day in date_range(start, end) if not manifest.is_completed(day)]
+    stats = {'requested': (end - start).days + 1, 'skipped': 0, 'completed': 0, 'missing': 0, 'failed': 0,
+             'bytes': 0}
+    stats['skipped'] = stats['requested'] - len(pending)
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=workers, pool_maxsize=workers)
+    session.mount('https://', adapter)
+    session.mount('http://', adapter)
+
+    def run(day: date):
+        url = f"{ingestor.base_url}/{day.strftime(DATE_FORMAT)}.csv"
+        downloaded = download_report(url, download_path, session)
+        if downloaded is None:
+            return day, None, 0
+        file_path, size = downloaded
+        object_name = os.path.basename(file_path)
+        try:
+            result = ingestor.upload_file(file_path, object_name=object_name)
+            if not result.ok:
+                raise RuntimeError(f"upload failed: {result.errors}")
+            columnar = ingestor.upload_columnar(file_path)
+            if columnar is not None and not columnar.ok:
+                raise RuntimeError(f"columnar upload failed: {columnar.errors}")
+            # Historical reports are only added to the index, the latest pointer stays where it is
+            ingestor.update_manifest(result.object_name, [provider.provider for provider in result.providers],
+                                     latest=False)
+        finally:
+            os.remove(file_path)
+        manifest.mark_completed(day, object_name, size)
+        return day, object_name, size
+
+    started = time.monotonic()
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        futures = {executor.submit(run, day): day for day in pending}
+        for future in as_completed(futures):
+            day = futures[future]
+            try:
+                _, object_name, size = future.result()
+            # One broken date must not stop the whole backfill
+            except Exception as e:
+                stats['failed'] += 1
+                print(f"Backfill of {day} failed: {e}")
+                continue
+            if object_name is None:
+                stats['missing'] += 1
+                print(f"No report found for {day}")
+                continue
+            stats['completed'] += 1
+            stats['bytes'] += size
+    elapsed = time.monotonic() - started
+    stats['seconds'] = round(elapsed, 3)
+    stats['files_per_second'] = round(stats['completed'] / elapsed, 3) if elapsed else 0.0
+    stats['mb_per_second'] = round(stats['bytes'] / 1024 / 1024 / elapsed, 3) if elapsed else 0.0
+    print(f"Backfill finished: {stats['completed']} files, {stats['bytes']} bytes in {stats['seconds']}s "
+          f"({stats['files_per_second']} files/s, {stats['mb_per_second']} MB/s), {stats['skipped']} already done, "
+          f"{stats['missing']} missing, {stats['failed']} failed")
+    return stats
@@ -0,0 +1,81 @@
+import os
+import re
+from datetime import datetime
+from urllib.parse import quote
+
+try:
+    import pyarrow as pa
+    import pyarrow.compute as pc
+    import pyarrow.csv as pv
+    import pyarrow.parquet as pq
+except ImportError:
+    # Columnar sidecar is optional, the raw CSV upload does not need pyarrow
+    pa = None
+
+
+# Column which keeps the row number of the raw CSV so the processor renders the same index as with the CSV
+ROW_COLUMN = '_row'
+PARTITION_COLUMN = 'Country_Region'
+# Strings pandas.read_csv reads as missing values, NA_VALUES of DataProcessor/src/engines.py
+NA_VALUES = ['', '#N/A', '#N/A N/A', '#NA', '-1.#IND', '-1.#QNAN', '-NaN', '-nan', '1.#IND', '1.#QNAN', '<NA>', 'N/A',
+             'NA', 'NULL', 'NaN', 'None', 'n/a', 'nan', 'null']
+
+
+def report_date(file_name: str) -> str:
+    """
+    Get the date of a daily report from its name, e.g. 01-22-2021.csv(.gz) -> 2021-01-22
+    :param file_name: file or object name of the report
+    :return: date as YYYY-MM-DD
+    :rtype: str
+    """
+    match = re.search(r'(\d{2}-\d{2}-\d{4})', os.path.basename(file_name))
+    if match is None:
+        raise ValueError(f"{file_name} is not a daily report name(MM-DD-YYYY.csv)")
+    return datetime.strptime(match.group(1), '%m-%d-%Y').strftime('%Y-%m-%d')
+
+
+def partition_object_name(prefix: str, date: str, country: str) -> str:
+    """
+    Object name of one country partition, values are escaped like hive partitions(e.g. Korea, South)
+    :param prefix: prefix of the columnar objects
+    :param date: date as YYYY-MM-DD
+    :param country: value of Country_Region
+    :return: object name
+    :rtype: str
+    """
+    return f"{prefix}date={date}/country={quote(country, safe='')}/part.parquet"
+
+
+def write_country_partitions(file_name: str, output_dir: str, prefix: str) -> list:
+    """
+    Convert a daily report CSV to one Parquet file per Country_Region
+    :param file_name: raw CSV(full path)
+    :param output_dir: local folder which the partitions are written into
+    :param prefix: prefix of the columnar objects
+    :return: pairs of local path and object name
+    :rtype: list
+    """
+    if pa is None:
+        raise ImportError("pyarrow package is required for the columnar sidecar")
+    date = report_date(file_name)
+    # Last_Update stays a string like pandas reads it, pyarrow would parse it as timestamp. Empty cells are null like
+    # the NaN of pandas, pyarrow would keep them as empty strings
+    convert_options = pv.ConvertOptions(column_types={'Last_Update': pa.string()}, null_values=NA_VALUES,
+                                        strings_can_be_null=True)
+    table = pv.read_csv(file_name, convert_options=convert_options)
+    for index, field in enumerate(table.schema):
+        # Empty columns are read as float64(NaN) by pandas, pyarrow would give them the null type. An integer column
+        # with a missing value anywhere in the file is float64 in pandas too, also in partitions without one
+        if pa.types.is_null(field.type) or (pa.types.is_integer(field.type) and table[field.name].null_count):
+            table = table.set_column(index, field.name, table[field.name].cast(pa.float64()))
+    table = table.append_column(ROW_COLUMN, pa.array(range(table.num_rows), type=pa.int64()))
+    partitions = []
+    for country in pc.unique(table[PARTITION_COLUMN]).to_pylist():
+        if country is None:
+            continue
+        object_name = partition_object_name(prefix, date, country)
+        local_path = os.path.join(output_dir, object_name)
+        os.makedirs(os.path.dirname(local_path), exist_ok=True)
+        pq.write_table(table.filter(pc.equal(table[PARTITION_COLUMN], country)), local_path)
+        partitions.append((local_path, object_name))
+    return partitions
@@ -0,0 +1,108 @@
+import zlib
+
+try:
+    import zstandard
+except ImportError:
+    # zstd is optional, gzip only needs the standard library
+    zstandard = None
+
+
+GZIP = 'gzip'
+ZSTD = 'zstd'
+# Extension appended to the object name of compressed objects
+EXTENSIONS = {GZIP: '.gz', ZSTD: '.zst'}
+DEFAULT_LEVELS = {GZIP: 6, ZSTD: 3}
+
+
+def compressor(codec: str, level: int = None):
+    """
+    Create an incremental compressor, both codecs expose compress(bytes) and flush()
+    :param codec: gzip or zstd
+    :param level: compression level, codec default if not provided
+    :return: compressor object
+    """
+    level = DEFAULT_LEVELS[codec] if level is None else level
+    if codec == GZIP:
+        # wbits 31 writes a gzip header and trailer instead of a raw zlib stream
+        return zlib.compressobj(level, zlib.DEFLATED, 31)
+    if codec == ZSTD:
+        if zstandard is None:
+            raise ImportError("zstandard package is required for zstd compression")
+        return zstandard.ZstdCompressor(level=level).compressobj()
+    raise ValueError(f"Unsupported compression codec {codec}, use one of: {', '.join(EXTENSIONS)}")
+
+
+def decompressor(codec: str):
+    """
+    Create an incremental decompressor, both codecs expose decompress(bytes)
+    :param codec: gzip or zstd
+    :return: decompressor object
+    """
+    if codec == GZIP:
+        return zlib.decompressobj(31)
+    if codec == ZSTD:
+        if zstandard is None:
+            raise ImportError("zstandard package is required for zstd compression")
+        return zstandard.ZstdDecompressor().decompressobj()
+    raise ValueError(f"Unsupported compression codec {codec}, use one of: {', '.join(EXTENSIONS)}")
+
+
+def compress_file(file_name: str, codec: str, level: int = None, chunk_size: int = 1024 * 1024) -> str:
+    """
+    Compress a file chunk by chunk next to the original one
+    :param file_name: file_name(full path)
+    :param codec: gzip or zstd
+    :param level: compression level, codec default if not provided
+    :param chunk_size: bytes read at once
+    :return: file name of the compressed file
+    :rtype: str
+    """
+    compressed_file_name = file_name + EXTENSIONS[codec]
+    stream = compressor(codec, level)
+    with open(file_name, 'rb') as source, open(compressed_file_name, 'wb') as target:
+        for chunk in iter(lambda: source.read(chunk_size), b''):
+            target.write(stream.compress(chunk))
+        target.write(stream.flush())
+    return compressed_file_name
+
+
+class CompressingWriter(object):
+    """
+    This class wraps a streaming writer(S3MultipartWriter, GCSStreamWriter) and compresses the bytes on their way to it
+    """
+
+    def __init__(self, writer, codec: str, level: int = None):
+        """
+        :param writer: object with write(bytes), close() and abort()
+        :param codec: gzip or zstd
+        :param level: compression level, codec default if not provided
+        """
+        self._writer = writer
+        self._compressor = compressor(codec, level)
+        self.bytes_written = 0
+
+    def write(self, data: bytes):
+        """
+        Compress data and pass whatever the compressor emitted to the wrapped writer
+        :param data: bytes to write
+        :return: None
+        """
+        self.bytes_written += len(data)
+        compressed = self._compressor.compress(data)
+        if compressed:
+            self._writer.write(compressed)
+
+    def close(self):
+        """
+        Flush the compressor and close the wrapped writer
+        :return: None
+        """
+        self._writer.write(self._compressor.flush())
+        self._writer.close()
+
+    def abort(self):
+        """
+        Abort the wrapped writer, the compressor state is dropped with it
+        :return: None
+        """
+        self._writer.abort()
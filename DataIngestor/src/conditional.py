@@ -0,0 +1,122 @@
+import base64
+import binascii
+import hashlib
+import json
+import os
+import threading
+
+import requests
+
+
+def probe(url: str, session: requests.Session = None) -> tuple:
+    """
+    Check if a url exists without downloading it, a HEAD request is used and servers which do not allow HEAD are asked
+    for the first byte only(Range: bytes=0-0)
+    :param url: url to check
+    :param session: requests session, optional
+    :return: status code(206 from a range probe is reported as 200) and response headers
+    :rtype: tuple
+    """
+    getter = session or requests
+    r = getter.head(url, allow_redirects=True)
+    if r.status_code not in (405, 501):
+        return r.status_code, r.headers
+    with getter.get(url, headers={'Range': 'bytes=0-0'}, stream=True) as r:
+        return (200 if r.status_code == 206 else r.status_code), r.headers
+
+
+def file_sha256(file_name: str) -> str:
+    """
+    SHA-256 of a file, read in chunks so memory stays bounded
+    :param file_name: file_name(full path)
+    :return: hex digest
+    :rtype: str
+    """
+    sha256 = hashlib.sha256()
+    with open(file_name, 'rb') as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b''):
+            sha256.update(chunk)
+    return sha256.hexdigest()
+
+
+def published_sha256(headers) -> str:
+    """
+    SHA-256 a server published for a response in Repr-Digest(RFC 9530) or Digest(RFC 3230), e.g.
+    Repr-Digest: sha-256=:<base64>:
+    :param headers: response headers
+    :return: hex digest, None if the server published none
+    :rtype: str
+    """
+    for header in ('Repr-Digest', 'Digest'):
+        for item in (headers.get(header) or '').split(','):
+            algorithm, _, value = item.strip().partition('=')
+            if algorithm.strip().lower() != 'sha-256':
+                continue
+            try:
+                digest = base64.b64decode(value.strip().strip(':'), validate=True)
+            except binascii.Error:
+                continue
+            if len(digest) == 32:
+                return digest.hex()
+    return None
+
+
+class ValidatorCache(object):
+    """
+    This class persists ETag, Last-Modified and SHA-256 of every downloaded url in a JSON file, they are used to make
+    conditional requests and to detect unchanged content on the next run
+    """
+
+    def __init__(self, path: str):
+        """
+        :param path: path of the cache file, created on the first save
+        """
+        self._path = path
+        self._lock = threading.Lock()
+        self._validators = {}
+        if os.path.isfile(path):
+            with open(path) as f:
+                self._validators = json.load(f)
+
+    def get(self, url: str) -> dict:
+        """
+        :param url: downloaded url
+        :return: validators of the url, empty if the url was never downloaded
+        :rtype: dict
+        """
+        with self._lock:
+            return dict(self._validators.get(url, {}))
+
+    def conditional_headers(self, url: str) -> dict:
+        """
+        Headers which make the server answer 304 Not Modified if the url did not change since the last download
+        :param url: url to download
+        :return: headers
+        :rtype: dict
+        """
+        validators = self.get(url)
+        headers = {}
+        if validators.get('etag'):
+            headers['If-None-Match'] = validators['etag']
+        if validators.get('last_modified'):
+            headers['If-Modified-Since'] = validators['last_modified']
+        return headers
+
+    def save(self, url: str, etag: str = None, last_modified: str = None, sha256: str = None):
+        """
+        Store the validators of a url, a run killed while saving keeps the previous cache file
+        :param url: downloaded url
+        :param etag: ETag header of the response
+        :param last_modified: Last-Modified header of the response
+        :param sha256: SHA-256 of the content
+        :return: None
+        """
+        with self._lock:
+            self._validators[url] = {'etag': etag, 'last_modified': last_modified, 'sha256': sha256}
+            directory = os.path.dirname(self._path)
+            if directory and not os.path.exists(directory):
+                os.makedirs(directory)
+            tmp_path = f"{self._path}.tmp"
+            with open(tmp_path, 'w') as f:
+                json.dump(self._validators, f, indent=2, sort_keys=True)
+            os.replace(tmp_path, self._path)
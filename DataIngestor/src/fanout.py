@@ -0,0 +1,99 @@
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+
+class ProviderResult(object):
+    """
+    This class holds the outcome of an upload to one storage provider
+    """
+
+    def __init__(self, provider: str, size: int = 0, seconds: float = 0.0, error: Exception = None):
+        """
+        :param provider: s3 or gcp
+        :param size: bytes uploaded
+        :param seconds: wall-clock time of the upload
+        :param error: exception raised by the upload, None if it succeeded
+        """
+        self.provider = provider
+        self.size = size
+        self.seconds = seconds
+        self.error = error
+
+    @property
+    def ok(self) -> bool:
+        """
+        :return: True if the upload succeeded
+        :rtype: bool
+        """
+        return self.error is None
+
+    def __repr__(self):
+        status = 'ok' if self.ok else f"failed({self.error})"
+        return f"<ProviderResult {self.provider} {status} {self.size} bytes in {self.seconds:.3f}s>"
+
+
+class UploadResult(object):
+    """
+    This class holds the outcome of an upload to every storage provider, it is returned instead of exiting the process
+    so a failing provider does not kill the scheduler
+    """
+
+    def __init__(self, object_name: str, providers: list):
+        """
+        :param object_name: name of the uploaded object
+        :param providers: ProviderResult of every provider
+        """
+        self.object_name = object_name
+        self.providers = providers
+
+    @property
+    def ok(self) -> bool:
+        """
+        :return: True if every provider succeeded
+        :rtype: bool
+        """
+        return all(result.ok for result in self.providers)
+
+    @property
+    def errors(self) -> dict:
+        """
+        :return: exception of every failed provider
+        :rtype: dict
+        """
+        return {result.provider: result.error for result in self.providers if not result.ok}
+
+    @property
+    def seconds(self) -> float:
+        """
+        Wall-clock time of the whole upload, providers run at the same time so it is the slowest one
+        :return: seconds
+        :rtype: float
+        """
+        return max((result.seconds for result in self.providers), default=0.0)
+
+    def __repr__(self):
+        return f"<UploadResult {self.object_name} {self.providers}>"
+
+
+def fan_out(tasks: dict, object_name: str, size: int) -> UploadResult:
+    """
+    Run one upload task per provider in a thread pool, a slow or failing provider does not stall the others
+    :param tasks: provider name -> function without arguments which uploads to that provider
+    :param object_name: name of the uploaded object
+    :param size: bytes every task uploads
+    :return: outcome of every provider
+    :rtype: UploadResult
+    """
+    def timed(provider, task):
+        started = time.monotonic()
+        try:
+            task()
+        except Exception as e:
+            return ProviderResult(provider, 0, time.monotonic() - started, e)
+        return ProviderResult(provider, size, time.monotonic() - started)
+
+    if not tasks:
+        return UploadResult(object_name, [])
+    with ThreadPoolExecutor(max_workers=len(tasks)) as executor:
+        futures = [executor.submit(timed, provider, task) for provider, task in tasks.items()]
+        return UploadResult(object_name, [future.result() for future in futures])
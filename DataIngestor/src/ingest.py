@@ -7,11 +7,22 @@ import requests
 from requests.exceptions import RequestException
 import shutil
 import re
+import tempfile
 import boto3
 from botocore.config import Config
 from boto3.s3.transfer import TransferConfig
 import os
 
+from .backfill import backfill, parse_date
+from .columnar import write_country_partitions
+from .compression import EXTENSIONS, CompressingWriter, compress_file
+from .conditional import ValidatorCache, file_sha256, probe, published_sha256
+from .events import transport_from_env
+from .fanout import UploadResult, fan_out
+from .manifest import GCSJSONStore, S3JSONStore, add_to_index, latest_pointer
+from .ranged import ranged_download, supports_ranges
+from .stream import DigestWriter, S3MultipartWriter, GCSStreamWriter, stream_to_writers
+
 
 class ProgressPercentage(object):
     """
@@ -36,14 +47,41 @@ class ProgressPercentage(object):
             sys.stdout.flush()
 
 
-def download(url: str, download_path: str = None, file_name_string: str = None) -> str:
+def file_name_from_headers(headers, url: str) -> str:
+    """
+    Get the file name of a download from the response headers or the url
+    :param headers: response headers
+    :param url: url which was requested
+    :return: file name
+    :rtype: str
+    """
+    # Header Content-Disposition is used to get the file name
+    if "Content-Disposition" in headers.keys():
+        return re.findall("filename=(.+)", headers["Content-Disposition"])[0]
+    # If Content-Disposition is absent, use the last part of the url
+    return url.split("/")[-1]
+
+
+def file_name_from_response(response, url: str) -> str:
+    """
+    Get the file name of a download from the response headers or the url
+    :param response: requests response
+    :param url: url which was requested
+    :return: file name
+    :rtype: str
+    """
+    return file_name_from_headers(response.headers, url)
+
+
+def download(url: str, download_path: str = None, file_name_string: str = None, headers: dict = None) -> str:
     """
     Download a file from a url and save it to a specified path
     :param url: url to download from
     :param download_path: path to save the file to
     :param file_name_string: string to use as the file name(overrides the file name in the url, currently not used in
     the code but can be used in the future)
-    :return: file name(with path) of the downloaded file
+    :param headers: extra request headers(e.g. If-None-Match), optional
+    :return: file name(with path) of the downloaded file, None if the server answered 304 Not Modified
     :rtype: str
     """
     try:
@@ -52,14 +90,11 @@ def download(url: str, download_path: str = None, file_name_string: str = None)
             if not os.path.exists(download_path):
                 # If not, create it
                 os.makedirs(download_path)
-        with requests.get(url, stream=True) as r:
+        with requests.get(url, stream=True, headers=headers) as r:
+            if r.status_code == 304:
+                return None
             # Get the file name from the url if not provided
-            # Header Content-Disposition is used to get the file name
-            if "Content-Disposition" in r.headers.keys():
-                file_name_string = re.findall("filename=(.+)", r.headers["Content-Disposition"])[0]
-            else:
-                # If the file name is not provided and Content-Disposition is absent, use the last part of the url
-                file_name_string = url.split("/")[-1]
+            file_name_string = file_name_from_response(r, url)
             with open(f"{file_name_string}", "wb") as f:
                 shutil.copyfileobj(r.raw, f)
     except RequestException as e:
@@ -67,12 +102,13 @@ def download(url: str, download_path: str = None, file_name_string: str = None)
     return file_name_string
 
 
-def s3_client_builder(access_key: str, secret_key: str, region: str):
+def s3_client_builder(access_key: str, secret_key: str, region: str, endpoint_url: str = None):
     """
     This method use imported values from import_env_var function and creates s3 connection
     :param access_key: access key for s3
     :param secret_key: secret key for s3
     :param region: region for s3
+    :param endpoint_url: custom S3 endpoint(e.g. MinIO or moto server), optional
     :return: s3_client to use with s3
     :rtype: object
     """
@@ -91,12 +127,13 @@ def s3_client_builder(access_key: str, secret_key: str, region: str):
         aws_access_key_id=ACCESS_KEY,
         aws_secret_access_key=SECRET_KEY,
         config=client_config,
+        endpoint_url=endpoint_url,
     )
     return s3_client
 
 
 def upload_to_s3(file_name: str, bucket: str, access_key: str, secret_key: str, region: str = "eu-west-1",
-                 object_name: str = None):
+                 object_name: str = None, endpoint_url: str = None, extra_args: dict = None, s3=None):
     """
     This Function Uploads File into S3(AWS)
     :param file_name: filename of file which to be uploaded
@@ -105,11 +142,16 @@ def upload_to_s3(file_name: str, bucket: str, access_key: str, secret_key: str,
     :param secret_key: Secret key of AWS S3
     :param region: region of AWS S3(Default = eu-west-1)
     :param object_name: filename on the S3 bucket
+    :param endpoint_url: custom S3 endpoint(e.g. MinIO or moto server), optional
+    :param extra_args: extra arguments of the object(e.g. ContentEncoding, ContentType), optional
+    :param s3: client whose bucket was already created, reused for many files instead of building one per file
     :return: None
+    :raises Exception: errors of the upload are raised to the caller instead of exiting the process
     """
-    s3 = s3_client_builder(access_key, secret_key, region)
-    # If the bucket does not exist, create it
-    s3.create_bucket(Bucket=bucket)
+    if s3 is None:
+        s3 = s3_client_builder(access_key, secret_key, region, endpoint_url)
+        # If the bucket does not exist, create it
+        s3.create_bucket(Bucket=bucket)
     if object_name is None:
         object_name = file_name
     transfer_config = TransferConfig(
@@ -118,38 +160,46 @@ def upload_to_s3(file_name: str, bucket: str, access_key: str, secret_key: str,
         multipart_chunksize=1024 * 25,
         use_threads=True
     )
-    try:
-        s3.upload_file(file_name, bucket, object_name, Config=transfer_config,
-                       Callback=ProgressPercentage(file_name))
-    except Exception as e:
-        print(e)
-        exit(1)
+    s3.upload_file(file_name, bucket, object_name, Config=transfer_config,
+                   Callback=ProgressPercentage(file_name), ExtraArgs=extra_args)
+
+
+def gcs_bucket_builder(bucket_name: str):
+    """
+    Get a bucket from Google Cloud Storage and create it if it does not exist
+    :param bucket_name: name of the bucket
+    :return: bucket object
+    """
+    storage_client = storage.Client()
+    # list buckets to check if the bucket exists
+    buckets = list(storage_client.list_buckets())
+    # If the bucket does not exist, create it
+    if bucket_name not in [bucket.name for bucket in buckets]:
+        return storage_client.create_bucket(bucket_name)
+    return storage_client.get_bucket(bucket_name)
 
 
-def upload_to_gcs(file_name, bucket_name, object_name=None):
+def upload_to_gcs(file_name, bucket_name, object_name=None, content_encoding=None, content_type=None, bucket=None):
     """
     Upload a file to a bucket in Google Cloud Storage
     :param file_name: file to upload
     :param bucket_name: bucket to upload to
     :param object_name: object name to use in the bucket, optional
+    :param content_encoding: Content-Encoding of the object(e.g. gzip), optional
+    :param content_type: Content-Type of the object, optional
+    :param bucket: bucket from gcs_bucket_builder, reused for many files instead of looking it up per file
     :return: None
     """
     # Check if application default credentials are set
     if os.environ.get("GOOGLE_APPLICATION_CREDENTIALS") is None:
-        print("GOOGLE_APPLICATION_CREDENTIALS environment variable is not set")
-        exit(1)
-    storage_client = storage.Client()
-    # list buckets to check if the bucket exists
-    buckets = list(storage_client.list_buckets())
-    # If the bucket does not exist, create it
-    if bucket_name not in [bucket.name for bucket in buckets]:
-        bucket = storage_client.create_bucket(bucket_name)
-    else:
-        bucket = storage_client.get_bucket(bucket_name)
+        raise EnvironmentError("GOOGLE_APPLICATION_CREDENTIALS environment variable is not set")
+    if bucket is None:
+        bucket = gcs_bucket_builder(bucket_name)
     if object_name is None:
         object_name = file_name
     blob = bucket.blob(object_name)
-    blob.upload_from_filename(file_name)
+    blob.content_encoding = content_encoding
+    blob.upload_from_filename(file_name, content_type=content_type)
     print(f"File {file_name} uploaded to {bucket_name}.")
 
 
@@ -179,6 +229,38 @@ class DataIngestor:
         self.google_api_file = os.environ.get('GOOGLE_API_FILE')
         self.download_path = os.environ.get('DOWNLOAD_PATH')
         self.storage_provider = os.environ.get('STORAGE_PROVIDER')
+        self.s3_endpoint_url = os.environ.get('S3_ENDPOINT_URL')
+        self.ingest_mode = os.environ.get('INGEST_MODE', 'file')
+        self.stream_chunk_size = int(os.environ.get('STREAM_CHUNK_SIZE', 8 * 1024 * 1024))
+        self.columnar_sidecar = os.environ.get('COLUMNAR_SIDECAR', 'none')
+        self.columnar_prefix = os.environ.get('COLUMNAR_PREFIX', 'columnar/')
+        self.compression = os.environ.get('COMPRESSION', 'none')
+        self.download_segments = int(os.environ.get('DOWNLOAD_SEGMENTS', 1))
+        self.segment_min_size = int(os.environ.get('SEGMENT_MIN_SIZE', 4 * 1024 * 1024))
+        self.compression_level = os.environ.get('COMPRESSION_LEVEL')
+        if self.compression_level is not None:
+            self.compression_level = int(self.compression_level)
+        self.base_url = os.environ.get('BASE_URL')
+        self.ingest_interval_minutes = int(os.environ.get('INGEST_INTERVAL_MINUTES', 24 * 60))
+        self.validators = ValidatorCache(os.environ.get('VALIDATOR_CACHE',
+                                                        os.path.join(self.download_path or os.getcwd(),
+                                                                     'validators.json')))
+        # Response headers of the last probe of every url, filled by url property
+        self._probed_headers = {}
+        self.events = transport_from_env()
+        self.manifest_key = os.environ.get('MANIFEST_KEY', 'latest.json')
+        self.manifest_index = os.environ.get('MANIFEST_INDEX', 'false').lower() == 'true'
+        self.manifest_index_key = os.environ.get('MANIFEST_INDEX_KEY', 'index.json')
+        # The index is read, changed and written back, parallel backfill threads must not interleave
+        self._manifest_lock = threading.Lock()
+        # Validators of the last download, saved by save_validators once the upload succeeded
+        self._pending_validators = None
+        self.backfill_start = os.environ.get('BACKFILL_START')
+        self.backfill_end = os.environ.get('BACKFILL_END')
+        self.backfill_workers = int(os.environ.get('BACKFILL_WORKERS', 8))
+        self.backfill_manifest = os.environ.get('BACKFILL_MANIFEST',
+                                                os.path.join(self.download_path or os.getcwd(),
+                                                             'backfill_manifest.json'))
 
     def _set_google_api(self):
         """
@@ -189,35 +271,290 @@ class DataIngestor:
 
     def download(self) -> str:
         """
-        This function downloads the file into the download_path provided in ENV
-        :return: file_name(full path)
+        This function downloads the file into the download_path provided in ENV, nothing is downloaded when the
+        source did not change since the last save_validators
+        :return: file_name(full path), None if the source did not change
         :rtype: str
         """
+        url = self.url
+        cached = self.validators.get(url)
+        probed = self._probed_headers.get(url, {})
+        # The HEAD probe already tells whether the ETag changed, no need to ask for the body
+        if cached.get('etag') and cached['etag'] == probed.get('ETag'):
+            print(f"{url} did not change(ETag {cached['etag']})")
+            return None
+        # Large files are fetched over several connections when the server supports byte ranges
+        if self.download_segments > 1 and supports_ranges(probed) \
+                and int(probed['Content-Length']) >= 2 * self.segment_min_size:
+            file_name = ranged_download(url, file_name_from_headers(probed, url), int(probed['Content-Length']),
+                                        etag=probed.get('ETag'), segments=self.download_segments,
+                                        min_segment_size=self.segment_min_size, sha256=published_sha256(probed))
         # Check if the download path is provided
-        if self.download_path is not None:
-            file_name = download(self.url, self.download_path)
-            return file_name
+        elif self.download_path is not None:
+            file_name = download(url, self.download_path, headers=self.validators.conditional_headers(url))
         else:
-            file_name = download(self.url)
-            return file_name
+            file_name = download(url, headers=self.validators.conditional_headers(url))
+        if file_name is None:
+            print(f"{url} did not change(304 Not Modified)")
+            return None
+        sha256 = file_sha256(file_name)
+        self._pending_validators = (url, probed.get('ETag'), probed.get('Last-Modified'), sha256)
+        if cached.get('sha256') == sha256:
+            print(f"{url} did not change(SHA-256 {sha256})")
+            os.remove(file_name)
+            # Remember the new validators so the next run can stop at the probe
+            self.save_validators()
+            return None
+        return file_name
 
-    def upload_file(self, file_name):
+    def publish_ready(self, object_name: str, providers: list, checksum: str = None):
         """
-        This function uploads files into cloud storages based on provided ENVs
-        :param file_name: file_name(full path)
+        This function tells Data processor that an object is uploaded, nothing is done unless EVENT_TRANSPORT is set
+        :param object_name: name of the uploaded object
+        :param providers: providers which the object was uploaded to
+        :param checksum: checksum of the content, optional
         :return: None
         """
-        # get providers list from env
-        providers = self.storage_provider.split(',')
+        if self.events is None:
+            return
+        buckets = {'s3': self.s3_bucket_name, 'gcp': self.gcs_bucket_name}
+        for provider in providers:
+            if self.events.publish(provider, buckets[provider], object_name, checksum):
+                print(f"Published {provider}://{buckets[provider]}/{object_name} as ready")
+
+    def _json_stores(self, providers: list) -> list:
+        """
+        This function creates one JSON store per storage provider
+        :param providers: s3 and/or gcp
+        :return: stores
+        :rtype: list
+        """
+        stores = []
         for provider in providers:
             if provider == 's3':
+                s3 = s3_client_builder(self.s3_access_key, self.s3_secret_key, self.s3_region, self.s3_endpoint_url)
+                stores.append(S3JSONStore(s3, self.s3_bucket_name))
+            elif provider == 'gcp':
+                self._set_google_api()
+                stores.append(GCSJSONStore(gcs_bucket_builder(self.gcs_bucket_name)))
+        return stores
+
+    def update_manifest(self, object_name: str, providers: list, checksum: str = None, latest: bool = True):
+        """
+        This function points MANIFEST_KEY to the uploaded object so Data processor finds the newest report with one
+        GET instead of listing the bucket, with MANIFEST_INDEX=true the object is also added to the date sorted
+        MANIFEST_INDEX_KEY
+        :param object_name: name of the uploaded object
+        :param providers: providers which the object was uploaded to
+        :param checksum: checksum of the content, optional
+        :param latest: False for historical reports(backfill) which must not move the pointer
+        :return: None
+        """
+        if not latest and not self.manifest_index:
+            return
+        for store in self._json_stores(providers):
+            if latest:
+                store.write(self.manifest_key, latest_pointer(object_name, checksum))
+            if self.manifest_index:
+                with self._manifest_lock:
+                    index = store.read(self.manifest_index_key)
+                    store.write(self.manifest_index_key, add_to_index(index, object_name, checksum))
+
+    @property
+    def pending_checksum(self) -> str:
+        """
+        :return: SHA-256 of the last download which is not saved yet, None if there is none
+        :rtype: str
+        """
+        return None if self._pending_validators is None else self._pending_validators[3]
+
+    def save_validators(self):
+        """
+        This function persists the validators of the last download, call it once every upload succeeded so a failed
+        upload is retried on the next run
+        :return: None
+        """
+        if self._pending_validators is None:
+            return
+        url, etag, last_modified, sha256 = self._pending_validators
+        self.validators.save(url, etag, last_modified, sha256)
+        self._pending_validators = None
+
+    @property
+    def compressed(self) -> bool:
+        """
+        :return: True if objects are compressed before they are uploaded
+        :rtype: bool
+        """
+        return self.compression in EXTENSIONS
+
+    def _upload_tasks(self, files: list, extra_args: dict, content_encoding: str = None) -> dict:
+        """
+        This function creates one upload task per storage provider provided in ENV
+        :param files: pairs of local path and object name, a provider uploads them one after the other
+        :param extra_args: extra arguments of the S3 objects(e.g. ContentType)
+        :param content_encoding: Content-Encoding of the GCS objects, optional
+        :return: provider name -> function without arguments
+        :rtype: dict
+        """
+        def s3_task():
+            # One client and one create_bucket per provider, however many files it uploads
+            s3 = s3_client_builder(self.s3_access_key, self.s3_secret_key, self.s3_region, self.s3_endpoint_url)
+            s3.create_bucket(Bucket=self.s3_bucket_name)
+            for file_name, object_name in files:
                 upload_to_s3(file_name, self.s3_bucket_name, self.s3_access_key, self.s3_secret_key,
-                             self.s3_region)
+                             self.s3_region, object_name=object_name, endpoint_url=self.s3_endpoint_url,
+                             extra_args=extra_args, s3=s3)
+
+        def gcs_task():
+            # list_buckets and get_bucket once per provider
+            bucket = gcs_bucket_builder(self.gcs_bucket_name)
+            for file_name, object_name in files:
+                upload_to_gcs(file_name, self.gcs_bucket_name, object_name, content_encoding=content_encoding,
+                              content_type=extra_args.get('ContentType'), bucket=bucket)
 
+        tasks = {}
+        # get providers list from env
+        for provider in self.storage_provider.split(','):
+            if provider == 's3':
+                tasks[provider] = s3_task
             elif provider == 'gcp':
+                # os.environ is shared by the threads, set it before they start
                 self._set_google_api()
-                # upload to gcp
-                upload_to_gcs(file_name, self.gcs_bucket_name)
+                tasks[provider] = gcs_task
+        return tasks
+
+    def upload_file(self, file_name, object_name=None) -> UploadResult:
+        """
+        This function uploads files into cloud storages based on provided ENVs, every provider is uploaded to at the
+        same time. With COMPRESSION set the file is compressed once and the compressed copy is uploaded with
+        Content-Encoding
+        :param file_name: file_name(full path)
+        :param object_name: name of the object in the buckets, file_name is used if not provided
+        :return: outcome of every provider, failures are reported there instead of exiting
+        :rtype: UploadResult
+        """
+        if object_name is None:
+            object_name = file_name
+        extra_args = {'ContentType': 'text/csv'}
+        content_encoding = None
+        if self.compressed:
+            file_name = compress_file(file_name, self.compression, self.compression_level)
+            object_name += EXTENSIONS[self.compression]
+            content_encoding = self.compression
+            extra_args['ContentEncoding'] = content_encoding
+        try:
+            tasks = self._upload_tasks([(file_name, object_name)], extra_args, content_encoding)
+            result = fan_out(tasks, object_name, os.path.getsize(file_name))
+        finally:
+            if self.compressed:
+                os.remove(file_name)
+        print(result)
+        return result
+
+    def upload_columnar(self, file_name):
+        """
+        This function writes a Parquet copy of the report partitioned by Country_Region and uploads it next to the raw
+        CSV(COLUMNAR_PREFIX/date=YYYY-MM-DD/country=X/part.parquet), nothing is done unless COLUMNAR_SIDECAR=parquet
+        :param file_name: raw CSV(full path)
+        :return: outcome of every provider, None if the sidecar is disabled
+        :rtype: UploadResult
+        """
+        if self.columnar_sidecar != 'parquet':
+            return None
+        output_dir = tempfile.mkdtemp(dir=self.download_path)
+        try:
+            partitions = write_country_partitions(file_name, output_dir, self.columnar_prefix)
+            tasks = self._upload_tasks(partitions, {'ContentType': 'application/vnd.apache.parquet'})
+            result = fan_out(tasks, self.columnar_prefix,
+                             sum(os.path.getsize(local_path) for local_path, _ in partitions))
+        finally:
+            shutil.rmtree(output_dir)
+        print(f"{len(partitions)} country partitions of {file_name}: {result}")
+        return result
+
+    def backfill(self, start: str = None, end: str = None, workers: int = None) -> dict:
+        """
+        This function downloads and uploads every daily report between start and end(both included) in parallel,
+        completed dates are kept in BACKFILL_MANIFEST so an interrupted backfill resumes where it stopped
+        :param start: first date(YYYY-MM-DD), BACKFILL_START if not provided
+        :param end: last date(YYYY-MM-DD), BACKFILL_END or today if not provided
+        :param workers: number of parallel downloads, BACKFILL_WORKERS if not provided
+        :return: statistics of the run including files_per_second and mb_per_second
+        :rtype: dict
+        """
+        start = parse_date(start or self.backfill_start)
+        end = end or self.backfill_end
+        end = parse_date(end) if end else datetime.today().date()
+        return backfill(self, start, end, workers or self.backfill_workers, self.backfill_manifest)
+
+    def _stream_writers(self, object_name: str) -> list:
+        """
+        This function creates one streaming writer per storage provider provided in ENV, with COMPRESSION set every
+        writer compresses on the fly
+        :param object_name: name of the object in the buckets
+        :return: writers
+        :rtype: list
+        """
+        writers = []
+        content_encoding = None
+        if self.compressed:
+            object_name += EXTENSIONS[self.compression]
+            content_encoding = self.compression
+        for provider in self.storage_provider.split(','):
+            if provider == 's3':
+                s3 = s3_client_builder(self.s3_access_key, self.s3_secret_key, self.s3_region, self.s3_endpoint_url)
+                # If the bucket does not exist, create it
+                s3.create_bucket(Bucket=self.s3_bucket_name)
+                extra_args = {'ContentType': 'text/csv'}
+                if content_encoding is not None:
+                    extra_args['ContentEncoding'] = content_encoding
+                writer = S3MultipartWriter(s3, self.s3_bucket_name, object_name, self.stream_chunk_size,
+                                           extra_args=extra_args)
+            elif provider == 'gcp':
+                self._set_google_api()
+                bucket = gcs_bucket_builder(self.gcs_bucket_name)
+                writer = GCSStreamWriter(bucket, object_name, self.stream_chunk_size, content_type='text/csv')
+                writer.blob.content_encoding = content_encoding
+            else:
+                continue
+            if self.compressed:
+                writer = CompressingWriter(writer, self.compression, self.compression_level)
+            writers.append(writer)
+        return writers
+
+    def stream_upload(self) -> str:
+        """
+        This function streams the file from the url straight into every storage provider without writing it to disk,
+        the response is read in chunks of STREAM_CHUNK_SIZE so memory stays bounded
+        :return: object_name of the uploaded file, None if the source did not change
+        :rtype: str
+        """
+        url = self.url
+        cached = self.validators.get(url)
+        with requests.get(url, stream=True, headers=self.validators.conditional_headers(url)) as r:
+            if r.status_code == 304:
+                print(f"{url} did not change(304 Not Modified)")
+                return None
+            r.raise_for_status()
+            object_name = file_name_from_response(r, url)
+            # The content is never on disk in stream mode, its SHA-256 is computed from the tee
+            digest = DigestWriter()
+            size = stream_to_writers(r, self._stream_writers(object_name) + [digest], self.stream_chunk_size)
+            sha256 = digest.hexdigest()
+            if cached.get('sha256') == sha256:
+                # The objects were rewritten with the same content, the manifest and the processor are up to date
+                print(f"{url} did not change(SHA-256 {sha256})")
+                self.validators.save(url, r.headers.get('ETag'), r.headers.get('Last-Modified'), sha256)
+                return None
+            providers = [provider for provider in self.storage_provider.split(',') if provider in ('s3', 'gcp')]
+            uploaded_name = object_name + EXTENSIONS.get(self.compression, '')
+            self.update_manifest(uploaded_name, providers, sha256)
+            self.publish_ready(uploaded_name, providers, sha256)
+            # Saved last like save_validators, a run which failed before is not taken for unchanged
+            self.validators.save(url, r.headers.get('ETag'), r.headers.get('Last-Modified'), sha256)
+        print(f"File {object_name}({size} bytes) streamed to {self.storage_provider}.")
+        return object_name
 
     @property
     def url(self) -> str:
@@ -226,21 +563,23 @@ class DataIngestor:
         :return: URL for csv in order to be downloaded
         :rtype: str
         """
-        base_url = os.getenv('BASE_URL')
+        base_url = self.base_url
         today = datetime.today().strftime('%m-%d-%Y')
         url = f"{base_url}/{today}.csv"
-        # Check if the url is valid
+        # Check if the url is valid, only headers are requested so the file is not downloaded here
         try:
-            r = requests.get(url)
-            if r.status_code == 200:
+            status_code, headers = probe(url)
+            if status_code == 200:
+                self._probed_headers[url] = headers
                 return url
             else:
                 yesterday = (datetime.today() - timedelta(days=1)).strftime('%m-%d-%Y')
                 url = f"{base_url}/{yesterday}.csv"
                 # Check if the url is valid
                 try:
-                    r = requests.get(url)
-                    if r.status_code == 200:
+                    status_code, headers = probe(url)
+                    if status_code == 200:
+                        self._probed_headers[url] = headers
                         return url
                     else:
                         print("No data found")
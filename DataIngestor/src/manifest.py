@@ -0,0 +1,105 @@
+import json
+from datetime import datetime, timezone
+
+from .columnar import report_date
+
+
+class S3JSONStore(object):
+    """
+    This class reads and writes small JSON objects in an S3 bucket, a PUT replaces an object atomically so readers
+    see either the old or the new version
+    """
+
+    def __init__(self, s3_client, bucket: str):
+        """
+        :param s3_client: client created by s3_client_builder
+        :param bucket: bucket name in S3
+        """
+        self._s3 = s3_client
+        self._bucket = bucket
+
+    def read(self, key: str) -> dict:
+        """
+        :param key: key of the object
+        :return: content of the object, None if it does not exist
+        :rtype: dict
+        """
+        try:
+            response = self._s3.get_object(Bucket=self._bucket, Key=key)
+        except self._s3.exceptions.NoSuchKey:
+            return None
+        return json.loads(response['Body'].read())
+
+    def write(self, key: str, content: dict):
+        """
+        :param key: key of the object
+        :param content: JSON serializable content
+        :return: None
+        """
+        self._s3.put_object(Bucket=self._bucket, Key=key, Body=json.dumps(content).encode(),
+                            ContentType='application/json', CacheControl='no-cache')
+
+
+class GCSJSONStore(object):
+    """
+    This class reads and writes small JSON objects in a GCS bucket, an upload replaces an object atomically so readers
+    see either the old or the new version
+    """
+
+    def __init__(self, bucket):
+        """
+        :param bucket: google.cloud.storage bucket object
+        """
+        self._bucket = bucket
+
+    def read(self, key: str) -> dict:
+        """
+        :param key: name of the object
+        :return: content of the object, None if it does not exist
+        :rtype: dict
+        """
+        blob = self._bucket.get_blob(key)
+        if blob is None:
+            return None
+        return json.loads(blob.download_as_bytes())
+
+    def write(self, key: str, content: dict):
+        """
+        :param key: name of the object
+        :param content: JSON serializable content
+        :return: None
+        """
+        blob = self._bucket.blob(key)
+        blob.cache_control = 'no-cache'
+        blob.upload_from_string(json.dumps(content), content_type='application/json')
+
+
+def latest_pointer(object_name: str, checksum: str = None) -> dict:
+    """
+    Content of the pointer to the newest report
+    :param object_name: name of the report object
+    :param checksum: checksum of the report, optional
+    :return: pointer
+    :rtype: dict
+    """
+    return {'key': object_name, 'checksum': checksum, 'updated': datetime.now(timezone.utc).isoformat()}
+
+
+def add_to_index(index: dict, object_name: str, checksum: str = None) -> dict:
+    """
+    Add a report to the date sorted index of all reports, a report which is already in the index is replaced
+    :param index: current index, None if there is none yet
+    :param object_name: name of the report object
+    :param checksum: checksum of the report, optional
+    :return: new index
+    :rtype: dict
+    """
+    try:
+        date = report_date(object_name)
+    except ValueError:
+        date = None
+    objects = [entry for entry in (index or {}).get('objects', []) if entry['key'] != object_name]
+    objects.append({'date': date, 'key': object_name, 'checksum': checksum})
+    # Names without a date are kept at the end
+    objects.sort(key=lambda entry: (entry['date'] is None, entry['date'] or '', entry['key']))
+    return {'objects': objects}
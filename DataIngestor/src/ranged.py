@@ -0,0 +1,200 @@
+import hashlib
+import json
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+from requests.adapters import HTTPAdapter
+
+
+def supports_ranges(headers) -> bool:
+    """
+    Check if a server advertised byte ranges and a size for a url
+    :param headers: headers of a HEAD response
+    :return: True | False
+    :rtype: bool
+    """
+    return headers.get('Accept-Ranges', '').lower() == 'bytes' and headers.get('Content-Length') is not None
+
+
+def split_ranges(size: int, segments: int, min_segment_size: int) -> list:
+    """
+    Split size bytes into at most segments inclusive byte ranges which are at least min_segment_size long
+    :param size: size of the file
+    :param segments: maximum number of segments
+    :param min_segment_size: minimum size of a segment
+    :return: (start, end) pairs
+    :rtype: list
+    """
+    segments = max(1, min(segments, size // max(min_segment_size, 1)))
+    step = -(-size // segments)
+    return [(start, min(start + step, size) - 1) for start in range(0, size, step)]
+
+
+class SegmentState(object):
+    """
+    This class keeps finished segments of a ranged download in a sidecar JSON file so an interrupted download resumes
+    """
+
+    def __init__(self, path: str, url: str, size: int, etag: str = None):
+        """
+        :param path: path of the sidecar file
+        :param url: downloaded url
+        :param size: size of the file
+        :param etag: ETag of the file, a changed file invalidates the state
+        """
+        self._path = path
+        self._lock = threading.Lock()
+        self._state = {'url': url, 'size': size, 'etag': etag, 'completed': []}
+        if os.path.isfile(path):
+            with open(path) as f:
+                state = json.load(f)
+            # Segments of another version of the file are useless, so are the bare starts older versions recorded
+            if (state.get('url'), state.get('size'), state.get('etag')) == (url, size, etag) \
+                    and all(isinstance(segment, list) for segment in state.get('completed', [])):
+                self._state = state
+
+    def is_completed(self, start: int, end: int) -> bool:
+        """
+        :param start: first byte of the segment
+        :param end: last byte of the segment(inclusive)
+        :return: True if the segment, or one which contains it, was completed
+        :rtype: bool
+        """
+        with self._lock:
+            return any(done_start <= start and end <= done_end for done_start, done_end in self._state['completed'])
+
+    def mark_completed(self, start: int, end: int):
+        """
+        Record a segment, the sidecar is rewritten next to itself and renamed over the old one
+        :param start: first byte of the segment
+        :param end: last byte of the segment(inclusive)
+        :return: None
+        """
+        with self._lock:
+            self._state['completed'].append([start, end])
+            tmp_path = f"{self._path}.tmp"
+            with open(tmp_path, 'w') as f:
+                json.dump(self._state, f)
+            os.replace(tmp_path, self._path)
+
+    def covered(self) -> int:
+        """
+        :return: number of bytes of the file the completed segments cover
+        :rtype: int
+        """
+        with self._lock:
+            segments = sorted(self._state['completed'])
+        covered = 0
+        next_byte = 0
+        for start, end in segments:
+            if end >= next_byte:
+                covered += end - max(start, next_byte) + 1
+                next_byte = end + 1
+        return covered
+
+    def remove(self):
+        """
+        Remove the sidecar file once the download is complete
+        :return: None
+        """
+        if os.path.isfile(self._path):
+            os.remove(self._path)
+
+
+def _fetch_segment(session: requests.Session, url: str, file_path: str, start: int, end: int, etag: str,
+                   retries: int, chunk_size: int):
+    """
+    Download one byte range into its place in file_path, the segment is retried from its start on errors
+    :param session: requests session shared by the segments
+    :param url: downloaded url
+    :param file_path: preallocated file
+    :param start: first byte of the segment
+    :param end: last byte of the segment(inclusive)
+    :param etag: ETag of the file, sent as If-Range
+    :param retries: attempts after the first one
+    :param chunk_size: bytes read at once
+    :return: None
+    """
+    headers = {'Range': f"bytes={start}-{end}"}
+    if etag:
+        # The server sends the whole file instead of the range if it changed in the meantime
+        headers['If-Range'] = etag
+    for attempt in range(retries + 1):
+        try:
+            with session.get(url, headers=headers, stream=True, timeout=60) as r:
+                if r.status_code != 206:
+                    raise IOError(f"Expected 206 for bytes {start}-{end} of {url}, got {r.status_code}")
+                written = 0
+                with open(file_path, 'r+b') as f:
+                    f.seek(start)
+                    for chunk in r.iter_content(chunk_size=chunk_size):
+                        f.write(chunk)
+                        written += len(chunk)
+                if written != end - start + 1:
+                    raise IOError(f"Segment {start}-{end} of {url} is {written} bytes long")
+                return
+        except (IOError, requests.RequestException) as e:
+            if attempt == retries:
+                raise
+            print(f"Segment {start}-{end} of {url} failed({e}), retrying")
+            time.sleep(0.5 * 2 ** attempt)
+
+
+def ranged_download(url: str, file_path: str, size: int, etag: str = None, segments: int = 8,
+                    min_segment_size: int = 1024 * 1024, retries: int = 3, sha256: str = None,
+                    chunk_size: int = 1024 * 1024) -> str:
+    """
+    Download a file over several connections, one byte range each. Finished ranges are kept in file_path.parts so
+    running it again after an interruption only downloads the missing ones
+    :param url: url to download, the server must support byte ranges(see supports_ranges)
+    :param file_path: path to save the file to
+    :param size: Content-Length of the file
+    :param etag: ETag of the file, optional
+    :param segments: maximum number of parallel connections
+    :param min_segment_size: smaller files use fewer segments
+    :param retries: attempts per segment after the first one
+    :param sha256: expected SHA-256 of the file(see published_sha256), optional. A mismatch discards the download
+    :param chunk_size: bytes read at once from every connection
+    :return: file_path
+    :rtype: str
+    """
+    ranges = split_ranges(size, segments, min_segment_size)
+    state = SegmentState(f"{file_path}.parts", url, size, etag)
+    # Preallocate the file so every segment can be written at its offset, a resumed download keeps its content
+    resume = os.path.isfile(file_path) and any(state.is_completed(start, end) for start, end in ranges)
+    with open(file_path, 'r+b' if resume else 'wb') as f:
+        f.truncate(size)
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=len(ranges), pool_maxsize=len(ranges))
+    session.mount('https://', adapter)
+    session.mount('http://', adapter)
+
+    def run(byte_range):
+        start, end = byte_range
+        if state.is_completed(start, end):
+            return
+        _fetch_segment(session, url, file_path, start, end, etag, retries, chunk_size)
+        state.mark_completed(start, end)
+
+    with ThreadPoolExecutor(max_workers=len(ranges)) as executor:
+        # list() raises the first failed segment once the others are done
+        list(executor.map(run, ranges))
+    # The file was preallocated, its size says nothing. Every byte has to be in a segment which was written completely
+    covered = state.covered()
+    if covered != size:
+        raise IOError(f"Segments of {file_path} cover {covered} bytes, expected {size}")
+    if sha256 is not None:
+        digest = hashlib.sha256()
+        with open(file_path, 'rb') as f:
+            for chunk in iter(lambda: f.read(chunk_size), b''):
+                digest.update(chunk)
+        if digest.hexdigest() != sha256:
+            # Resuming would keep the same bytes, the next attempt starts over
+            state.remove()
+            os.remove(file_path)
+            raise IOError(f"SHA-256 of {file_path} does not match")
+    state.remove()
+    return file_path
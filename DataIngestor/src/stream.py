@@ -0,0 +1,241 @@
+import hashlib
+import queue
+import threading
+
+
+class S3MultipartWriter(object):
+    """
+    This class is a file-like sink which streams written bytes into an S3 multipart upload
+    """
+    # S3 rejects multipart parts smaller than 5 MiB except for the last one
+    MIN_PART_SIZE = 5 * 1024 * 1024
+
+    def __init__(self, s3_client, bucket: str, object_name: str, part_size: int = MIN_PART_SIZE,
+                 extra_args: dict = None):
+        """
+        :param s3_client: client created by s3_client_builder
+        :param bucket: bucket name in S3
+        :param object_name: key of the object in the bucket
+        :param part_size: size of each uploaded part, raised to MIN_PART_SIZE if smaller
+        :param extra_args: extra arguments passed to create_multipart_upload/put_object(e.g. ContentType)
+        """
+        self._s3 = s3_client
+        self._bucket = bucket
+        self._object_name = object_name
+        self._part_size = max(part_size, self.MIN_PART_SIZE)
+        self._extra_args = extra_args or {}
+        self._buffer = bytearray()
+        self._parts = []
+        self._upload_id = None
+        self.bytes_written = 0
+
+    def write(self, data: bytes):
+        """
+        Buffer data and upload a part every time the buffer reaches the part size
+        :param data: bytes to write
+        :return: None
+        """
+        self._buffer += data
+        self.bytes_written += len(data)
+        while len(self._buffer) >= self._part_size:
+            self._upload_part(bytes(self._buffer[:self._part_size]))
+            del self._buffer[:self._part_size]
+
+    def _upload_part(self, body: bytes):
+        """
+        Uploads one part, the multipart upload is created lazily on the first part
+        :param body: content of the part
+        :return: None
+        """
+        if self._upload_id is None:
+            response = self._s3.create_multipart_upload(Bucket=self._bucket, Key=self._object_name,
+                                                        **self._extra_args)
+            self._upload_id = response['UploadId']
+        part_number = len(self._parts) + 1
+        response = self._s3.upload_part(Bucket=self._bucket, Key=self._object_name, PartNumber=part_number,
+                                        UploadId=self._upload_id, Body=body)
+        self._parts.append({'ETag': response['ETag'], 'PartNumber': part_number})
+
+    def close(self):
+        """
+        Uploads what is left in the buffer and completes the upload
+        :return: None
+        """
+        if self._upload_id is None:
+            # Objects smaller than one part never started a multipart upload, a plain PUT is cheaper
+            self._s3.put_object(Bucket=self._bucket, Key=self._object_name, Body=bytes(self._buffer),
+                                **self._extra_args)
+        else:
+            if self._buffer:
+                self._upload_part(bytes(self._buffer))
+            self._s3.complete_multipart_upload(Bucket=self._bucket, Key=self._object_name,
+                                               UploadId=self._upload_id,
+                                               MultipartUpload={'Parts': self._parts})
+        self._buffer = bytearray()
+
+    def abort(self):
+        """
+        Aborts the multipart upload so S3 drops the already uploaded parts
+        :return: None
+        """
+        if self._upload_id is not None:
+            self._s3.abort_multipart_upload(Bucket=self._bucket, Key=self._object_name, UploadId=self._upload_id)
+        self._buffer = bytearray()
+
+
+class GCSStreamWriter(object):
+    """
+    This class is a file-like sink which streams written bytes into a GCS resumable upload
+    """
+    # GCS resumable uploads require chunks to be a multiple of 256 KiB
+    CHUNK_MULTIPLE = 256 * 1024
+
+    def __init__(self, bucket, object_name: str, chunk_size: int, content_type: str = None):
+        """
+        :param bucket: google.cloud.storage bucket object
+        :param object_name: name of the object in the bucket
+        :param chunk_size: size of each chunk sent to GCS, rounded up to a multiple of 256 KiB
+        :param content_type: content type of the object, optional
+        """
+        chunk_size = -(-chunk_size // self.CHUNK_MULTIPLE) * self.CHUNK_MULTIPLE
+        self.blob = bucket.blob(object_name, chunk_size=chunk_size)
+        self._content_type = content_type
+        self._writer = None
+        self.bytes_written = 0
+
+    def write(self, data: bytes):
+        """
+        Write data into the resumable upload, the upload session is opened lazily so metadata set on
+        blob after construction(e.g. content_encoding) is sent with it
+        :param data: bytes to write
+        :return: None
+        """
+        if self._writer is None:
+            kwargs = {'content_type': self._content_type} if self._content_type else {}
+            self._writer = self.blob.open('wb', **kwargs)
+        self._writer.write(data)
+        self.bytes_written += len(data)
+
+    def close(self):
+        """
+        Sends the last chunk and finalizes the object
+        :return: None
+        """
+        if self._writer is None:
+            # Nothing was written, still create the (empty) object like upload_from_filename would
+            self.write(b'')
+        self._writer.close()
+
+    def abort(self):
+        """
+        Drops the upload without finalizing it, an unfinished resumable session is never turned into an object
+        :return: None
+        """
+        self._writer = None
+
+
+class DigestWriter(object):
+    """
+    This class is a sink which only hashes what is written, in the tee of stream_to_writers it gives the SHA-256 of a
+    streamed file without keeping it anywhere
+    """
+
+    def __init__(self):
+        self._sha256 = hashlib.sha256()
+        self.bytes_written = 0
+
+    def write(self, data: bytes):
+        """
+        :param data: bytes to hash
+        :return: None
+        """
+        self._sha256.update(data)
+        self.bytes_written += len(data)
+
+    def close(self):
+        pass
+
+    def abort(self):
+        pass
+
+    def hexdigest(self) -> str:
+        """
+        :return: hex SHA-256 of everything written
+        :rtype: str
+        """
+        return self._sha256.hexdigest()
+
+
+class _QueuedWriter(threading.Thread):
+    """
+    Feeds one writer from a bounded queue so a slow provider only blocks the download once its queue is full
+    """
+    _CLOSE = object()
+    _ABORT = object()
+
+    def __init__(self, writer, depth: int):
+        super().__init__(daemon=True)
+        self.writer = writer
+        self.queue = queue.Queue(maxsize=depth)
+        self.error = None
+
+    def run(self):
+        while True:
+            item = self.queue.get()
+            try:
+                if item is self._CLOSE and self.error is None:
+                    self.writer.close()
+                elif item is self._CLOSE or item is self._ABORT:
+                    self.writer.abort()
+                elif self.error is None:
+                    # Keep draining after an error so the producer never blocks on a dead consumer
+                    self.writer.write(item)
+            except Exception as e:
+                if self.error is None:
+                    self.error = e
+            if item is self._CLOSE or item is self._ABORT:
+                return
+
+
+def stream_to_writers(response, writers: list, chunk_size: int, queue_depth: int = 2) -> int:
+    """
+    Tees a streamed HTTP response into every writer at the same time, each writer runs in its own thread so the
+    uploads overlap with the download. Memory is bounded by roughly chunk_size * (queue_depth + 1) per writer plus
+    whatever the writer buffers itself
+    :param response: requests response opened with stream=True
+    :param writers: objects with write(bytes), close() and abort()
+    :param chunk_size: size of chunks read from the response
+    :param queue_depth: number of chunks which may wait for each writer
+    :return: number of bytes streamed
+    :rtype: int
+    """
+    workers = [_QueuedWriter(writer, queue_depth) for writer in writers]
+    for worker in workers:
+        worker.start()
+    total = 0
+    try:
+        for chunk in response.iter_content(chunk_size=chunk_size):
+            if not chunk:
+                continue
+            for worker in workers:
+                worker.queue.put(chunk)
+            total += len(chunk)
+            # Stop downloading as soon as one provider failed
+            if any(worker.error is not None for worker in workers):
+                break
+    except Exception:
+        for worker in workers:
+            worker.queue.put(_QueuedWriter._ABORT)
+            worker.join()
+        raise
+    failed = [worker for worker in workers if worker.error is not None]
+    end = _QueuedWriter._ABORT if failed else _QueuedWriter._CLOSE
+    for worker in workers:
+        worker.queue.put(end)
+    for worker in workers:
+        worker.join()
+    failed = [worker for worker in workers if worker.error is not None]
+    if failed:
+        # A writer may fail while closing, the others are already finalized but the run must still be reported
+        raise failed[0].error
+    return total
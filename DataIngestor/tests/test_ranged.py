@@ -0,0 +1,168 @@
+import base64
+import hashlib
+import json
+import os
+import random
+import re
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+import requests
+
+from src.conditional import published_sha256
+from src.ranged import ranged_download, split_ranges, supports_ranges
+
+CONTENT = random.Random(7).randbytes(100_003)
+ETAG = '"v1"'
+
+
+class RangeHandler(BaseHTTPRequestHandler):
+    """
+    Serves CONTENT like a static file server, the test changes the class attributes of its subclass
+    """
+    etag = ETAG
+    accept_ranges = True
+    # Starts of ranges answered with a 500
+    failing = set()
+    ranges = []
+
+    def log_message(self, *args):
+        pass
+
+    def _headers(self, status: int, length: int, content_range: str = None):
+        self.send_response(status)
+        self.send_header('Content-Length', str(length))
+        self.send_header('ETag', self.etag)
+        self.send_header('Repr-Digest', f"sha-256=:{base64.b64encode(hashlib.sha256(CONTENT).digest()).decode()}:")
+        if self.accept_ranges:
+            self.send_header('Accept-Ranges', 'bytes')
+        if content_range:
+            self.send_header('Content-Range', content_range)
+        self.end_headers()
+
+    def do_HEAD(self):
+        self._headers(200, len(CONTENT))
+
+    def do_GET(self):
+        match = re.fullmatch(r'bytes=(\d+)-(\d+)', self.headers.get('Range', ''))
+        if_range = self.headers.get('If-Range')
+        if not self.accept_ranges or match is None or (if_range is not None and if_range != self.etag):
+            self._headers(200, len(CONTENT))
+            self.wfile.write(CONTENT)
+            return
+        start, end = int(match.group(1)), int(match.group(2))
+        self.ranges.append((start, end))
+        if start in self.failing:
+            self.send_error(500)
+            return
+        self._headers(206, end - start + 1, f"bytes {start}-{end}/{len(CONTENT)}")
+        self.wfile.write(CONTENT[start:end + 1])
+
+
+@pytest.fixture
+def server():
+    handler = type('Handler', (RangeHandler,), {'failing': set(), 'ranges': []})
+    httpd = ThreadingHTTPServer(('127.0.0.1', 0), handler)
+    threading.Thread(target=httpd.serve_forever, daemon=True).start()
+    yield handler, f"http://127.0.0.1:{httpd.server_port}/report.csv"
+    httpd.shutdown()
+    httpd.server_close()
+
+
+@pytest.mark.parametrize('size,segments,min_segment_size', [(10, 3, 1), (100_003, 8, 1000), (999, 8, 1000),
+                                                            (1000, 8, 1000), (7, 7, 1), (7, 8, 1)])
+def test_split_ranges_cover_every_byte_once(size, segments, min_segment_size):
+    ranges = split_ranges(size, segments, min_segment_size)
+    assert ranges[0][0] == 0 and ranges[-1][1] == size - 1
+    assert all(end + 1 == start for (_, end), (start, _) in zip(ranges, ranges[1:]))
+    assert len(ranges) <= segments
+    assert len(ranges) == 1 or all(end - start + 1 >= min_segment_size for start, end in ranges[:-1])
+
+
+def test_split_ranges_boundaries():
+    assert split_ranges(10, 3, 1) == [(0, 3), (4, 7), (8, 9)]
+    assert split_ranges(999, 8, 1000) == [(0, 998)]
+    assert split_ranges(2000, 8, 1000) == [(0, 999), (1000, 1999)]
+
+
+def test_download_in_segments(server, tmp_path):
+    handler, url = server
+    headers = requests.head(url).headers
+    assert supports_ranges(headers)
+    file_path = str(tmp_path / 'report.csv')
+    ranged_download(url, file_path, len(CONTENT), etag=ETAG, segments=4, min_segment_size=1000,
+                    sha256=published_sha256(headers))
+    with open(file_path, 'rb') as f:
+        assert f.read() == CONTENT
+    assert sorted(handler.ranges) == split_ranges(len(CONTENT), 4, 1000)
+    assert not os.path.exists(f"{file_path}.parts")
+
+
+def test_resume_fetches_only_missing_segments(server, tmp_path):
+    handler, url = server
+    file_path = str(tmp_path / 'report.csv')
+    ranges = split_ranges(len(CONTENT), 4, 1000)
+    handler.failing = {ranges[2][0]}
+    with pytest.raises(IOError):
+        ranged_download(url, file_path, len(CONTENT), etag=ETAG, segments=4, min_segment_size=1000, retries=0)
+    with open(f"{file_path}.parts") as f:
+        assert sorted(map(tuple, json.load(f)['completed'])) == [ranges[0], ranges[1], ranges[3]]
+    handler.failing = set()
+    handler.ranges.clear()
+    ranged_download(url, file_path, len(CONTENT), etag=ETAG, segments=4, min_segment_size=1000)
+    assert handler.ranges == [ranges[2]]
+    with open(file_path, 'rb') as f:
+        assert f.read() == CONTENT
+
+
+def test_resume_with_other_segments_does_not_trust_uncovered_bytes(server, tmp_path):
+    handler, url = server
+    file_path = str(tmp_path / 'report.csv')
+    small = split_ranges(len(CONTENT), 8, 1000)
+    handler.failing = {start for start, _ in small[1:]}
+    with pytest.raises(IOError):
+        ranged_download(url, file_path, len(CONTENT), etag=ETAG, segments=8, min_segment_size=1000, retries=0)
+    handler.failing = set()
+    handler.ranges.clear()
+    # The first of 2 segments is longer than the first of 8 which was completed, it is fetched again
+    ranged_download(url, file_path, len(CONTENT), etag=ETAG, segments=2, min_segment_size=1000)
+    assert sorted(handler.ranges) == split_ranges(len(CONTENT), 2, 1000)
+    with open(file_path, 'rb') as f:
+        assert f.read() == CONTENT
+
+
+def test_changed_file_fails_if_range(server, tmp_path):
+    handler, url = server
+    handler.etag = '"v2"'
+    file_path = str(tmp_path / 'report.csv')
+    with pytest.raises(IOError, match='Expected 206'):
+        ranged_download(url, file_path, len(CONTENT), etag=ETAG, segments=4, min_segment_size=1000, retries=0)
+    assert not os.path.exists(f"{file_path}.parts")
+
+
+def test_server_without_ranges(server, tmp_path):
+    handler, url = server
+    handler.accept_ranges = False
+    assert not supports_ranges(requests.head(url).headers)
+    with pytest.raises(IOError, match='Expected 206'):
+        ranged_download(url, str(tmp_path / 'report.csv'), len(CONTENT), segments=4, min_segment_size=1000,
+                        retries=0)
+
+
+def test_sha256_mismatch_starts_over(server, tmp_path):
+    handler, url = server
+    file_path = str(tmp_path / 'report.csv')
+    with pytest.raises(IOError, match='SHA-256'):
+        ranged_download(url, file_path, len(CONTENT), etag=ETAG, segments=4, min_segment_size=1000,
+                        sha256=hashlib.sha256(b'other').hexdigest())
+    assert not os.path.exists(file_path) and not os.path.exists(f"{file_path}.parts")
+
+
+def test_published_sha256():
+    digest = hashlib.sha256(CONTENT).digest()
+    encoded = base64.b64encode(digest).decode()
+    assert published_sha256({'Repr-Digest': f"sha-512=:AAAA:, sha-256=:{encoded}:"}) == digest.hex()
+    assert published_sha256({'Digest': f"SHA-256={encoded}"}) == digest.hex()
+    assert published_sha256({'Digest': 'md5=AAAA'}) is None
+    assert published_sha256({}) is None
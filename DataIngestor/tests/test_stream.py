@@ -0,0 +1,196 @@
+import hashlib
+import json
+import os
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import boto3
+import pytest
+
+from src.stream import DigestWriter, GCSStreamWriter, S3MultipartWriter, stream_to_writers
+
+moto = pytest.importorskip('moto')
+# moto 5 mocks every service with mock_aws, moto 4 has one mock per service
+mock_aws = getattr(moto, 'mock_aws', None) or moto.mock_s3
+
+BUCKET = 'ingestor-stream'
+MIB = 1024 * 1024
+
+
+class Response(object):
+    """
+    Streamed response of requests, it records how much of the body was read
+    """
+
+    def __init__(self, body: bytes):
+        self.body = body
+        self.read = 0
+
+    def iter_content(self, chunk_size: int):
+        for start in range(0, len(self.body), chunk_size):
+            chunk = self.body[start:start + chunk_size]
+            self.read += len(chunk)
+            yield chunk
+
+
+class FailingWriter(object):
+    """
+    Writer of a provider which fails once it received fail_after bytes
+    """
+
+    def __init__(self, fail_after: int):
+        self.fail_after = fail_after
+        self.bytes_written = 0
+        self.aborted = False
+
+    def write(self, data: bytes):
+        self.bytes_written += len(data)
+        if self.bytes_written > self.fail_after:
+            raise IOError('Provider went away')
+
+    def close(self):
+        raise AssertionError('A failed writer must not be closed')
+
+    def abort(self):
+        self.aborted = True
+
+
+@pytest.fixture
+def s3():
+    with mock_aws():
+        s3_client = boto3.client('s3', region_name='us-east-1', aws_access_key_id='testing',
+                                 aws_secret_access_key='testing')
+        s3_client.create_bucket(Bucket=BUCKET)
+        parts = []
+        # Size of every uploaded part, in the order they were uploaded
+        s3_client.meta.events.register('provide-client-params.s3.UploadPart',
+                                       lambda params, **kwargs: parts.append(len(params['Body'])))
+        yield s3_client, parts
+
+
+def content(size: int) -> bytes:
+    return os.urandom(size)
+
+
+def stored(s3_client, key: str) -> bytes:
+    return s3_client.get_object(Bucket=BUCKET, Key=key)['Body'].read()
+
+
+@pytest.mark.parametrize('size,expected_parts', [
+    (0, []),
+    (MIB, []),
+    (5 * MIB - 1, []),
+    (5 * MIB, [5 * MIB]),
+    (5 * MIB + 1, [5 * MIB, 1]),
+    (10 * MIB + 3, [5 * MIB, 5 * MIB, 3]),
+])
+def test_s3_parts(s3, size, expected_parts):
+    s3_client, parts = s3
+    body = content(size)
+    # Smaller part sizes are raised to the 5 MiB S3 accepts
+    writer = S3MultipartWriter(s3_client, BUCKET, 'report.csv', part_size=MIB, extra_args={'ContentType': 'text/csv'})
+    for start in range(0, size, 700 * 1024):
+        writer.write(body[start:start + 700 * 1024])
+    writer.close()
+    assert parts == expected_parts
+    assert stored(s3_client, 'report.csv') == body
+    assert s3_client.head_object(Bucket=BUCKET, Key='report.csv')['ContentType'] == 'text/csv'
+    assert writer.bytes_written == size
+
+
+def test_tee_into_every_writer(s3):
+    s3_client, parts = s3
+    body = content(11 * MIB + 17)
+    writers = [S3MultipartWriter(s3_client, BUCKET, 'first.csv'), S3MultipartWriter(s3_client, BUCKET, 'second.csv')]
+    assert stream_to_writers(Response(body), writers, 1024 * 1024 + 1) == len(body)
+    assert stored(s3_client, 'first.csv') == body
+    assert stored(s3_client, 'second.csv') == body
+    assert sorted(parts) == sorted([5 * MIB, 5 * MIB, MIB + 17] * 2)
+
+
+def test_abort_when_one_writer_fails_mid_stream(s3):
+    s3_client, _ = s3
+    body = content(40 * MIB)
+    response = Response(body)
+    failing = FailingWriter(12 * MIB)
+    with pytest.raises(IOError, match='Provider went away'):
+        stream_to_writers(response, [S3MultipartWriter(s3_client, BUCKET, 'report.csv'), failing], MIB)
+    assert failing.aborted
+    # The download stopped soon after the failure instead of reading the whole response
+    assert response.read < len(body)
+    # The started multipart upload was aborted and no object was created
+    assert s3_client.list_multipart_uploads(Bucket=BUCKET).get('Uploads', []) == []
+    assert s3_client.list_objects_v2(Bucket=BUCKET).get('KeyCount') == 0
+
+
+def test_abort_when_the_download_fails(s3):
+    s3_client, _ = s3
+
+    class BrokenResponse(Response):
+        def iter_content(self, chunk_size: int):
+            yield from super().iter_content(chunk_size)
+            raise IOError('Connection reset')
+
+    with pytest.raises(IOError, match='Connection reset'):
+        stream_to_writers(BrokenResponse(content(6 * MIB)), [S3MultipartWriter(s3_client, BUCKET, 'report.csv')], MIB)
+    assert s3_client.list_multipart_uploads(Bucket=BUCKET).get('Uploads', []) == []
+    assert s3_client.list_objects_v2(Bucket=BUCKET).get('KeyCount') == 0
+
+
+@pytest.mark.parametrize('chunk_size,expected', [(1, 256 * 1024), (256 * 1024, 256 * 1024),
+                                                 (256 * 1024 + 1, 512 * 1024), (8 * MIB, 8 * MIB)])
+def test_gcs_chunks_are_multiples_of_256_kib(chunk_size, expected):
+    storage = pytest.importorskip('google.cloud.storage')
+    bucket = storage.Client.create_anonymous_client().bucket('ingestor-stream')
+    assert GCSStreamWriter(bucket, 'report.csv', chunk_size).blob.chunk_size == expected
+
+
+def test_digest_of_the_tee(s3):
+    s3_client, _ = s3
+    body = content(6 * MIB + 5)
+    digest = DigestWriter()
+    assert stream_to_writers(Response(body), [S3MultipartWriter(s3_client, BUCKET, 'report.csv'), digest], MIB) \
+        == len(body)
+    assert digest.hexdigest() == hashlib.sha256(body).hexdigest()
+    assert stored(s3_client, 'report.csv') == body
+
+
+def test_stream_upload_saves_the_sha256(s3, tmp_path, monkeypatch):
+    s3_client, _ = s3
+    body = content(MIB + 11)
+
+    class Handler(BaseHTTPRequestHandler):
+        def log_message(self, *args):
+            pass
+
+        def do_HEAD(self):
+            self.send_response(200)
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+
+        def do_GET(self):
+            self.do_HEAD()
+            self.wfile.write(body)
+
+    httpd = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+    threading.Thread(target=httpd.serve_forever, daemon=True).start()
+    for name, value in dict(INGEST_MODE='stream', STORAGE_PROVIDER='s3', S3_DOWNLOAD_BUCKET=BUCKET,
+                            S3_ACCESS_KEY='testing', S3_SECRET_KEY='testing', S3_REGION='us-east-1',
+                            BASE_URL=f"http://127.0.0.1:{httpd.server_port}",
+                            VALIDATOR_CACHE=str(tmp_path / 'validators.json')).items():
+        monkeypatch.setenv(name, value)
+    from src.ingest import DataIngestor
+    try:
+        ingestor = DataIngestor()
+        object_name = ingestor.stream_upload()
+        assert stored(s3_client, object_name) == body
+        sha256 = hashlib.sha256(body).hexdigest()
+        with open(tmp_path / 'validators.json') as f:
+            assert [validators['sha256'] for validators in json.load(f).values()] == [sha256]
+        manifest = json.loads(stored(s3_client, 'latest.json'))
+        assert manifest['checksum'] == sha256
+        # The same content again, it is uploaded but not announced as new
+        assert DataIngestor().stream_upload() is None
+    finally:
+        httpd.shutdown()
+        httpd.server_close()
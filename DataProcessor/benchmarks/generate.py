@@ -0,0 +1,95 @@
+"""
+Synthetic daily reports with the columns of the JHU CSSE daily reports
+
+Usage(from DataProcessor folder): python -m benchmarks.generate 01-22-2021.csv --rows 100000 [--gzip]
+"""
+import argparse
+
+import numpy as np
+import pandas as pd
+
+COLUMNS = ['FIPS', 'Admin2', 'Province_State', 'Country_Region', 'Last_Update', 'Lat', 'Long_', 'Confirmed',
+           'Deaths', 'Recovered', 'Active', 'Combined_Key', 'Incident_Rate', 'Case_Fatality_Ratio']
+# Countries with their share of the rows and number of provinces, 0 provinces means country level rows only
+COUNTRIES = {
+    'US': (0.55, 58),
+    'Czechia': (0.05, 14),
+    'Germany': (0.05, 16),
+    'Italy': (0.05, 21),
+    'France': (0.05, 18),
+    'Brazil': (0.05, 27),
+    'India': (0.05, 36),
+    'Korea, South': (0.05, 0),
+    'Japan': (0.05, 47),
+    'Austria': (0.05, 0),
+}
+
+
+def generate(rows: int, seed: int = 0, date: str = '2021-01-22') -> pd.DataFrame:
+    """
+    Create a daily report, every value is random but the shape(skewed countries, provinces, admin2 rows, missing
+    values) follows the real reports
+    :param rows: number of rows
+    :param seed: seed of the random generator, the same seed creates the same report
+    :param date: date of Last_Update(YYYY-MM-DD)
+    :return: report
+    :rtype: pd.DataFrame
+    """
+    rng = np.random.default_rng(seed)
+    names = list(COUNTRIES)
+    weights = np.array([COUNTRIES[name][0] for name in names])
+    countries = rng.choice(len(names), size=rows, p=weights / weights.sum())
+    provinces_per_country = np.array([COUNTRIES[name][1] for name in names])
+    province_number = rng.integers(0, np.maximum(provinces_per_country, 1)[countries])
+    province = pd.Series([f"Province {number}" for number in province_number], dtype=object)
+    province[provinces_per_country[countries] == 0] = None
+    country = pd.Series(np.array(names, dtype=object)[countries])
+    admin2 = pd.Series([f"County {number}" for number in rng.integers(0, 3000, rows)], dtype=object)
+    admin2[country != 'US'] = None
+    confirmed = rng.lognormal(8, 2, rows).astype(np.int64)
+    deaths = (confirmed * rng.uniform(0, 0.03, rows)).astype(np.int64)
+    combined = np.where(province.isna(), country, province.fillna('') + ', ' + country)
+    return pd.DataFrame({
+        'FIPS': np.where(country == 'US', rng.integers(1000, 57000, rows).astype(float), np.nan),
+        'Admin2': admin2,
+        'Province_State': province,
+        'Country_Region': country,
+        'Last_Update': f"{date} 05:22:33",
+        'Lat': rng.uniform(-60, 70, rows).round(6),
+        'Long_': rng.uniform(-180, 180, rows).round(6),
+        'Confirmed': confirmed,
+        'Deaths': deaths,
+        'Recovered': 0,
+        'Active': np.nan,
+        'Combined_Key': combined,
+        'Incident_Rate': rng.uniform(0, 10000, rows).round(4),
+        'Case_Fatality_Ratio': (deaths / np.maximum(confirmed, 1) * 100).round(6),
+    }, columns=COLUMNS)
+
+
+def write(file_path: str, rows: int, gzipped: bool = False, seed: int = 0) -> str:
+    """
+    Write a synthetic report as plain or gzipped CSV
+    :param file_path: path of the report
+    :param rows: number of rows
+    :param gzipped: compress the report with gzip
+    :param seed: seed of the random generator
+    :return: file_path
+    :rtype: str
+    """
+    generate(rows, seed).to_csv(file_path, index=False, compression='gzip' if gzipped else None)
+    return file_path
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('file', help='path of the report')
+    parser.add_argument('--rows', type=int, default=4000)
+    parser.add_argument('--gzip', action='store_true', help='compress the report with gzip')
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+    write(args.file, args.rows, args.gzip, args.seed)
+
+
+if __name__ == '__main__':
+    main()
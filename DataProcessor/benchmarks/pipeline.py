@@ -0,0 +1,313 @@
+"""
+Wall time, peak RSS and rows/s of parse, filter, render and end-to-end runs of Data processor on synthetic reports
+
+Usage(from DataProcessor folder): python -m benchmarks.pipeline --rows 10000,100000 --output results.json
+    [--engines pandas,polars,pyarrow] [--baseline baseline.json --threshold 0.2] [--save-baseline baseline.json]
+"""
+import argparse
+import json
+import multiprocessing
+import os
+import platform
+import resource
+import shutil
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import pandas as pd
+
+from benchmarks.generate import write
+from src.engines import pa, pacsv, pl
+from src.processor import (DataProcessor, detect_compression, parse_regions, read_report, read_rows, render_pages,
+                           split_regions)
+
+CASES = ['detect', 'parse', 'filter', 'render', 'end_to_end']
+# Cases which run once per engine, the others do not depend on it
+ENGINE_CASES = ['parse', 'filter', 'end_to_end']
+
+
+class LocalDataProcessor(DataProcessor):
+    """
+    Data processor whose buckets are local folders, downloads and uploads are file copies so only the processing
+    itself is measured
+    """
+
+    report = None
+
+    @property
+    def last_file_s3(self) -> str:
+        return os.path.basename(self.report)
+
+    @property
+    def get_last_file_from_gcs(self) -> str:
+        return os.path.basename(self.report)
+
+    def _copy(self, provider: str) -> str:
+        """
+        Copy the report into the download folder of a provider
+        :param provider: s3 or gcp
+        :return: file_path of the copy
+        :rtype: str
+        """
+        file_path = os.path.join(self.download_path, provider, os.path.basename(self.report))
+        os.makedirs(os.path.dirname(file_path), exist_ok=True)
+        shutil.copyfile(self.report, file_path)
+        return file_path
+
+    @property
+    def download_from_s3(self) -> str:
+        return self._copy('s3')
+
+    @property
+    def download_from_gcs(self) -> str:
+        return self._copy('gcp')
+
+    def _upload(self, provider: str, processed_folder: str, processed_file_paths: list):
+        """
+        Copy the pages into the upload folder of a provider
+        :param provider: s3 or gcp
+        :param processed_folder: folder of the pages
+        :param processed_file_paths: file_paths of the pages
+        :return: None
+        """
+        for processed_file_path in processed_file_paths:
+            file_path = os.path.join(self.download_path, 'uploaded', provider,
+                                     os.path.relpath(processed_file_path, processed_folder))
+            os.makedirs(os.path.dirname(file_path), exist_ok=True)
+            shutil.copyfile(processed_file_path, file_path)
+
+    def upload_to_s3(self, processed_folder: str, processed_file_paths: list):
+        self._upload('s3', processed_folder, processed_file_paths)
+
+    def upload_to_gcs(self, processed_folder: str, processed_file_paths: list):
+        self._upload('gcp', processed_folder, processed_file_paths)
+
+
+def _peak_rss_mb() -> float:
+    """
+    :return: peak resident set size of this process in MB
+    :rtype: float
+    """
+    if os.path.isfile('/proc/self/status'):
+        # ru_maxrss survives fork and exec on Linux, so it would report the peak of the parent
+        with open('/proc/self/status') as f:
+            for line in f:
+                if line.startswith('VmHWM:'):
+                    return round(int(line.split()[1]) / 1024, 1)
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports KB, macOS bytes
+    return round(peak / 1024 / (1024 if sys.platform == 'darwin' else 1), 1)
+
+
+def _environment(workdir: str, regions: str, providers: str, engine: str):
+    """
+    Configure Data processor through its ENVs, without any cloud service, cache, store or events
+    :param workdir: folder for downloads, pages and uploads
+    :param regions: REGIONS of the run
+    :param providers: STORAGE_PROVIDER of the run
+    :param engine: ENGINE of the run
+    :return: None
+    """
+    os.environ.update({
+        'ENGINE': engine,
+        'DOWNLOAD_PATH': workdir,
+        'PROCESSED_FOLDER': os.path.join(workdir, 'processed'),
+        'STORAGE_PROVIDER': providers,
+        'REGIONS': regions,
+        'DOWNLOAD_CACHE_MAX_BYTES': '0',
+        'TIMESERIES_DB': 'none',
+        'EVENT_TRANSPORT': 'none',
+    })
+
+
+def _parse(engine: str, file_path: str) -> int:
+    """
+    Parse a whole report with the native reader of an engine
+    :param engine: pandas | polars | pyarrow
+    :param file_path: report to parse
+    :return: number of rows
+    :rtype: int
+    """
+    compression = detect_compression(file_path)
+    if engine == 'polars':
+        if pl is None:
+            raise ImportError("polars package is required for ENGINE=polars")
+        return pl.read_csv(file_path).height
+    if engine == 'pyarrow':
+        if pa is None:
+            raise ImportError("pyarrow package is required for ENGINE=pyarrow")
+        if compression is None:
+            return pacsv.read_csv(file_path).num_rows
+        return pacsv.read_csv(pa.CompressedInputStream(pa.OSFile(file_path), compression)).num_rows
+    return len(pd.read_csv(file_path, compression=compression))
+
+
+def run_case(case: str, engine: str, file_path: str, workdir: str, regions: str, providers: str,
+             repeat: int) -> dict:
+    """
+    Run one case in a fresh process, so its peak RSS is not mixed up with the other cases
+    :param case: one of CASES
+    :param engine: ENGINE of the case
+    :param file_path: report to process
+    :param workdir: folder for downloads, pages and uploads
+    :param regions: REGIONS of the run
+    :param providers: STORAGE_PROVIDER of the end-to-end run
+    :param repeat: number of runs, the fastest one is reported
+    :return: seconds, peak_rss_mb and the number of rows the case handled
+    :rtype: dict
+    """
+    _environment(workdir, regions, providers, engine)
+    countries = list(dict.fromkeys(country for country, _ in parse_regions(regions)))
+    if case == 'detect':
+        def func():
+            detect_compression(file_path)
+            # Only the first bytes are read, rows/s does not apply
+            return 0
+    elif case == 'parse':
+        def func():
+            return _parse(engine, file_path)
+    elif case == 'filter':
+        def func():
+            # Every row of the report is parsed and checked
+            read_report(engine, file_path, countries)
+            return None
+    elif case == 'render':
+        frames = split_regions(read_rows(file_path, countries), parse_regions(regions))
+        pages = [(frame, os.path.join(workdir, 'render', f"{number}.html")) for number, frame in enumerate(frames)]
+        workers = int(os.getenv('RENDER_WORKERS', os.cpu_count() or 1))
+
+        def func():
+            render_pages('index.html.j2', pages, workers)
+            return sum(len(frame) for frame, _ in pages)
+    elif case == 'end_to_end':
+        LocalDataProcessor.report = file_path
+
+        def func():
+            LocalDataProcessor().runit()
+            return None
+    else:
+        raise ValueError(f"Unknown case {case}, use one of: {', '.join(CASES)}")
+    best = None
+    rows = None
+    for _ in range(repeat):
+        started = time.perf_counter()
+        rows = func()
+        elapsed = time.perf_counter() - started
+        best = elapsed if best is None else min(best, elapsed)
+    return {'seconds': best, 'peak_rss_mb': _peak_rss_mb(), 'rows': rows}
+
+
+def benchmark(rows: int, gzipped: bool, cases: list, engines: list, workdir: str, regions: str, providers: str,
+              repeat: int) -> list:
+    """
+    Generate a report and run every case on it
+    :param rows: rows of the report
+    :param gzipped: gzip the report
+    :param cases: names of the cases
+    :param engines: engines the ENGINE_CASES run with
+    :param workdir: folder for reports, downloads, pages and uploads
+    :param regions: REGIONS of the run
+    :param providers: STORAGE_PROVIDER of the end-to-end run
+    :param repeat: number of runs per case, the fastest one is reported
+    :return: result rows
+    :rtype: list
+    """
+    compression = 'gzip' if gzipped else 'none'
+    file_path = write(os.path.join(workdir, f"01-22-2021-{rows}-{compression}.csv"), rows, gzipped)
+    results = []
+    # spawn starts every case from a clean interpreter, fork would inherit the memory of the parent
+    context = multiprocessing.get_context('spawn')
+    runs = [(case, engine) for case in cases for engine in (engines if case in ENGINE_CASES else ['pandas'])]
+    for case, engine in runs:
+        with ProcessPoolExecutor(max_workers=1, mp_context=context) as executor:
+            result = executor.submit(run_case, case, engine, file_path, workdir, regions, providers, repeat).result()
+        handled = rows if result['rows'] is None else result['rows']
+        results.append({
+            'case': case,
+            'engine': engine,
+            'rows': rows,
+            'compression': compression,
+            'bytes': os.path.getsize(file_path),
+            'seconds': round(result['seconds'], 6),
+            'peak_rss_mb': result['peak_rss_mb'],
+            'rows_per_second': round(handled / result['seconds']) if handled and result['seconds'] else None,
+        })
+        print(f"{case:<11} {engine:<8} {rows:>9} {compression:<5} {result['seconds']:>10.4f}s "
+              f"{result['peak_rss_mb']:>8} MB {str(results[-1]['rows_per_second']):>12} rows/s")
+    return results
+
+
+def compare(results: list, baseline: list, threshold: float) -> list:
+    """
+    Find the cases which got slower than the baseline
+    :param results: result rows of this run
+    :param baseline: result rows of the baseline
+    :param threshold: allowed slowdown, 0.2 allows 20% more wall time
+    :return: descriptions of the regressions
+    :rtype: list
+    """
+    # Baselines written before engines existed only contain pandas
+    expected = {(row['case'], row.get('engine', 'pandas'), row['rows'], row['compression']): row for row in baseline}
+    regressions = []
+    for row in results:
+        base = expected.get((row['case'], row['engine'], row['rows'], row['compression']))
+        if base is None or not base['seconds']:
+            continue
+        ratio = row['seconds'] / base['seconds']
+        if ratio > 1 + threshold:
+            regressions.append(f"{row['case']}({row['engine']}) with {row['rows']} rows({row['compression']}) took "
+                               f"{row['seconds']:.4f}s, {ratio:.2f}x the baseline {base['seconds']:.4f}s")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--rows', default='10000,100000', help='comma separated row counts of the reports')
+    parser.add_argument('--cases', default=','.join(CASES), help='comma separated cases')
+    parser.add_argument('--engines', default='pandas', help='comma separated engines of parse, filter and end_to_end')
+    parser.add_argument('--compression', default='none,gzip', help='none, gzip or both comma separated')
+    parser.add_argument('--regions', default='Czechia;Czechia/Province 1;Germany', help='REGIONS of the runs')
+    parser.add_argument('--providers', default='s3,gcp', help='STORAGE_PROVIDER of the end-to-end runs')
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--output', default=None, help='write the results to this JSON file')
+    parser.add_argument('--baseline', default=None, help='fail if a case is slower than in this JSON file')
+    parser.add_argument('--threshold', type=float, default=0.2, help='allowed slowdown against the baseline')
+    parser.add_argument('--save-baseline', default=None, help='write the results as the new baseline')
+    parser.add_argument('--workdir', default=None, help='folder for reports and pages, a temporary one by default')
+    args = parser.parse_args()
+    workdir = args.workdir or tempfile.mkdtemp(prefix='processor-benchmark-')
+    os.makedirs(workdir, exist_ok=True)
+    results = []
+    try:
+        for rows in [int(value) for value in args.rows.split(',')]:
+            for compression in args.compression.split(','):
+                results += benchmark(rows, compression == 'gzip', args.cases.split(','), args.engines.split(','),
+                                     workdir, args.regions, args.providers, args.repeat)
+    finally:
+        if args.workdir is None:
+            shutil.rmtree(workdir, ignore_errors=True)
+    report = {
+        'python': platform.python_version(),
+        'pandas': pd.__version__,
+        'machine': platform.machine(),
+        'cpus': os.cpu_count(),
+        'results': results,
+    }
+    for path in [args.output, args.save_baseline]:
+        if path:
+            with open(path, 'w') as f:
+                json.dump(report, f, indent=2)
+    if args.baseline:
+        with open(args.baseline) as f:
+            regressions = compare(results, json.load(f)['results'], args.threshold)
+        for regression in regressions:
+            print(f"Regression: {regression}")
+        if regressions:
+            exit(1)
+        print(f"No case is more than {args.threshold:.0%} slower than {args.baseline}")
+
+
+if __name__ == '__main__':
+    main()
@@ -9,13 +9,32 @@ cron = BlockingScheduler()
 def main():
     processor = DataProcessor()
     processor.runit()
+    processor.print_cache_stats()
+
+
+def on_events():
+    """
+    Runs the processor as soon as Data ingestor published that a new object is ready
+    :return: None
+    """
+    events = DataProcessor().claim_events()
+    # Every provider publishes its own event, one run processes all of them
+    if events:
+        for event in events:
+            print(f"{event['provider']}://{event['bucket']}/{event['key']} is ready")
+        main()
 
 
 if __name__ == '__main__':
-    # Running for the first time requires a delay to allow downloading the file
-    sleep(100)
-    main()
+    processor = DataProcessor()
+    if processor.events is None:
+        # Running for the first time requires a delay to allow downloading the file
+        sleep(100)
+        main()
+    else:
+        # Events published before the processor started are still pending and picked up by the first poll
+        cron.add_job(on_events, 'interval', seconds=processor.event_poll_seconds, max_instances=1, coalesce=True)
+    # The timer stays as a fallback in case an event is lost
     cron.add_job(main, 'interval', hours=24)
     cron.start()
     atexit.register(lambda: cron.shutdown(wait=False))
-
@@ -0,0 +1,7 @@
+import sys
+from src import DataProcessor
+
+
+if __name__ == '__main__':
+    # python rebuild_timeseries.py [report.csv ...], without reports the download bucket is read
+    DataProcessor().rebuild_timeseries(sys.argv[1:])
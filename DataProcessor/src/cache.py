@@ -0,0 +1,159 @@
+import fcntl
+import hashlib
+import json
+import os
+import tempfile
+import time
+from contextlib import contextmanager
+
+
+class DownloadCache(object):
+    """
+    This class keeps downloaded objects on local disk keyed by provider, bucket, key and version(ETag or GCS
+    generation), so an object which did not change is never downloaded twice. The least recently used objects are
+    evicted once the cache grows over max_bytes. Several processor runs may share the directory, files are published
+    with an atomic rename and bookkeeping happens under a file lock
+    """
+
+    def __init__(self, directory: str, max_bytes: int, min_age: int = 300):
+        """
+        :param directory: cache directory, created if it does not exist
+        :param max_bytes: size the cache is trimmed to after every download
+        :param min_age: seconds a used object is protected from eviction, so a concurrent run can still read it
+        """
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.min_age = min_age
+        self._objects = os.path.join(directory, 'objects')
+        os.makedirs(self._objects, exist_ok=True)
+        self.hits = 0
+        self.misses = 0
+        self.bytes_saved = 0
+
+    @contextmanager
+    def _lock(self):
+        """
+        Exclusive lock over the cache directory, shared by every process using it
+        """
+        with open(os.path.join(self.directory, '.lock'), 'w') as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def path_for(self, provider: str, bucket: str, key: str, version: str) -> str:
+        """
+        Path of an object version in the cache, the file name of the key is kept so its extension still tells the
+        format
+        :param provider: s3 or gcp
+        :param bucket: bucket of the object
+        :param key: name of the object
+        :param version: ETag, GCS generation/md5 or anything which changes with the content
+        :return: file path
+        :rtype: str
+        """
+        digest = hashlib.sha256(f"{provider}\0{bucket}\0{key}\0{version}".encode()).hexdigest()
+        return os.path.join(self._objects, digest, os.path.basename(key))
+
+    def fetch(self, provider: str, bucket: str, key: str, version: str, download) -> str:
+        """
+        Return the cached copy of an object version or download it into the cache
+        :param provider: s3 or gcp
+        :param bucket: bucket of the object
+        :param key: name of the object
+        :param version: ETag, GCS generation/md5 or anything which changes with the content
+        :param download: function which downloads the object into the path it is called with
+        :return: path of the object in the cache
+        :rtype: str
+        """
+        file_path = self.path_for(provider, bucket, key, version)
+        # Eviction only happens under the lock, a hit touched here is protected for min_age once the lock is released
+        with self._lock():
+            try:
+                # mtime is the LRU clock, atime is often disabled on the mount
+                os.utime(file_path)
+                size = os.path.getsize(file_path)
+            except FileNotFoundError:
+                # Not cached, or evicted by another run, downloaded again below
+                size = None
+            if size is None:
+                # The temporary file keeps an eviction from removing the folder before the download starts
+                os.makedirs(os.path.dirname(file_path), exist_ok=True)
+                fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(file_path), suffix='.tmp')
+                os.close(fd)
+        if size is not None:
+            self.hits += 1
+            self.bytes_saved += size
+            self._record(hits=1, bytes_saved=size)
+            return file_path
+        try:
+            download(tmp_path)
+            # A concurrent run downloading the same version replaces it with identical content
+            os.replace(tmp_path, file_path)
+        except BaseException:
+            os.remove(tmp_path)
+            raise
+        self.misses += 1
+        self._record(misses=1)
+        self.evict()
+        return file_path
+
+    def _record(self, hits: int = 0, misses: int = 0, bytes_saved: int = 0):
+        """
+        Add to the counters of all runs which are kept in stats.json
+        :param hits: cache hits to add
+        :param misses: cache misses to add
+        :param bytes_saved: bytes which were not downloaded thanks to the cache
+        :return: None
+        """
+        with self._lock():
+            stats = self.stats()
+            stats['hits'] += hits
+            stats['misses'] += misses
+            stats['bytes_saved'] += bytes_saved
+            tmp_path = os.path.join(self.directory, 'stats.json.tmp')
+            with open(tmp_path, 'w') as f:
+                json.dump(stats, f)
+            os.replace(tmp_path, os.path.join(self.directory, 'stats.json'))
+
+    def stats(self) -> dict:
+        """
+        Counters of all runs which used the cache directory
+        :return: hits, misses and bytes_saved
+        :rtype: dict
+        """
+        path = os.path.join(self.directory, 'stats.json')
+        if not os.path.isfile(path):
+            return {'hits': 0, 'misses': 0, 'bytes_saved': 0}
+        with open(path) as f:
+            return json.load(f)
+
+    def evict(self):
+        """
+        Remove the least recently used objects until the cache fits max_bytes, recently used ones are kept
+        :return: None
+        """
+        with self._lock():
+            entries = []
+            for root, _, files in os.walk(self._objects):
+                for name in files:
+                    if name.endswith('.tmp'):
+                        continue
+                    path = os.path.join(root, name)
+                    stat = os.stat(path)
+                    entries.append((stat.st_mtime, stat.st_size, path))
+            total = sum(size for _, size, _ in entries)
+            now = time.time()
+            for mtime, size, path in sorted(entries):
+                if total <= self.max_bytes:
+                    break
+                if now - mtime < self.min_age:
+                    continue
+                os.remove(path)
+                try:
+                    os.rmdir(os.path.dirname(path))
+                except OSError:
+                    # A concurrent run is downloading into the same folder
+                    pass
+                total -= size
@@ -0,0 +1,158 @@
+import numpy as np
+import pandas as pd
+
+try:
+    import polars as pl
+except ImportError:
+    # polars is optional, pandas is the default engine
+    pl = None
+
+try:
+    import pyarrow as pa
+    import pyarrow.compute as pc
+    import pyarrow.csv as pacsv
+except ImportError:
+    pa = None
+
+# Strings pandas.read_csv reads as missing values, the other engines are given the same list
+NA_VALUES = ['', '#N/A', '#N/A N/A', '#NA', '-1.#IND', '-1.#QNAN', '-NaN', '-nan', '1.#IND', '1.#QNAN', '<NA>', 'N/A',
+             'NA', 'NULL', 'NaN', 'None', 'n/a', 'nan', 'null']
+
+
+def like_pandas(df: pd.DataFrame, null_counts: dict, rows: int) -> pd.DataFrame:
+    """
+    Give a frame converted from Arrow or Polars the dtypes pandas.read_csv infers for the whole file, so to_html
+    renders it byte for byte the same
+    :param df: filtered rows
+    :param null_counts: missing values of every column in the whole file
+    :param rows: rows of the whole file
+    :return: df
+    :rtype: pd.DataFrame
+    """
+    for column in df.columns:
+        if rows and null_counts[column] == rows:
+            # pandas reads a column without any value as float NaN
+            df[column] = np.nan
+        elif pd.api.types.is_integer_dtype(df[column]) and null_counts[column]:
+            # An integer column with missing values anywhere in the file is float in pandas
+            df[column] = df[column].astype('float64')
+        elif pd.api.types.is_object_dtype(df[column]):
+            # Arrow and Polars hand missing strings and booleans over as None, pandas as NaN
+            df[column] = df[column].where(df[column].notna(), np.nan)
+    return df
+
+
+def read_rows_polars(file_path: str, countries: list, columns: list = None, compression: str = None) -> pd.DataFrame:
+    """
+    Read the rows of some countries from a daily report with a lazy Polars scan, the country filter and the columns
+    are pushed into the multi-threaded scan so only matching rows are materialized
+    :param file_path: plain, gzip or zstd CSV
+    :param countries: values of Country_Region to keep
+    :param columns: columns to keep, all if not provided
+    :param compression: gzip | zstd | None, see detect_compression
+    :return: matching rows with the row numbers of the CSV as index
+    :rtype: pd.DataFrame
+    """
+    if pl is None:
+        raise ImportError("polars package is required for ENGINE=polars")
+    try:
+        return _read_rows_polars(file_path, countries, columns, compression, 10000)
+    except pl.exceptions.ComputeError:
+        # A column changed its type after the first 10000 rows, infer the schema from the whole file
+        return _read_rows_polars(file_path, countries, columns, compression, None)
+
+
+def _read_rows_polars(file_path: str, countries: list, columns: list, compression: str,
+                      infer_schema_length: int) -> pd.DataFrame:
+    """
+    :param file_path: plain, gzip or zstd CSV
+    :param countries: values of Country_Region to keep
+    :param columns: columns to keep, all if not provided
+    :param compression: gzip | zstd | None
+    :param infer_schema_length: rows the column types are inferred from, None for all
+    :return: matching rows with the row numbers of the CSV as index
+    :rtype: pd.DataFrame
+    """
+    options = dict(null_values=NA_VALUES, infer_schema_length=infer_schema_length)
+    if compression is None:
+        lazy = pl.scan_csv(file_path, **options)
+    else:
+        # scan_csv only reads plain files, compressed ones are decompressed in memory by read_csv
+        lazy = pl.read_csv(file_path, **options).lazy()
+    if columns is not None:
+        lazy = lazy.select(list(dict.fromkeys(list(columns) + ['Country_Region'])))
+    names = lazy.collect_schema().names() if hasattr(lazy, 'collect_schema') else lazy.columns
+    lazy = lazy.with_row_index('_row')
+    # The matching rows and the missing values of the whole file are collected by one collect_all, polars runs both
+    # plans in parallel
+    rows, stats = pl.collect_all([
+        lazy.filter(pl.col('Country_Region').is_in(countries)),
+        lazy.select([pl.col(name).null_count().alias(f"_nulls_{number}") for number, name in enumerate(names)] +
+                    [pl.len().alias('_rows')]),
+    ])
+    null_counts = {name: stats[f"_nulls_{number}"].item() for number, name in enumerate(names)}
+    df = rows.to_pandas().set_index('_row')
+    # The row index of polars is unsigned, pandas numbers rows with int64
+    df.index = df.index.astype('int64')
+    df.index.name = None
+    df = like_pandas(df, null_counts, stats['_rows'].item())
+    return df if columns is None else df[list(columns)]
+
+
+def read_rows_pyarrow(file_path: str, countries: list, columns: list = None, compression: str = None,
+                      block_size: int = 1024 * 1024) -> pd.DataFrame:
+    """
+    Read the rows of some countries from a daily report with the PyArrow CSV reader. The file is decoded block by
+    block in background threads, columns are pruned while reading and every block is filtered on Arrow memory before
+    the next one is read, only matching rows are converted to pandas
+    :param file_path: plain, gzip or zstd CSV
+    :param countries: values of Country_Region to keep
+    :param columns: columns to keep, all if not provided
+    :param compression: gzip | zstd | None, see detect_compression
+    :param block_size: bytes decoded at once, bounds peak memory
+    :return: matching rows with the row numbers of the CSV as index
+    :rtype: pd.DataFrame
+    """
+    if pa is None:
+        raise ImportError("pyarrow package is required for ENGINE=pyarrow")
+
+    def source():
+        stream = pa.OSFile(file_path)
+        return stream if compression is None else pa.CompressedInputStream(stream, compression)
+
+    include = None if columns is None else list(dict.fromkeys(list(columns) + ['Country_Region']))
+    options = dict(include_columns=include, null_values=NA_VALUES, strings_can_be_null=True)
+    read_options = pacsv.ReadOptions(block_size=block_size)
+    # pandas keeps dates as strings, the columns Arrow would read as dates are read as strings instead
+    with pacsv.open_csv(source(), read_options=read_options,
+                        convert_options=pacsv.ConvertOptions(**options)) as reader:
+        column_types = {field.name: pa.string() for field in reader.schema if pa.types.is_temporal(field.type)}
+    convert_options = pacsv.ConvertOptions(column_types=column_types, **options)
+    value_set = pa.array(countries, type=pa.string())
+    try:
+        batches, index, null_counts, rows = [], [], None, 0
+        with pacsv.open_csv(source(), read_options=read_options, convert_options=convert_options) as reader:
+            schema = reader.schema
+            for batch in reader:
+                counts = [column.null_count for column in batch.columns]
+                null_counts = counts if null_counts is None else [a + b for a, b in zip(null_counts, counts)]
+                mask = pc.fill_null(pc.is_in(batch.column('Country_Region'), value_set=value_set), False)
+                index.append(np.flatnonzero(mask.to_numpy(zero_copy_only=False)) + rows)
+                batches.append(batch.filter(mask))
+                rows += batch.num_rows
+        table = pa.Table.from_batches(batches, schema=schema)
+        null_counts = dict(zip(schema.names, null_counts or [0] * len(schema.names)))
+        index = np.concatenate(index) if index else np.array([], dtype=np.int64)
+    except pa.ArrowInvalid:
+        # Types are inferred from the first block, a column which changes its type later needs the whole file
+        table = pacsv.read_csv(source(), read_options=read_options, convert_options=convert_options)
+        null_counts = {name: table.column(name).null_count for name in table.column_names}
+        rows = table.num_rows
+        mask = pc.fill_null(pc.is_in(table.column('Country_Region'), value_set=value_set), False)
+        # A mask of the whole table is a ChunkedArray, its to_numpy takes no zero_copy_only
+        index = np.flatnonzero(mask.to_numpy())
+        table = table.filter(mask)
+    df = table.to_pandas()
+    df.index = index
+    df = like_pandas(df, null_counts, rows)
+    return df if columns is None else df[list(columns)]
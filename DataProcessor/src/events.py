@@ -0,0 +1,104 @@
+import os
+import sqlite3
+import time
+from contextlib import closing
+
+
+class EventTransport(object):
+    """
+    This class is the interface of the "object ready" events between Data ingestor and Data processor, a transport
+    publishes events and hands every event out once
+    """
+
+    def publish(self, provider: str, bucket: str, key: str, checksum: str = None) -> bool:
+        """
+        Publish that an object is uploaded and ready to be processed
+        :param provider: s3 or gcp
+        :param bucket: bucket of the object
+        :param key: name of the object
+        :param checksum: checksum of the content, the same object with the same checksum is published only once
+        :return: True if the event is new, False if it was a duplicate
+        :rtype: bool
+        """
+        raise NotImplementedError
+
+    def claim(self) -> list:
+        """
+        Take every pending event, a claimed event is never handed out again
+        :return: events as dicts with provider, bucket, key and checksum
+        :rtype: list
+        """
+        raise NotImplementedError
+
+
+class SQLiteEventTransport(EventTransport):
+    """
+    This class keeps events in a SQLite file, a volume shared by the containers is enough to connect them without any
+    cloud service
+    """
+
+    def __init__(self, path: str):
+        """
+        :param path: path of the SQLite file, created if it does not exist
+        """
+        self._path = path
+        directory = os.path.dirname(path)
+        if directory and not os.path.exists(directory):
+            os.makedirs(directory)
+        with closing(self._connect()) as connection:
+            # WAL lets the ingestor publish while the processor polls
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute(
+                "CREATE TABLE IF NOT EXISTS events ("
+                "id INTEGER PRIMARY KEY AUTOINCREMENT, "
+                "event_key TEXT NOT NULL UNIQUE, "
+                "provider TEXT NOT NULL, "
+                "bucket TEXT NOT NULL, "
+                "key TEXT NOT NULL, "
+                "checksum TEXT, "
+                "created_at REAL NOT NULL, "
+                "claimed_at REAL)"
+            )
+
+    def _connect(self):
+        """
+        Open a connection in autocommit mode, every statement is its own transaction unless BEGIN is used
+        :return: connection
+        """
+        return sqlite3.connect(self._path, timeout=30, isolation_level=None)
+
+    def publish(self, provider: str, bucket: str, key: str, checksum: str = None) -> bool:
+        event_key = f"{provider}:{bucket}:{key}:{checksum}"
+        with closing(self._connect()) as connection:
+            cursor = connection.execute(
+                "INSERT OR IGNORE INTO events (event_key, provider, bucket, key, checksum, created_at) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                (event_key, provider, bucket, key, checksum, time.time()),
+            )
+            return cursor.rowcount == 1
+
+    def claim(self) -> list:
+        with closing(self._connect()) as connection:
+            # BEGIN IMMEDIATE takes the write lock so two processors never claim the same events
+            connection.execute("BEGIN IMMEDIATE")
+            rows = connection.execute(
+                "SELECT id, provider, bucket, key, checksum FROM events WHERE claimed_at IS NULL ORDER BY id"
+            ).fetchall()
+            connection.executemany("UPDATE events SET claimed_at = ? WHERE id = ?",
+                                   [(time.time(), row[0]) for row in rows])
+            connection.execute("COMMIT")
+        return [{'provider': row[1], 'bucket': row[2], 'key': row[3], 'checksum': row[4]} for row in rows]
+
+
+def transport_from_env():
+    """
+    Create the event transport selected by EVENT_TRANSPORT
+    :return: transport, None if events are disabled
+    :rtype: EventTransport
+    """
+    transport = os.environ.get('EVENT_TRANSPORT', 'none')
+    if transport == 'sqlite':
+        return SQLiteEventTransport(os.environ.get('EVENT_DB', '/events/events.db'))
+    if transport == 'none':
+        return None
+    raise ValueError(f"Unsupported EVENT_TRANSPORT {transport}, use one of: none, sqlite")
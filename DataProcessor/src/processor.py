@@ -4,11 +4,27 @@ import pandas as pd
 import threading
 import sys
 import os
+import multiprocessing
+import re
+import json
 import jinja2
+import numpy as np
+import hashlib
+from concurrent.futures import Future, ProcessPoolExecutor, ThreadPoolExecutor
+from datetime import datetime
+from itertools import repeat
+from urllib.parse import quote
 from botocore.config import Config
 from boto3.s3.transfer import TransferConfig
 from google.cloud import storage
 
+from .cache import DownloadCache
+from .engines import read_rows_polars, read_rows_pyarrow
+from .events import transport_from_env
+from .publish import (REVALIDATE, pointer, published_version, read_release, release_objects,
+                      write_release)
+from .timeseries import TimeSeriesStore
+
 
 class ProgressPercentage(object):
     """
@@ -45,6 +61,321 @@ def is_gzipped(file_name: str) -> bool:
         return f.read(2) == b'\x1f\x8b'
 
 
+# Magic bytes of the codecs which Data ingestor may compress objects with
+MAGIC_BYTES = {
+    b'\x1f\x8b': 'gzip',
+    b'\x28\xb5\x2f\xfd': 'zstd',
+}
+
+
+def detect_compression(file_name: str):
+    """
+    This function detects the codec of a file from its first bytes, the object name or Content-Encoding is not trusted
+    since GCS may already have decompressed a gzip object while downloading it
+    :param file_name: file_name(full path)
+    :return: gzip | zstd | None for plain files
+    :rtype: str
+    """
+    with open(file_name, 'rb') as f:
+        head = f.read(4)
+    for magic, codec in MAGIC_BYTES.items():
+        if head.startswith(magic):
+            return codec
+    return None
+
+
+# Columns which are stored as categoricals, they repeat a few distinct values over the whole file
+CATEGORY_COLUMNS = ['Country_Region', 'Province_State']
+# Column which the ingestor stores the raw CSV row number in, it becomes the index again
+ROW_COLUMN = '_row'
+# Rows of the rendered regions published next to the pages, ShowData answers its data API from them
+ROWS_FILE = 'rows.json'
+
+
+def report_date(report_name: str) -> str:
+    """
+    Date of a daily report from its name
+    :param report_name: object name or path of the report, e.g. 01-22-2021.csv
+    :return: date as YYYY-MM-DD, None if the name does not contain a date
+    :rtype: str
+    """
+    match = re.search(r'(\d{2}-\d{2}-\d{4})', os.path.basename(report_name))
+    if match is None:
+        return None
+    return datetime.strptime(match.group(1), '%m-%d-%Y').strftime('%Y-%m-%d')
+
+
+def partition_object_name(prefix: str, report_name: str, country: str) -> str:
+    """
+    Object name of the columnar country partition Data ingestor writes next to a daily report
+    :param prefix: prefix of the columnar objects(COLUMNAR_PREFIX)
+    :param report_name: object name of the raw report, e.g. 01-22-2021.csv
+    :param country: value of Country_Region
+    :return: object name, None if the report name does not contain a date
+    :rtype: str
+    """
+    date = report_date(report_name)
+    if date is None:
+        return None
+    return f"{prefix}date={date}/country={quote(country, safe='')}/part.parquet"
+
+
+def read_partition(file_path: str, columns: list = None) -> pd.DataFrame:
+    """
+    Read a columnar country partition with the same index the rows had in the raw CSV
+    :param file_path: path of the Parquet file
+    :param columns: columns to read, all if not provided
+    :return: rows of the partition
+    :rtype: pd.DataFrame
+    """
+    if columns is not None:
+        columns = list(columns) + [ROW_COLUMN]
+    df = pd.read_parquet(file_path, columns=columns).set_index(ROW_COLUMN)
+    df.index.name = None
+    for column in df.columns:
+        if pd.api.types.is_object_dtype(df[column]):
+            # Missing strings come out of Parquet as None, read_csv gives NaN
+            df[column] = df[column].where(df[column].notna(), np.nan)
+    return df
+
+
+def read_partitions(file_paths: list, columns: list = None) -> pd.DataFrame:
+    """
+    Read several columnar country partitions into one frame in the order the rows had in the raw CSV
+    :param file_paths: paths of the Parquet files
+    :param columns: columns to read, all if not provided
+    :return: rows of all partitions
+    :rtype: pd.DataFrame
+    """
+    return pd.concat([read_partition(file_path, columns) for file_path in file_paths]).sort_index()
+
+
+def read_rows(file_path: str, countries: list, columns: list = None, chunk_size: int = 50000) -> pd.DataFrame:
+    """
+    Read the rows of some countries from a daily report. The CSV is parsed chunk by chunk and every chunk is filtered
+    before the next one is read, so peak memory depends on chunk_size instead of the size of the file
+    :param file_path: plain, gzip or zstd CSV
+    :param countries: values of Country_Region to keep
+    :param columns: columns to keep, all if not provided
+    :param chunk_size: rows parsed at once
+    :return: matching rows with the row numbers of the CSV as index
+    :rtype: pd.DataFrame
+    """
+    usecols = None
+    if columns is not None:
+        # Country_Region is needed for the filter even if it is not rendered
+        usecols = list(dict.fromkeys(list(columns) + ['Country_Region']))
+    dtype = {column: 'category' for column in CATEGORY_COLUMNS if usecols is None or column in usecols}
+    pieces = []
+    nullable = set()
+    # pandas decompresses gzip and zstd while parsing, the file is never inflated on disk
+    with pd.read_csv(file_path, compression=detect_compression(file_path), usecols=usecols, dtype=dtype,
+                     chunksize=chunk_size) as reader:
+        for chunk in reader:
+            nullable.update(chunk.columns[chunk.isna().any()])
+            pieces.append(chunk[chunk['Country_Region'].isin(countries)])
+    if not pieces:
+        return pd.DataFrame(columns=columns)
+    df = pd.concat(pieces)
+    for column in df.columns:
+        # Like a single read_csv, a column with missing values anywhere in the file is float, whichever chunk the
+        # kept rows came from
+        if column in nullable and pd.api.types.is_integer_dtype(df[column]):
+            df[column] = df[column].astype('float64')
+    return df if columns is None else df[list(columns)]
+
+
+# Engines which read the rows of some countries from a daily report, every one returns the same frame
+ENGINES = {
+    'pandas': read_rows,
+    'polars': read_rows_polars,
+    'pyarrow': read_rows_pyarrow,
+}
+
+
+def read_report(engine: str, file_path: str, countries: list, columns: list = None,
+                chunk_size: int = 50000) -> pd.DataFrame:
+    """
+    Read the rows of some countries from a daily report with one of ENGINES
+    :param engine: pandas | polars | pyarrow
+    :param file_path: plain, gzip or zstd CSV
+    :param countries: values of Country_Region to keep
+    :param columns: columns to keep, all if not provided
+    :param chunk_size: rows parsed at once by the pandas engine
+    :return: matching rows with the row numbers of the CSV as index
+    :rtype: pd.DataFrame
+    """
+    if engine not in ENGINES:
+        raise ValueError(f"Unsupported ENGINE {engine}, use one of: {', '.join(ENGINES)}")
+    if engine == 'pandas':
+        return read_rows(file_path, countries, columns, chunk_size)
+    df = ENGINES[engine](file_path, countries, columns, detect_compression(file_path))
+    # The pandas engine reads them as categories
+    return df.astype({column: 'category' for column in CATEGORY_COLUMNS if column in df.columns})
+
+
+def parse_regions(value: str) -> list:
+    """
+    Parse the regions Data processor renders a page for
+    :param value: semicolon separated Country_Region or Country_Region/Province_State, e.g. Czechia;Czechia/Prague
+    :return: (country, province) pairs, province is None for a whole country
+    :rtype: list
+    """
+    regions = []
+    for region in value.split(';'):
+        if not region.strip():
+            continue
+        country, _, province = region.partition('/')
+        regions.append((country.strip(), province.strip() or None))
+    return regions
+
+
+def region_name(region: tuple) -> str:
+    """
+    :param region: (country, province) pair
+    :return: readable name of the region
+    :rtype: str
+    """
+    country, province = region
+    return country if province is None else f"{province}, {country}"
+
+
+def region_slug(region: tuple) -> str:
+    """
+    :param region: (country, province) pair
+    :return: file name of the region page without extension
+    :rtype: str
+    """
+    return re.sub(r'[^a-z0-9]+', '-', '/'.join(part for part in region if part).lower()).strip('-')
+
+
+def split_regions(df: pd.DataFrame, regions: list, columns: list = None) -> list:
+    """
+    Split the rows of a report into one frame per region with a single groupby pass, a country is the union of its
+    provinces so country and province regions are served from the same groups
+    :param df: rows of the report with Country_Region and Province_State
+    :param regions: (country, province) pairs
+    :param columns: columns to keep, all if not provided
+    :return: one frame per region in the order of regions, rows keep their order in the report
+    :rtype: list
+    """
+    groups = df.groupby(['Country_Region', 'Province_State'], observed=True, dropna=False, sort=False).indices
+    positions = {}
+    for (country, province), rows in groups.items():
+        positions.setdefault((country, None), []).append(rows)
+        if not pd.isna(province):
+            positions[(country, province)] = [rows]
+    frames = []
+    for region in regions:
+        rows = np.sort(np.concatenate(positions[region])) if region in positions else []
+        frame = df.iloc[rows]
+        frames.append(frame if columns is None else frame[list(columns)])
+    return frames
+
+
+# Worker processes are spawned, a fork from a pipeline thread would copy locks other threads hold
+SPAWN = multiprocessing.get_context('spawn')
+# Fewer pages are rendered in the calling thread, starting worker processes costs more than rendering them
+RENDER_POOL_MIN_PAGES = 4
+# Templates are found relative to the package, not the working directory
+TEMPLATE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'templates')
+
+
+def template_environment(cache_dir: str = None) -> jinja2.Environment:
+    """
+    Environment loading the templates of Data processor, compiled templates are kept in cache_dir so a new process
+    loads them instead of compiling them again
+    :param cache_dir: bytecode cache folder, a folder in the temporary directory if not provided
+    :return: environment
+    :rtype: jinja2.Environment
+    """
+    if cache_dir:
+        os.makedirs(cache_dir, exist_ok=True)
+    # Templates ship with the code, checking them for changes on every render is not needed
+    return jinja2.Environment(loader=jinja2.FileSystemLoader(TEMPLATE_DIR),
+                              bytecode_cache=jinja2.FileSystemBytecodeCache(cache_dir), auto_reload=False)
+
+
+# Why Jinja2? Because it's easy to use, and later we can add more variables to the template, and it will be
+# easier to maintain and even we can add some logic to the template
+TEMPLATES = template_environment()
+
+
+def use_template_cache(cache_dir: str):
+    """
+    Keep the compiled templates of this process in cache_dir, TEMPLATE_CACHE_DIR of DataProcessor. Render workers
+    call it when they start
+    :param cache_dir: bytecode cache folder, created if it does not exist. None keeps the folder in the temporary
+        directory
+    :return: None
+    """
+    if not cache_dir:
+        return
+    os.makedirs(cache_dir, exist_ok=True)
+    TEMPLATES.bytecode_cache = jinja2.FileSystemBytecodeCache(cache_dir)
+
+
+def render_page(template_name: str, df: pd.DataFrame, file_path: str, trend: str = None) -> str:
+    """
+    Render the table of a region into a page, the page is streamed into the file instead of being built in memory
+    :param template_name: template in TEMPLATE_DIR
+    :param df: rows of the region
+    :param file_path: path of the page
+    :param trend: href of the trend page of the region to link, none if not provided
+    :return: file_path
+    :rtype: str
+    """
+    os.makedirs(os.path.dirname(file_path), exist_ok=True)
+    TEMPLATES.get_template(template_name).stream(data=df.to_html(), trend=trend).dump(file_path)
+    return file_path
+
+
+def render_pages(template_name: str, pages: list, workers: int, executor: ProcessPoolExecutor = None) -> list:
+    """
+    Render several pages, in worker processes when there are enough of them since to_html holds the GIL
+    :param template_name: template in TEMPLATE_DIR
+    :param pages: (df, file_path) pairs, or (df, file_path, trend) triples
+    :param workers: maximum number of worker processes
+    :param executor: pool of worker processes to use, a pool is started for these pages if not provided
+    :return: file_paths
+    :rtype: list
+    """
+    if workers <= 1 or len(pages) < RENDER_POOL_MIN_PAGES:
+        return [render_page(template_name, *page) for page in pages]
+    if executor is not None:
+        return list(executor.map(render_page, repeat(template_name), *zip(*pages)))
+    with ProcessPoolExecutor(max_workers=min(workers, len(pages)), mp_context=SPAWN) as executor:
+        return list(executor.map(render_page, repeat(template_name), *zip(*pages)))
+
+
+def write_rows(df: pd.DataFrame, file_path: str) -> str:
+    """
+    Write rows as a JSON list of objects, one per row with the columns as keys and missing values as null
+    :param df: rows to write
+    :param file_path: path of the JSON file
+    :return: file_path
+    :rtype: str
+    """
+    os.makedirs(os.path.dirname(file_path), exist_ok=True)
+    df.to_json(file_path, orient='records', date_format='iso', force_ascii=False)
+    return file_path
+
+
+def files_sha256(file_paths: list) -> str:
+    """
+    SHA-256 over the content of several files, identical inputs of different providers have the same digest
+    :param file_paths: paths of the files
+    :return: hex digest
+    :rtype: str
+    """
+    digest = hashlib.sha256()
+    for file_path in file_paths:
+        with open(file_path, 'rb') as f:
+            for chunk in iter(lambda: f.read(1024 * 1024), b''):
+                digest.update(chunk)
+    return digest.hexdigest()
+
+
 def s3_client_builder(access_key, secret_key, region) -> object:
     """
     This method use imported values from import_env_var function and creates s3 connection
@@ -73,6 +404,13 @@ def s3_client_builder(access_key, secret_key, region) -> object:
     return s3_client
 
 
+# Per provider: partition download method, download property, last file property and upload method
+PIPELINES = {
+    's3': ('download_partition_from_s3', 'download_from_s3', 'last_file_s3', 'upload_to_s3'),
+    'gcp': ('download_partition_from_gcs', 'download_from_gcs', 'get_last_file_from_gcs', 'upload_to_gcs'),
+}
+
+
 class DataProcessor:
     """
     This class aims to have data processor as one class
@@ -82,6 +420,9 @@ class DataProcessor:
         Load ENVs at class initialization
         """
         self._load_env()
+        # Parse and render of every source hash of a run, pipelines of providers with identical files share them
+        self._processed = {}
+        self._processed_lock = threading.Lock()
 
     def _set_google_api(self):
         """
@@ -106,36 +447,183 @@ class DataProcessor:
         self.download_path = os.getenv('DOWNLOAD_PATH')
         self.processed_folder = os.getenv('PROCESSED_FOLDER')
         self.storage_provider = os.getenv('STORAGE_PROVIDER')
+        self.source_format = os.getenv('SOURCE_FORMAT', 'csv')
+        self.columnar_prefix = os.getenv('COLUMNAR_PREFIX', 'columnar/')
+        self.events = transport_from_env()
+        self.countries = os.getenv('COUNTRIES', 'Czechia').split(',')
+        # Every country is its own region unless REGIONS lists countries and provinces
+        self.regions = parse_regions(os.getenv('REGIONS', '')) or [(country, None) for country in self.countries]
+        self.countries = list(dict.fromkeys(country for country, _ in self.regions))
+        self.render_workers = int(os.getenv('RENDER_WORKERS', os.cpu_count() or 1))
+        self.parse_pool = os.getenv('PARSE_POOL', 'thread')
+        self._parse_executor = None
+        self._render_executor = None
+        # Opt-in, without a store no SQLite file is written and no trend pages are rendered
+        timeseries_db = os.getenv('TIMESERIES_DB')
+        self.timeseries = TimeSeriesStore(timeseries_db) if timeseries_db and timeseries_db != 'none' else None
+        columns = os.getenv('COLUMNS')
+        self.columns = columns.split(',') if columns else None
+        self.chunk_size = int(os.getenv('CHUNK_SIZE', 50000))
+        self.engine = os.getenv('ENGINE', 'pandas')
+        # Compiled templates are kept in a folder of the temporary directory without it
+        self.template_cache_dir = os.getenv('TEMPLATE_CACHE_DIR')
+        use_template_cache(self.template_cache_dir)
+        self.event_poll_seconds = int(os.getenv('EVENT_POLL_SECONDS', 5))
+        self.manifest_key = os.getenv('MANIFEST_KEY', 'latest.json')
+        self.manifest_index_key = os.getenv('MANIFEST_INDEX_KEY', 'index.json')
+        self.publish_pointer_key = os.getenv('PUBLISH_POINTER_KEY', 'current.json')
+        self.publish_prefix = os.getenv('PUBLISH_PREFIX', 'versions/')
+        # Plain copies of the pages under their own names, for readers which do not follow the pointer
+        self.publish_plain = os.getenv('PUBLISH_PLAIN', 'true').lower() == 'true'
+        # Last file of every provider, resolved once per DataProcessor
+        self._last_files = {}
+        # 0 disables the cache, objects are downloaded into DOWNLOAD_PATH on every run as before
+        self.download_cache_max_bytes = int(os.getenv('DOWNLOAD_CACHE_MAX_BYTES', 1024 * 1024 * 1024))
+        self.cache_dir = os.getenv('CACHE_DIR') or os.path.join(self.download_path or '.', 'cache')
+        self.cache = None
+        if self.download_cache_max_bytes > 0:
+            self.cache = DownloadCache(self.cache_dir, self.download_cache_max_bytes)
 
     def runit(self):
         """
-        A function to run from APscheduler or anything else
+        A function to run from APscheduler or anything else, the pipeline of every provider in STORAGE_PROVIDER runs
+        at the same time so a run takes about as long as the slowest provider
         :return: None
         """
-        # check storage providers
-        if "s3" in self.storage_provider:
-            self.upload_to_s3()
-        elif "gcp" in self.storage_provider:
-            self.upload_to_gcs()
-        else:
-            print("No storage provider is selected, please select one of the following: s3, gcp")
+        providers = self.storage_provider.split(',')
+        for provider in providers:
+            if provider not in PIPELINES:
+                print("No storage provider is selected, please select one of the following: s3, gcp")
+                exit(1)
+        with self._processed_lock:
+            # Files of the previous run may have been replaced since, a run only shares within itself
+            self._processed = {}
+        self._parse_executor = None
+        if self.parse_pool == 'process':
+            self._parse_executor = ProcessPoolExecutor(max_workers=len(providers), mp_context=SPAWN)
+        # Created before the pipeline threads start and shared by them, its processes only start if a run renders
+        # enough pages
+        self._render_executor = None
+        if self.render_workers > 1:
+            self._render_executor = ProcessPoolExecutor(max_workers=self.render_workers, mp_context=SPAWN,
+                                                        initializer=use_template_cache,
+                                                        initargs=(self.template_cache_dir,))
+        failed = False
+        try:
+            with ThreadPoolExecutor(max_workers=len(providers)) as executor:
+                futures = {provider: executor.submit(self.run_pipeline, provider) for provider in providers}
+            for provider, future in futures.items():
+                # A failing provider does not stop the others, the run fails once all of them finished
+                if future.exception() is not None:
+                    print(f"Processing for {provider} failed: {future.exception()}")
+                    failed = True
+        finally:
+            for pool in [self._parse_executor, self._render_executor]:
+                if pool is not None:
+                    pool.shutdown()
+        if failed:
             exit(1)
 
+    def run_pipeline(self, provider: str):
+        """
+        This method downloads, parses, renders and uploads the last file of one provider
+        :param provider: s3 or gcp
+        :return: None
+        """
+        download_partition, download, last_file, upload = PIPELINES[provider]
+        partitions = self._download_partitions(getattr(self, download_partition))
+        source = partitions or getattr(self, download)
+        processed_folder, processed_files = self.process(provider, getattr(self, last_file), source)
+        getattr(self, upload)(processed_folder, processed_files)
+
+    def process(self, flag: str, report_name: str, source) -> tuple:
+        """
+        This method parses and renders a downloaded report, providers whose files are byte-identical share one
+        parse and render even when their pipelines run at the same time
+        :param flag: s3 or gcp, pages are written into PROCESSED_FOLDER/flag
+        :param report_name: object name of the report
+        :param source: file_path of a report or file_paths of its columnar partitions
+        :return: folder of the pages and their file_paths
+        :rtype: tuple
+        """
+        key = files_sha256(source if isinstance(source, list) else [source])
+        with self._processed_lock:
+            future = self._processed.get(key)
+            owner = future is None
+            if owner:
+                future = Future()
+                self._processed[key] = future
+        if not owner:
+            print(f"{flag} has the same input as another provider, reusing its pages")
+            return future.result()
+        try:
+            df = self._read(source)
+            if self.timeseries is not None:
+                self.append_timeseries(report_name, df)
+            processed_folder = os.path.join(self.processed_folder, flag)
+            processed_files = self.render(processed_folder, df)
+            processed_files.append(write_rows(df, os.path.join(processed_folder, ROWS_FILE)))
+            # Compressed once here, providers sharing the pages share the variants too
+            write_release(processed_folder, processed_files)
+            future.set_result((processed_folder, processed_files))
+        except BaseException as e:
+            future.set_exception(e)
+            raise
+        return future.result()
+
+    def claim_events(self) -> list:
+        """
+        This method takes the "object ready" events Data ingestor published since the last call
+        :return: events, empty if there is none or EVENT_TRANSPORT is not set
+        :rtype: list
+        """
+        if self.events is None:
+            return []
+        return self.events.claim()
+
+    def _is_report(self, name: str) -> bool:
+        """
+        This method tells daily reports apart from the other objects Data ingestor writes into the download buckets
+        :param name: object name
+        :return: True | False
+        :rtype: bool
+        """
+        # Columnar partitions and manifests live in the same bucket but are not daily reports
+        return not name.startswith(self.columnar_prefix) and name not in (self.manifest_key, self.manifest_index_key)
+
     @property
     def last_file_s3(self) -> str:
         """
-        This method returns the last file from the bucket
+        This method returns the last file from the bucket, the manifest pointer is read with one GET and the bucket is
+        only listed when there is no manifest
+        :return: last_file_s3
+        :rtype: str
+        """
+        if 's3' not in self._last_files:
+            s3_client = s3_client_builder(self.access_key, self.secret_key, self.region)
+            try:
+                response = s3_client.get_object(Bucket=self.s3_download_bucket, Key=self.manifest_key)
+                self._last_files['s3'] = json.loads(response['Body'].read())['key']
+            except s3_client.exceptions.NoSuchKey:
+                print(f"No {self.manifest_key} in {self.s3_download_bucket}, listing the bucket")
+                self._last_files['s3'] = self._list_last_file_s3(s3_client)
+        return self._last_files['s3']
+
+    def _list_last_file_s3(self, s3_client) -> str:
+        """
+        This method finds the last file by listing the whole bucket
+        :param s3_client: client created by s3_client_builder
         :return: last_file_s3
         :rtype: str
         """
-        # get last file from s3
-        s3_client = s3_client_builder(self.access_key, self.secret_key, self.region)
         paginator = s3_client.get_paginator('list_objects_v2')
         page_iterator = paginator.paginate(Bucket=self.s3_download_bucket)
         latest_file = None
         for page in page_iterator:
             if 'Contents' in page:
                 for obj in page['Contents']:
+                    if not self._is_report(obj['Key']):
+                        continue
                     if latest_file is None or obj['LastModified'] > latest_file['LastModified']:
                         latest_file = obj
         if latest_file is not None:
@@ -147,16 +635,35 @@ class DataProcessor:
     @property
     def get_last_file_from_gcs(self) -> str:
         """
-        This method gets the last file from gcs
+        This method gets the last file from gcs, the manifest pointer is read with one GET and the bucket is only
+        listed when there is no manifest
+        :return: last file from gcs
+        :rtype: str
+        """
+        if 'gcp' not in self._last_files:
+            self._set_google_api()
+            storage_client = storage.Client()
+            bucket = storage_client.bucket(self.gcs_download_bucket)
+            manifest = bucket.get_blob(self.manifest_key)
+            if manifest is not None:
+                self._last_files['gcp'] = json.loads(manifest.download_as_bytes())['key']
+            else:
+                print(f"No {self.manifest_key} in {self.gcs_download_bucket}, listing the bucket")
+                self._last_files['gcp'] = self._list_last_file_gcs(bucket)
+        return self._last_files['gcp']
+
+    def _list_last_file_gcs(self, bucket) -> str:
+        """
+        This method finds the last file by listing the whole bucket
+        :param bucket: google.cloud.storage bucket object
         :return: last file from gcs
         :rtype: str
         """
-        self._set_google_api()
-        storage_client = storage.Client()
-        bucket = storage_client.get_bucket(self.gcs_download_bucket)
         blobs = bucket.list_blobs()
         latest_file = None
         for blob in blobs:
+            if not self._is_report(blob.name):
+                continue
             if latest_file is None or blob.updated > latest_file.updated:
                 latest_file = blob
         if latest_file is not None:
@@ -165,125 +672,317 @@ class DataProcessor:
             print("No files found in bucket")
             exit(1)
 
+    def _fetch(self, provider: str, bucket: str, key: str, version: str, download) -> str:
+        """
+        This method downloads an object through the download cache, or into DOWNLOAD_PATH/bucket/key if the cache is
+        disabled
+        :param provider: s3 or gcp
+        :param bucket: bucket of the object
+        :param key: name of the object
+        :param version: ETag or GCS generation of the object
+        :param download: function which downloads the object into the path it is called with
+        :return: file_path of the object
+        :rtype: str
+        """
+        if self.cache is not None:
+            return self.cache.fetch(provider, bucket, key, version, download)
+        file_path = os.path.join(self.download_path, bucket, key)
+        os.makedirs(os.path.dirname(file_path), exist_ok=True)
+        download(file_path)
+        return file_path
+
+    def print_cache_stats(self):
+        """
+        This method prints the download cache counters of this run and of all runs sharing CACHE_DIR
+        :return: None
+        """
+        if self.cache is None:
+            return
+        total = self.cache.stats()
+        print(f"Download cache: {self.cache.hits} hits, {self.cache.misses} misses, {self.cache.bytes_saved} bytes "
+              f"saved in this run, {total['hits']} hits, {total['misses']} misses, {total['bytes_saved']} bytes "
+              f"saved in total")
+
     @property
     def download_from_s3(self) -> str:
         """
-        This method downloads the last file from s3
+        This method downloads the last file from s3, an object whose ETag did not change is read from the cache
         :return: file_path of downloaded file from s3
         :rtype: str
         """
         s3_client = s3_client_builder(self.access_key, self.secret_key, self.region)
-        # Check if the download folder exists
-        if not os.path.exists(self.download_path):
-            os.makedirs(self.download_path)
-        # Create s3 folder in download folder
-        s3_folder = os.path.join(self.download_path, self.s3_download_bucket)
-        if not os.path.exists(s3_folder):
-            os.makedirs(s3_folder)
-        file_path = os.path.join(s3_folder, self.last_file_s3)
-        s3_client.download_file(self.s3_download_bucket, self.last_file_s3, f"{file_path}")
-        return file_path
+        key = self.last_file_s3
+        # A HEAD is enough to know if the cached copy is still the newest version
+        etag = s3_client.head_object(Bucket=self.s3_download_bucket, Key=key)['ETag']
+        return self._fetch('s3', self.s3_download_bucket, key, etag,
+                           lambda file_path: s3_client.download_file(self.s3_download_bucket, key, file_path))
 
     @property
     def download_from_gcs(self)-> str:
         """
-        Downloads the last file from gcs
+        Downloads the last file from gcs, an object whose generation did not change is read from the cache
         :return: file_path
         :rtype: str
         """
         self._set_google_api()
         storage_client = storage.Client()
         bucket = storage_client.get_bucket(self.gcs_download_bucket)
-        blob = bucket.blob(self.get_last_file_from_gcs)
-        # Check if the download folder exists
-        if not os.path.exists(self.download_path):
-            os.makedirs(self.download_path)
-        # create gcs folder in download folder
-        gcs_folder = os.path.join(self.download_path, self.gcs_download_bucket)
-        if not os.path.exists(gcs_folder):
-            os.makedirs(gcs_folder)
-        file_path = os.path.join(gcs_folder, self.get_last_file_from_gcs)
-        blob.download_to_filename(file_path)
-        return file_path
+        # get_blob loads the metadata, the content is only downloaded on a cache miss
+        blob = bucket.get_blob(self.get_last_file_from_gcs)
+        if blob is None:
+            print(f"{self.get_last_file_from_gcs} does not exist in {self.gcs_download_bucket}")
+            exit(1)
+        return self._fetch('gcp', self.gcs_download_bucket, blob.name, f"{blob.generation}:{blob.md5_hash}",
+                           blob.download_to_filename)
 
-    @property
-    def extract(self) -> list:
+    def download_partition_from_s3(self, country: str) -> str:
+        """
+        This method downloads the columnar partition of a country for the last file from s3
+        :param country: value of Country_Region
+        :return: file_path of the partition, None if the ingestor did not write one
+        :rtype: str
+        """
+        object_name = partition_object_name(self.columnar_prefix, self.last_file_s3, country)
+        if object_name is None:
+            return None
+        s3_client = s3_client_builder(self.access_key, self.secret_key, self.region)
+        try:
+            etag = s3_client.head_object(Bucket=self.s3_download_bucket, Key=object_name)['ETag']
+            return self._fetch('s3', self.s3_download_bucket, object_name, etag,
+                               lambda file_path: s3_client.download_file(self.s3_download_bucket, object_name,
+                                                                         file_path))
+        except Exception as e:
+            print(f"Columnar partition {object_name} is not available in s3, falling back to CSV: {e}")
+            return None
+
+    def download_partition_from_gcs(self, country: str) -> str:
+        """
+        This method downloads the columnar partition of a country for the last file from gcs
+        :param country: value of Country_Region
+        :return: file_path of the partition, None if the ingestor did not write one
+        :rtype: str
+        """
+        object_name = partition_object_name(self.columnar_prefix, self.get_last_file_from_gcs, country)
+        if object_name is None:
+            return None
+        self._set_google_api()
+        storage_client = storage.Client()
+        blob = storage_client.get_bucket(self.gcs_download_bucket).get_blob(object_name)
+        if blob is None:
+            print(f"Columnar partition {object_name} is not available in gcs, falling back to CSV")
+            return None
+        return self._fetch('gcp', self.gcs_download_bucket, object_name, f"{blob.generation}:{blob.md5_hash}",
+                           blob.download_to_filename)
+
+    def _download_partitions(self, download_partition) -> list:
         """
-        This method extracts the last file from s3
-        :return: file_paths of the extracted data
+        This method downloads the columnar partition of every country when SOURCE_FORMAT=parquet
+        :param download_partition: download_partition_from_s3 or download_partition_from_gcs
+        :return: file_paths of the partitions, None if the CSV has to be read instead
         :rtype: list
         """
-        file_paths = []
-        providers = self.storage_provider.split(',')
-        for provider in providers:
-            if provider == 's3':
-                file_paths.append(self.download_from_s3)
-                flag = 's3'
-            elif provider == 'gcp':
-                file_paths.append(self.download_from_gcs)
-                flag = 'gcp'
-            else:
-                print("No supported storage provider found")
-                exit(1)
-        processed_files = []
+        if self.source_format != 'parquet':
+            return None
+        file_paths = [download_partition(country) for country in self.countries]
+        if None in file_paths:
+            return None
+        return file_paths
+
+    def _read(self, source) -> pd.DataFrame:
+        """
+        This method reads the rows of every country in REGIONS
+        :param source: file_path of a report or file_paths of its columnar partitions
+        :return: rows with the columns needed for rendering and the time-series store
+        :rtype: pd.DataFrame
+        """
+        columns = None
+        if self.columns is not None:
+            # Country_Region and Province_State split the rows into regions even if they are not rendered
+            extra = ['Country_Region', 'Province_State']
+            if self.timeseries is not None:
+                extra += ['Confirmed', 'Deaths']
+            columns = list(dict.fromkeys(self.columns + extra))
+        if isinstance(source, list):
+            # The partitions only hold the rows of the countries, nothing else is read
+            args = (read_partitions, source, columns)
+        else:
+            args = (read_report, self.engine, source, self.countries, columns, self.chunk_size)
+        if self._parse_executor is not None:
+            return self._parse_executor.submit(*args).result()
+        return args[0](*args[1:])
+
+    def append_timeseries(self, report_name: str, df: pd.DataFrame):
+        """
+        This method appends the rows of a daily report to the time-series store, a day which is already stored is
+        ignored
+        :param report_name: object name of the report
+        :param df: rows of the report
+        :return: None
+        """
+        date = report_date(report_name)
+        if date is None:
+            print(f"{report_name} does not contain a date, not adding it to the time-series store")
+        elif self.timeseries.append(date, df):
+            print(f"Added {date} to the time-series store")
+
+    def rebuild_timeseries(self, file_paths: list = None):
+        """
+        This method loads every daily report into an empty time-series store in one pass, reports whose columns are
+        not Country_Region, Province_State, Confirmed and Deaths(before 03-22-2020) are skipped
+        :param file_paths: local reports, every report in the download bucket of the first provider if not provided
+        :return: None
+        """
+        if self.timeseries is None:
+            print("TIMESERIES_DB is not set, nothing to rebuild")
+            exit(1)
+        if not file_paths:
+            file_paths = self.download_all_reports()
+        columns = ['Country_Region', 'Province_State', 'Confirmed', 'Deaths']
+        reports = []
         for file_path in file_paths:
-            if is_gzipped(file_path):
-                df = pd.read_csv(file_path, compression='gzip')
-            else:
-                df = pd.read_csv(file_path)
-            # get Country_Region row which matches with Czechia
-            czechia_row = df.loc[df['Country_Region'] == 'Czechia']
-            # convert to table
-            czechia_table = czechia_row.to_html()
-            # Why Jinja2? Because it's easy to use, and later we can add more variables to the template, and it will be
-            # easier to maintain and even we can add some logic to the template
-            template = jinja2.Template(open('src/templates/index.html.j2').read())
-            # Check if the processed folder exists
-            if not os.path.exists(self.processed_folder):
-                os.makedirs(self.processed_folder)
-            # create folder based on flag
-            if flag == 's3':
-                # check if processed folder exists
-                processed_folder = os.path.join(self.processed_folder, "s3")
-                if not os.path.exists(processed_folder):
-                    os.makedirs(processed_folder)
-            elif flag == 'gcp':
-                processed_folder = os.path.join(self.processed_folder, "gcp")
-                if not os.path.exists(processed_folder):
-                    os.makedirs(processed_folder)
-            processed_file_path = os.path.join(processed_folder, f"index.html")
-
-            with open(f'{processed_file_path}', 'w') as f:
-                f.write(template.render(data=czechia_table))
-            processed_files.append(processed_file_path)
-        return processed_files
-
-    def upload_to_s3(self):
-        """
-        This method uploads the processed file to s3
+            date = report_date(file_path)
+            if date is None:
+                print(f"{file_path} does not contain a date, skipping it")
+                continue
+            try:
+                reports.append((date, read_report(self.engine, file_path, self.countries, columns, self.chunk_size)))
+            except ValueError as e:
+                print(f"Skipping {file_path}: {e}")
+        self.timeseries.clear()
+        print(f"Rebuilt the time-series store with {self.timeseries.append_many(reports)} days")
+
+    def download_all_reports(self) -> list:
+        """
+        This method downloads every daily report from the download bucket of the first provider through the cache
+        :return: file_paths of the reports
+        :rtype: list
+        """
+        provider = self.storage_provider.split(',')[0]
+        file_paths = []
+        if provider == 's3':
+            s3_client = s3_client_builder(self.access_key, self.secret_key, self.region)
+            paginator = s3_client.get_paginator('list_objects_v2')
+            for page in paginator.paginate(Bucket=self.s3_download_bucket):
+                for obj in page.get('Contents', []):
+                    if self._is_report(obj['Key']):
+                        file_paths.append(self._fetch(
+                            's3', self.s3_download_bucket, obj['Key'], obj['ETag'],
+                            lambda file_path, key=obj['Key']: s3_client.download_file(self.s3_download_bucket, key,
+                                                                                      file_path)))
+        elif provider == 'gcp':
+            self._set_google_api()
+            storage_client = storage.Client()
+            for blob in storage_client.bucket(self.gcs_download_bucket).list_blobs():
+                if self._is_report(blob.name):
+                    file_paths.append(self._fetch('gcp', self.gcs_download_bucket, blob.name,
+                                                  f"{blob.generation}:{blob.md5_hash}", blob.download_to_filename))
+        else:
+            print("No supported storage provider found")
+            exit(1)
+        return file_paths
+
+    def render(self, processed_folder: str, df: pd.DataFrame) -> list:
+        """
+        This method renders a page per region and an index page linking them, a single region is rendered as the
+        index page itself. With the time-series store every region also gets a trend page
+        :param processed_folder: folder the pages are written into
+        :param df: rows of every country in REGIONS
+        :return: file_paths of the pages
+        :rtype: list
+        """
+        frames = split_regions(df, self.regions, self.columns)
+        links = [{'name': region_name(region), 'href': f"regions/{region_slug(region)}.html"}
+                 for region in self.regions]
+        if self.timeseries is not None:
+            for region, link in zip(self.regions, links):
+                link['trend'] = f"trends/{region_slug(region)}.html"
+        if len(self.regions) == 1:
+            # The single region is the index page, it links its trend page itself
+            pages = [(frames[0], os.path.join(processed_folder, 'index.html'), links[0].get('trend'))]
+        else:
+            pages = [(frame, os.path.join(processed_folder, link['href']), None) for frame, link in zip(frames, links)]
+        if self.timeseries is not None:
+            for region, link in zip(self.regions, links):
+                # Deltas and averages are stored already, a trend is one indexed query
+                pages.append((self.timeseries.trend(*region), os.path.join(processed_folder, link['trend']), None))
+        processed_files = render_pages('index.html.j2', pages, self.render_workers, self._render_executor)
+        if len(self.regions) == 1:
+            return processed_files
+        index_path = os.path.join(processed_folder, 'index.html')
+        TEMPLATES.get_template('regions.html.j2').stream(regions=links).dump(index_path)
+        return [index_path] + processed_files
+
+    def publish(self, provider: str, processed_folder: str, current: bytes, put) -> bool:
+        """
+        This method publishes the pages of a release unless the pointer already names it. Pages and their gzip and
+        brotli variants are written below an immutable version prefix first, then the pointer is replaced in a single
+        write so readers switch from one complete version to the next
+        :param provider: s3 or gcp
+        :param processed_folder: folder of the pages and their release
+        :param current: content of the published pointer, None if there is none
+        :param put: callable(object_name, file_path or bytes, headers) writing one object
+        :return: True if anything was written
+        :rtype: bool
+        """
+        release = read_release(processed_folder)
+        if published_version(current) == release['version']:
+            print(f"{provider} already publishes version {release['version'][:12]}, nothing to upload")
+            return False
+        for object_name, file_path, headers in release_objects(processed_folder, release, self.publish_prefix):
+            put(object_name, file_path, headers)
+        put(self.publish_pointer_key, pointer(release, self.publish_prefix),
+            {'content_type': 'application/json', 'content_encoding': None, 'cache_control': REVALIDATE,
+             'sha256': release['version']})
+        if self.publish_plain:
+            for name, page in release['pages'].items():
+                put(name, os.path.join(processed_folder, name),
+                    {'content_type': page['content_type'], 'content_encoding': None, 'cache_control': REVALIDATE,
+                     'sha256': page['sha256']})
+        print(f"{provider} publishes version {release['version'][:12]}")
+        return True
+
+    def upload_to_s3(self, processed_folder: str, processed_file_paths: list):
+        """
+        This method publishes the processed files to s3, nothing is written if they did not change
+        :param processed_folder: folder of the pages
+        :param processed_file_paths: file_paths of the pages
         :return: None
         """
         s3_client = s3_client_builder(self.access_key, self.secret_key, self.region)
-        s3_client.create_bucket(Bucket=self.s3_upload_bucket)
+        try:
+            s3_client.head_bucket(Bucket=self.s3_upload_bucket)
+        except s3_client.exceptions.ClientError:
+            s3_client.create_bucket(Bucket=self.s3_upload_bucket)
+        try:
+            current = s3_client.get_object(Bucket=self.s3_upload_bucket, Key=self.publish_pointer_key)['Body'].read()
+        except s3_client.exceptions.NoSuchKey:
+            current = None
+
         transfer_config = TransferConfig(
             multipart_threshold=1024 * 25,
             max_concurrency=16,
             multipart_chunksize=1024 * 25,
             use_threads=True
         )
-        processed_file_paths = self.extract
-        for processed_file_path in processed_file_paths:
-            if "s3" in processed_file_path:
-                try:
-                    s3_client.upload_file(processed_file_path, self.s3_upload_bucket, 'index.html',
-                                          Config=transfer_config, Callback=ProgressPercentage(processed_file_path))
-                except Exception as e:
-                    print(e)
-                    exit(1)
-
-    def upload_to_gcs(self):
-        """
-        This method uploads the processed file to gcs
+
+        def put(object_name, body, headers):
+            extra_args = {'ContentType': headers['content_type'], 'CacheControl': headers['cache_control'],
+                          'Metadata': {'sha256': headers['sha256']}}
+            if headers['content_encoding']:
+                extra_args['ContentEncoding'] = headers['content_encoding']
+            if isinstance(body, bytes):
+                s3_client.put_object(Bucket=self.s3_upload_bucket, Key=object_name, Body=body, **extra_args)
+            else:
+                s3_client.upload_file(body, self.s3_upload_bucket, object_name, ExtraArgs=extra_args,
+                                      Config=transfer_config, Callback=ProgressPercentage(body))
+
+        self.publish('s3', processed_folder, current, put)
+
+    def upload_to_gcs(self, processed_folder: str, processed_file_paths: list):
+        """
+        This method publishes the processed files to gcs, nothing is written if they did not change
+        :param processed_folder: folder of the pages
+        :param processed_file_paths: file_paths of the pages
         :return: None
         """
         # Check if application default credentials are set
@@ -298,9 +997,18 @@ class DataProcessor:
             bucket = storage_client.create_bucket(self.gcs_upload_bucket)
         else:
             bucket = storage_client.get_bucket(self.gcs_upload_bucket)
-        processed_file_paths = self.extract
-        for processed_file_path in processed_file_paths:
-            if "gcp" in processed_file_path:
-                blob = bucket.blob('index.html')
-                blob.upload_from_filename(processed_file_path)
-                print(f"File {processed_file_path} uploaded to {self.gcs_upload_bucket}")
+        blob = bucket.get_blob(self.publish_pointer_key)
+        current = blob.download_as_bytes() if blob is not None else None
+
+        def put(object_name, body, headers):
+            blob = bucket.blob(object_name)
+            blob.cache_control = headers['cache_control']
+            blob.content_encoding = headers['content_encoding']
+            blob.metadata = {'sha256': headers['sha256']}
+            if isinstance(body, bytes):
+                blob.upload_from_string(body, content_type=headers['content_type'])
+            else:
+                blob.upload_from_filename(body, content_type=headers['content_type'])
+            print(f"File {object_name} uploaded to {self.gcs_upload_bucket}")
+
+        self.publish('gcp', processed_folder, current, put)
@@ -0,0 +1,178 @@
+import os
+import sqlite3
+from contextlib import closing
+
+import pandas as pd
+
+# Province of the rows which hold the total of a whole country, a control character no Province_State contains. Rows
+# without a province, read as NaN or as an empty string, are part of the country total only
+COUNTRY_TOTAL = '\x1f'
+# Stores written before COUNTRY_TOTAL was a control character held the country totals under ''
+LEGACY_COUNTRY_TOTAL = ''
+VALUE_COLUMNS = ['confirmed', 'deaths']
+DERIVED_COLUMNS = ['new_confirmed', 'new_deaths', 'new_confirmed_7d', 'new_deaths_7d']
+
+
+def daily_totals(df: pd.DataFrame) -> pd.DataFrame:
+    """
+    Sum the rows of a daily report per country and per province
+    :param df: rows of a daily report with Country_Region, Province_State, Confirmed and Deaths
+    :return: country, province, confirmed and deaths, province is COUNTRY_TOTAL for the total of a country
+    :rtype: pd.DataFrame
+    """
+    values = df[['Country_Region', 'Province_State']].copy()
+    for column in VALUE_COLUMNS:
+        values[column] = pd.to_numeric(df[column.capitalize()], errors='coerce')
+    countries = values.groupby('Country_Region', observed=True)[VALUE_COLUMNS].sum().reset_index()
+    countries['Province_State'] = COUNTRY_TOTAL
+    named = values['Province_State'].astype('string').str.strip().fillna('') != ''
+    provinces = values[named].groupby(
+        ['Country_Region', 'Province_State'], observed=True)[VALUE_COLUMNS].sum().reset_index()
+    totals = pd.concat([countries, provinces], ignore_index=True)
+    totals = totals.rename(columns={'Country_Region': 'country', 'Province_State': 'province'})
+    return totals.astype({'country': str, 'province': str})
+
+
+def derive(df: pd.DataFrame) -> pd.DataFrame:
+    """
+    Compute daily deltas and their average over the last 7 days for every country and province at once
+    :param df: date, country, province, confirmed and deaths
+    :return: df sorted by country, province and date with DERIVED_COLUMNS
+    :rtype: pd.DataFrame
+    """
+    df = df.sort_values(['country', 'province', 'date'], ignore_index=True)
+    grouped = df.groupby(['country', 'province'], sort=False)
+    df['new_confirmed'] = grouped['confirmed'].diff()
+    df['new_deaths'] = grouped['deaths'].diff()
+    # A calendar window, so a missing day does not stretch the average over more than 7 days
+    rolling = df.set_index(pd.to_datetime(df['date'])).groupby(['country', 'province'], sort=False)[
+        ['new_confirmed', 'new_deaths']].rolling('7D').mean()
+    df['new_confirmed_7d'] = rolling['new_confirmed'].to_numpy()
+    df['new_deaths_7d'] = rolling['new_deaths'].to_numpy()
+    return df
+
+
+class TimeSeriesStore(object):
+    """
+    This class keeps the daily totals of every country and province in a SQLite file. Days are only appended, deltas
+    and 7 day averages are computed when a day is appended so reading a trend is a single indexed query
+    """
+
+    def __init__(self, path: str):
+        """
+        :param path: path of the SQLite file, created if it does not exist
+        """
+        self._path = path
+        directory = os.path.dirname(path)
+        if directory and not os.path.exists(directory):
+            os.makedirs(directory)
+        with closing(self._connect()) as connection:
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute("CREATE TABLE IF NOT EXISTS days (date TEXT PRIMARY KEY)")
+            connection.execute(
+                "CREATE TABLE IF NOT EXISTS daily ("
+                "date TEXT NOT NULL, "
+                "country TEXT NOT NULL, "
+                "province TEXT NOT NULL, "
+                "confirmed REAL, "
+                "deaths REAL, "
+                "new_confirmed REAL, "
+                "new_deaths REAL, "
+                "new_confirmed_7d REAL, "
+                "new_deaths_7d REAL, "
+                "PRIMARY KEY (country, province, date))"
+            )
+            connection.execute("UPDATE daily SET province = ? WHERE province = ?",
+                               (COUNTRY_TOTAL, LEGACY_COUNTRY_TOTAL))
+
+    def _connect(self):
+        """
+        Open a connection in autocommit mode, every statement is its own transaction unless BEGIN is used
+        :return: connection
+        """
+        return sqlite3.connect(self._path, timeout=30, isolation_level=None)
+
+    def days(self) -> list:
+        """
+        :return: stored dates(YYYY-MM-DD) in order
+        :rtype: list
+        """
+        with closing(self._connect()) as connection:
+            return [row[0] for row in connection.execute("SELECT date FROM days ORDER BY date")]
+
+    def append(self, date: str, df: pd.DataFrame) -> bool:
+        """
+        Append the rows of a daily report, a day which is already stored is ignored
+        :param date: date of the report(YYYY-MM-DD)
+        :param df: rows of the report with Country_Region, Province_State, Confirmed and Deaths
+        :return: True if the day is new, False if it was already stored
+        :rtype: bool
+        """
+        return self.append_many([(date, df)]) == 1
+
+    def append_many(self, reports: list) -> int:
+        """
+        Append the rows of several daily reports, derived columns are computed once for all of them. Days which are
+        already stored are ignored, a day older than the newest stored one recomputes the days after it
+        :param reports: (date, df) pairs
+        :return: number of appended days
+        :rtype: int
+        """
+        with closing(self._connect()) as connection:
+            # BEGIN IMMEDIATE takes the write lock so two processors never append the same day
+            connection.execute("BEGIN IMMEDIATE")
+            try:
+                stored = {row[0] for row in connection.execute("SELECT date FROM days")}
+                new = {}
+                for date, df in reports:
+                    if date not in stored and date not in new:
+                        new[date] = daily_totals(df).assign(date=date)
+                if not new:
+                    connection.execute("COMMIT")
+                    return 0
+                start = min(new)
+                # The previous 7 stored days are enough for the deltas and averages of the new days
+                window = connection.execute(
+                    "SELECT MIN(date) FROM (SELECT date FROM days WHERE date < ? ORDER BY date DESC LIMIT 7)", (start,)
+                ).fetchone()[0] or start
+                history = pd.read_sql_query(
+                    "SELECT date, country, province, confirmed, deaths FROM daily WHERE date >= ?", connection,
+                    params=(window,))
+                df = derive(pd.concat([history] + list(new.values()), ignore_index=True))
+                df = df[df['date'] >= start]
+                columns = ['date', 'country', 'province'] + VALUE_COLUMNS + DERIVED_COLUMNS
+                rows = df[columns].astype(object).where(df[columns].notna(), None).itertuples(index=False)
+                connection.executemany(
+                    f"INSERT OR REPLACE INTO daily ({', '.join(columns)}) VALUES ({', '.join('?' * len(columns))})",
+                    rows)
+                connection.executemany("INSERT INTO days (date) VALUES (?)", [(date,) for date in new])
+                connection.execute("COMMIT")
+            except BaseException:
+                connection.execute("ROLLBACK")
+                raise
+        return len(new)
+
+    def trend(self, country: str, province: str = None) -> pd.DataFrame:
+        """
+        Daily totals, deltas and 7 day averages of a region
+        :param country: value of Country_Region
+        :param province: value of Province_State, None for the whole country
+        :return: rows indexed by date
+        :rtype: pd.DataFrame
+        """
+        with closing(self._connect()) as connection:
+            return pd.read_sql_query(
+                f"SELECT date, {', '.join(VALUE_COLUMNS + DERIVED_COLUMNS)} FROM daily "
+                "WHERE country = ? AND province = ? ORDER BY date", connection,
+                params=(country, COUNTRY_TOTAL if province is None else province), index_col='date')
+
+    def clear(self):
+        """
+        Remove every stored day
+        :return: None
+        """
+        with closing(self._connect()) as connection:
+            connection.execute("BEGIN IMMEDIATE")
+            connection.execute("DELETE FROM daily")
+            connection.execute("DELETE FROM days")
+            connection.execute("COMMIT")
@@ -0,0 +1,43 @@
+import importlib.util
+import os
+
+import pytest
+
+from src.processor import read_partitions, read_rows
+
+pytest.importorskip('pyarrow')
+
+# The sidecar is written by Data ingestor, its columnar module only needs pyarrow
+COLUMNAR_PATH = os.path.join(os.path.dirname(__file__), '..', '..', 'DataIngestor', 'src', 'columnar.py')
+HEADER = ('FIPS,Admin2,Province_State,Country_Region,Last_Update,Lat,Long_,Confirmed,Deaths,Recovered,Active,'
+          'Combined_Key')
+REPORT = HEADER + """
+,,,France,2021-01-23 05:22:33,46.2,2.2,100,10,0,,France
+,,Reunion,France,2021-01-23 05:22:33,-21.1,55.5,7,1,0,6.0,"Reunion, France"
+,,Martinique,France,2021-01-23 05:22:33,14.6,-61.0,5,NA,0,,"Martinique, France"
+,,,Czechia,2021-01-23 05:22:33,49.8,15.5,900,15,,,Czechia
+45001,Abbeville,South Carolina,US,2021-01-23 05:22:33,34.2,-82.4,1,0,0,1.0,"Abbeville, South Carolina, US"
+"""
+
+
+@pytest.fixture
+def columnar():
+    spec = importlib.util.spec_from_file_location('ingestor_columnar', COLUMNAR_PATH)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+@pytest.mark.parametrize('countries', [['France', 'Czechia'], ['Czechia']])
+@pytest.mark.parametrize('columns', [None, ['Province_State', 'Country_Region', 'Confirmed', 'Deaths']])
+def test_sidecar_renders_like_csv(tmp_path, columnar, columns, countries):
+    report = tmp_path / '01-22-2021.csv'
+    report.write_text(REPORT)
+    partitions = dict((object_name, local_path) for local_path, object_name in
+                      columnar.write_country_partitions(str(report), str(tmp_path / 'columnar'), 'columnar/'))
+    file_paths = [partitions[columnar.partition_object_name('columnar/', '2021-01-22', country)]
+                  for country in countries]
+    from_csv = read_rows(str(report), countries, columns)
+    from_sidecar = read_partitions(file_paths, columns)
+    assert from_sidecar.to_html() == from_csv.to_html()
+    assert 'NaN' in from_sidecar.to_html()
@@ -0,0 +1,51 @@
+import sqlite3
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from src.timeseries import COUNTRY_TOTAL, TimeSeriesStore, daily_totals
+
+
+def report(confirmed: int, mainland) -> pd.DataFrame:
+    """
+    :param confirmed: confirmed cases of mainland France, Reunion and Martinique add 12
+    :param mainland: Province_State of mainland France, NaN like the CSV or '' like a sidecar
+    :return: rows of a daily report
+    :rtype: pd.DataFrame
+    """
+    return pd.DataFrame({'Country_Region': ['France', 'France', 'France', 'Czechia'],
+                         'Province_State': [mainland, 'Reunion', 'Martinique', np.nan],
+                         'Confirmed': [confirmed, 7, 5, 900],
+                         'Deaths': [10, 1, np.nan, 15]})
+
+
+@pytest.mark.parametrize('mainland', [np.nan, '', ' '])
+def test_rows_without_province_count_for_the_country_only(mainland):
+    totals = daily_totals(report(100, mainland)).set_index(['country', 'province'])
+    assert totals.loc[('France', COUNTRY_TOTAL), 'confirmed'] == 112
+    assert totals.loc[('France', COUNTRY_TOTAL), 'deaths'] == 11
+    assert totals.loc[('France', 'Reunion'), 'confirmed'] == 7
+    assert sorted(totals.index) == sorted([('France', COUNTRY_TOTAL), ('France', 'Reunion'),
+                                           ('France', 'Martinique'), ('Czechia', COUNTRY_TOTAL)])
+
+
+@pytest.mark.parametrize('mainland', [np.nan, ''])
+def test_trend_of_a_country_with_provinces(tmp_path, mainland):
+    store = TimeSeriesStore(str(tmp_path / 'timeseries.db'))
+    assert store.append_many([('2021-01-22', report(100, mainland)), ('2021-01-23', report(110, mainland))]) == 2
+    france = store.trend('France')
+    assert france['confirmed'].tolist() == [112, 122]
+    assert france['new_confirmed'].tolist()[1:] == [10]
+    assert store.trend('France', 'Reunion')['confirmed'].tolist() == [7, 7]
+    assert store.trend('Czechia')['confirmed'].tolist() == [900, 900]
+
+
+def test_legacy_country_totals_are_migrated(tmp_path):
+    path = str(tmp_path / 'timeseries.db')
+    TimeSeriesStore(path).append('2021-01-22', report(100, np.nan))
+    with sqlite3.connect(path) as connection:
+        connection.execute("UPDATE daily SET province = '' WHERE province = ?", (COUNTRY_TOTAL,))
+    store = TimeSeriesStore(path)
+    store.append('2021-01-23', report(110, np.nan))
+    assert store.trend('France')['new_confirmed'].tolist()[1:] == [10]
@@ -0,0 +1,167 @@
+"""
+ASGI app of ShowData, the same pages, data API and health endpoints as main.py for many concurrent keep-alive
+connections
+
+Usage: uvicorn asgi:app --host 0.0.0.0 --port 5000 [--workers 4]
+"""
+import asyncio
+import json
+from urllib.parse import parse_qsl
+
+from src import ShowData, load_pages, page_source, refresh, refreshes, warm_up
+from src.api import ROWS_FILE, respond_api
+from src.pages import respond
+
+# Folders of pages next to index.html, served under their own path
+PAGE_FOLDERS = ['/regions/', '/trends/']
+
+show_data = ShowData()
+# Pages of this process, or the shared store of all workers with SHARED_STORE_DIR
+pages = page_source(show_data.shared_store_dir)
+
+
+def page_name(path: str) -> str:
+    """
+    :param path: path of the request
+    :return: name of the page, None if the path is not a page
+    :rtype: str
+    """
+    if path == '/':
+        return 'index.html'
+    for folder in PAGE_FOLDERS:
+        if path.startswith(folder) and len(path) > len(folder):
+            return path[1:]
+    return None
+
+
+def read_file(file_path: str) -> bytes:
+    """
+    :param file_path: variant of a page of the shared store
+    :return: content
+    :rtype: bytes
+    """
+    with open(file_path, 'rb') as f:
+        return f.read()
+
+
+async def send_response(send, status: int, headers: dict, body: bytes, head: bool = False):
+    """
+    Send a complete response
+    :param send: ASGI send
+    :param status: HTTP status
+    :param headers: response headers
+    :param body: response body
+    :param head: leave the body out, the request was a HEAD
+    :return: None
+    """
+    if status != 304:
+        headers.setdefault('Content-Length', str(len(body)))
+    await send({
+        'type': 'http.response.start',
+        'status': status,
+        'headers': [(key.lower().encode('latin-1'), value.encode('latin-1')) for key, value in headers.items()],
+    })
+    await send({'type': 'http.response.body', 'body': b'' if head else body})
+
+
+async def send_json(send, status: int, payload: dict):
+    """
+    :param send: ASGI send
+    :param status: HTTP status
+    :param payload: body
+    :return: None
+    """
+    await send_response(send, status, {'Content-Type': 'application/json'}, json.dumps(payload).encode())
+
+
+async def refresh_periodically():
+    """
+    Refresh the pages every REFRESH_INTERVAL_SECONDS in a worker thread, the event loop keeps serving while a refresh
+    downloads and compresses
+    :return: None
+    """
+    while True:
+        await asyncio.sleep(show_data.refresh_interval_seconds)
+        try:
+            await asyncio.to_thread(refresh)
+        except Exception as e:
+            print(f"Refreshing pages failed: {e}")
+
+
+async def lifespan(receive, send):
+    """
+    Start loading the pages and the refresher with the server, stop the refresher with it
+    :param receive: ASGI receive
+    :param send: ASGI send
+    :return: None
+    """
+    tasks = []
+    while True:
+        message = await receive()
+        if message['type'] == 'lifespan.startup':
+            tasks = [asyncio.create_task(asyncio.to_thread(warm_up))]
+            # The other workers of a shared store serve what the refresher publishes
+            if await asyncio.to_thread(refreshes):
+                tasks.append(asyncio.create_task(refresh_periodically()))
+            await send({'type': 'lifespan.startup.complete'})
+        elif message['type'] == 'lifespan.shutdown':
+            for task in tasks:
+                task.cancel()
+            await send({'type': 'lifespan.shutdown.complete'})
+            return
+
+
+async def app(scope, receive, send):
+    """
+    ASGI entry point
+    :param scope: ASGI scope
+    :param receive: ASGI receive
+    :param send: ASGI send
+    :return: None
+    """
+    if scope['type'] == 'lifespan':
+        await lifespan(receive, send)
+        return
+    if scope['type'] != 'http':
+        return
+    path = scope['path']
+    if scope['method'] not in ('GET', 'HEAD'):
+        await send_response(send, 405, {'Allow': 'GET, HEAD'}, b'')
+    elif path == '/health':
+        await send_json(send, 200, {'status': 'ok'})
+    elif path == '/ready':
+        if not len(pages):
+            await send_json(send, 503, {'ready': False, 'pages': 0})
+        else:
+            await send_json(send, 200, {'ready': True, 'pages': len(pages)})
+    elif path.startswith('/api/'):
+        if not len(pages) and not await asyncio.to_thread(load_pages):
+            await send_response(send, 503, {}, b'')
+            return
+        params = {}
+        for key, value in parse_qsl(scope['query_string'].decode('latin-1')):
+            # The first value of a parameter counts, as request.args.to_dict() of main.py
+            params.setdefault(key, value)
+        request_headers = {key.decode('latin-1'): value.decode('latin-1') for key, value in scope['headers']}
+        status, headers, body = respond_api(path[len('/api/'):], pages.get(ROWS_FILE), params,
+                                            request_headers.get('if-none-match', ''))
+        await send_response(send, status, headers, body or b'', scope['method'] == 'HEAD')
+    else:
+        name = page_name(path)
+        # Requests arriving before the warm-up finished wait for it, without blocking the event loop
+        if name is not None and not len(pages) and not await asyncio.to_thread(load_pages):
+            await send_response(send, 503, {}, b'')
+            return
+        page = pages.get(name) if name is not None else None
+        if page is None:
+            await send_response(send, 404, {}, b'')
+            return
+        request_headers = {key.decode('latin-1'): value.decode('latin-1') for key, value in scope['headers']}
+        status, headers, body = respond(page, request_headers.get('accept-encoding', ''),
+                                        request_headers.get('if-none-match', ''))
+        if body is None:
+            body = b''
+        elif not isinstance(body, bytes):
+            # A file of the shared store, read in a worker thread so a slow read never stalls the other connections
+            body = await asyncio.to_thread(read_file, body)
+        await send_response(send, status, headers, body, scope['method'] == 'HEAD')
@@ -0,0 +1,247 @@
+"""
+Requests/s and latency percentiles of the ShowData servers under many concurrent keep-alive connections
+
+Usage(from ShowData folder): python -m benchmarks.loadtest --servers flask,gunicorn,uvicorn --connections 1000
+    [--duration 20] [--page-bytes 200000] [--client-processes 4] [--output results.json]
+"""
+import argparse
+import asyncio
+import json
+import multiprocessing
+import os
+import random
+import resource
+import shutil
+import string
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.request
+
+APP_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SERVERS = ['flask', 'gunicorn', 'uvicorn']
+
+
+def server_command(server: str, port: int, workers: int) -> list:
+    """
+    :param server: flask(app.run), gunicorn(as in the Dockerfile) or uvicorn(ASGI app)
+    :param port: port to listen on
+    :param workers: worker processes of gunicorn and uvicorn
+    :return: command line
+    :rtype: list
+    """
+    if server == 'flask':
+        return [sys.executable, os.path.join(APP_DIR, 'main.py')]
+    if server == 'gunicorn':
+        return [sys.executable, '-m', 'gunicorn', '--pythonpath', APP_DIR, '--bind', f"127.0.0.1:{port}",
+                '--workers', str(workers), '--threads', '2', 'main:app']
+    if server == 'uvicorn':
+        return [sys.executable, '-m', 'uvicorn', '--app-dir', APP_DIR, '--host', '127.0.0.1', '--port', str(port),
+                '--workers', str(workers), '--no-access-log', '--log-level', 'warning', 'asgi:app']
+    raise ValueError(f"Unknown server {server}, use one of: {', '.join(SERVERS)}")
+
+
+def write_page(workdir: str, page_bytes: int):
+    """
+    Write a synthetic index.html into the static folder the servers load their pages from
+    :param workdir: working directory of the servers
+    :param page_bytes: size of the page
+    :return: None
+    """
+    os.makedirs(os.path.join(workdir, 'static'), exist_ok=True)
+    rows = []
+    size = 0
+    while size < page_bytes:
+        cells = [f"<td>{random.choice(string.ascii_letters) * 8}</td><td>{random.randint(0, 10 ** 6)}</td>"
+                 for _ in range(4)]
+        row = '<tr>' + ''.join(cells) + '</tr>\n'
+        rows.append(row)
+        size += len(row)
+    with open(os.path.join(workdir, 'static', 'index.html'), 'w') as f:
+        f.write(f"<html><body><table>\n{''.join(rows)}</table></body></html>")
+
+
+def wait_ready(port: int, timeout: float):
+    """
+    Wait until a server answers /ready with 200
+    :param port: port of the server
+    :param timeout: seconds to wait at most
+    :return: None
+    """
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            with urllib.request.urlopen(f"http://127.0.0.1:{port}/ready", timeout=1) as response:
+                if response.status == 200:
+                    return
+        except OSError:
+            pass
+        time.sleep(0.2)
+    raise TimeoutError(f"Server on port {port} was not ready after {timeout}s")
+
+
+async def _connection(port: int, path: str, accept_encoding: str, deadline: float, latencies: list, errors: list):
+    """
+    Send requests over one keep-alive connection until the deadline
+    :param port: port of the server
+    :param path: path to request
+    :param accept_encoding: Accept-Encoding of the requests
+    :param deadline: time.monotonic() to stop at
+    :param latencies: seconds of every completed request are appended
+    :param errors: failures are appended
+    :return: None
+    """
+    request = (f"GET {path} HTTP/1.1\r\nHost: 127.0.0.1\r\nAccept-Encoding: {accept_encoding}\r\n"
+               f"Connection: keep-alive\r\n\r\n").encode()
+    writer = None
+    while time.monotonic() < deadline:
+        try:
+            if writer is None:
+                reader, writer = await asyncio.open_connection('127.0.0.1', port)
+            started = time.monotonic()
+            writer.write(request)
+            await writer.drain()
+            head = await reader.readuntil(b'\r\n\r\n')
+            status = int(head.split(b' ', 2)[1])
+            length = 0
+            close = False
+            for line in head.split(b'\r\n')[1:]:
+                name, _, value = line.partition(b':')
+                if name.lower() == b'content-length':
+                    length = int(value)
+                elif name.lower() == b'connection' and value.strip().lower() == b'close':
+                    close = True
+            await reader.readexactly(length)
+            if status != 200:
+                errors.append(status)
+            else:
+                latencies.append(time.monotonic() - started)
+            if close:
+                writer.close()
+                writer = None
+        except (OSError, asyncio.IncompleteReadError, ValueError) as e:
+            errors.append(type(e).__name__)
+            if writer is not None:
+                writer.close()
+            writer = None
+            await asyncio.sleep(0.05)
+    if writer is not None:
+        writer.close()
+
+
+def run_client(port: int, path: str, connections: int, duration: float, accept_encoding: str) -> tuple:
+    """
+    Run connections at the same time for duration seconds
+    :param port: port of the server
+    :param path: path to request
+    :param connections: concurrent connections of this client process
+    :param duration: seconds of the run
+    :param accept_encoding: Accept-Encoding of the requests
+    :return: latencies of the completed requests and the failures
+    :rtype: tuple
+    """
+    # Every connection needs a file descriptor
+    soft, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+    resource.setrlimit(resource.RLIMIT_NOFILE, (max(soft, min(hard, connections + 100)), hard))
+    latencies, errors = [], []
+
+    async def run():
+        deadline = time.monotonic() + duration
+        await asyncio.gather(*[_connection(port, path, accept_encoding, deadline, latencies, errors)
+                               for _ in range(connections)])
+
+    asyncio.run(run())
+    return latencies, errors
+
+
+def percentile(values: list, fraction: float) -> float:
+    """
+    :param values: sorted values
+    :param fraction: 0.99 for p99
+    :return: value at that fraction, None without values
+    :rtype: float
+    """
+    if not values:
+        return None
+    return values[min(len(values) - 1, int(len(values) * fraction))]
+
+
+def load_test(server: str, port: int, workers: int, workdir: str, connections: int, duration: float,
+              client_processes: int, accept_encoding: str, path: str) -> dict:
+    """
+    Start a server, load it and stop it
+    :param server: one of SERVERS
+    :param port: port of the server
+    :param workers: worker processes of gunicorn and uvicorn
+    :param workdir: working directory of the server with the static folder
+    :param connections: concurrent connections over all client processes
+    :param duration: seconds of the run
+    :param client_processes: processes the connections are spread over
+    :param accept_encoding: Accept-Encoding of the requests
+    :param path: path to request
+    :return: result row
+    :rtype: dict
+    """
+    # The pages are already in static, nothing is downloaded during the run
+    environment = dict(os.environ, PORT=str(port), STORAGE_PROVIDER=os.getenv('STORAGE_PROVIDER', 's3'),
+                       REFRESH_INTERVAL_SECONDS='86400')
+    process = subprocess.Popen(server_command(server, port, workers), cwd=workdir, env=environment,
+                               stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        wait_ready(port, 60)
+        per_process = [connections // client_processes + (1 if number < connections % client_processes else 0)
+                       for number in range(client_processes)]
+        with multiprocessing.get_context('spawn').Pool(client_processes) as pool:
+            results = pool.starmap(run_client, [(port, path, count, duration, accept_encoding)
+                                                for count in per_process])
+    finally:
+        process.terminate()
+        process.wait(30)
+    latencies = sorted(latency for result in results for latency in result[0])
+    errors = [error for result in results for error in result[1]]
+    return {
+        'server': server,
+        'connections': connections,
+        'duration': duration,
+        'requests': len(latencies),
+        'errors': len(errors),
+        'requests_per_second': round(len(latencies) / duration, 1),
+        'p50_ms': round(percentile(latencies, 0.5) * 1000, 2) if latencies else None,
+        'p99_ms': round(percentile(latencies, 0.99) * 1000, 2) if latencies else None,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--servers', default=','.join(SERVERS), help='comma separated servers')
+    parser.add_argument('--connections', type=int, default=1000, help='concurrent keep-alive connections')
+    parser.add_argument('--duration', type=float, default=20, help='seconds per server')
+    parser.add_argument('--workers', type=int, default=4, help='worker processes of gunicorn and uvicorn')
+    parser.add_argument('--client-processes', type=int, default=os.cpu_count() or 1)
+    parser.add_argument('--page-bytes', type=int, default=200000, help='size of the synthetic index.html')
+    parser.add_argument('--accept-encoding', default='gzip, br')
+    parser.add_argument('--path', default='/')
+    parser.add_argument('--port', type=int, default=5099)
+    parser.add_argument('--output', default=None, help='write the results to this JSON file')
+    args = parser.parse_args()
+    workdir = tempfile.mkdtemp(prefix='showdata-loadtest-')
+    results = []
+    try:
+        write_page(workdir, args.page_bytes)
+        print(f"{'server':<9} {'requests/s':>11} {'p50 ms':>9} {'p99 ms':>9} {'errors':>7}")
+        for server in args.servers.split(','):
+            result = load_test(server, args.port, args.workers, workdir, args.connections, args.duration,
+                               args.client_processes, args.accept_encoding, args.path)
+            results.append(result)
+            print(f"{server:<9} {result['requests_per_second']:>11} {str(result['p50_ms']):>9} "
+                  f"{str(result['p99_ms']):>9} {result['errors']:>7}")
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump({'python': sys.version.split()[0], 'cpus': os.cpu_count(), 'results': results}, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
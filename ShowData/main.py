@@ -1,6 +1,10 @@
 import os
-from src import ShowData
-from flask import Flask, current_app
+import threading
+from src import ShowData, load_pages, page_source, refresh, refreshes, warm_up
+from src.api import ROWS_FILE, respond_api
+from src.pages import respond
+from flask import Flask, Response, abort, jsonify, request
+from werkzeug.wsgi import wrap_file
 from flask_apscheduler import APScheduler
 
 
@@ -13,7 +17,10 @@ class Config(object):
             'id': 'job1',
             'func': "main:updater",
             'trigger': 'interval',
-            'hours': 23
+            # Checking for a new version only reads metadata, so the pages can be checked often
+            'seconds': ShowData().refresh_interval_seconds,
+            'max_instances': 1,
+            'coalesce': True
         }
     ]
     SCHEDULER_API_ENABLED = True
@@ -24,15 +31,76 @@ def updater():
     Function for Apscheduler to call
     :return:
     """
-    show_data = ShowData()
-    show_data.update_data()
+    refresh()
 
 
 app = Flask(__name__)
 app.config.from_object(Config())
 scheduler = APScheduler()
 scheduler.init_app(app)
-scheduler.start()
+# The other workers of a shared store serve what the refresher publishes, a worker started in place of the refresher
+# takes over its lock and its job
+if refreshes():
+    scheduler.start()
+threading.Thread(target=warm_up, name='warm-up', daemon=True).start()
+# Pages of this process, or the shared store of all workers with SHARED_STORE_DIR
+pages = page_source(ShowData().shared_store_dir)
+
+
+def serve(name):
+    """
+    Returns a page from memory, compressed as the client accepts it, or 304 if the client has it already
+    :param name: path of the page, e.g. index.html or regions/czechia.html
+    :return:
+    """
+    # Requests arriving before the warm-up finished wait for it instead of starting another download, workers of a
+    # shared store answer 503 until the refresher published
+    if not len(pages) and not load_pages():
+        abort(503)
+    page = pages.get(name)
+    if page is None:
+        abort(404)
+    status, headers, body = respond(page, request.headers.get('Accept-Encoding', ''),
+                                    request.headers.get('If-None-Match', ''))
+    if body is None or isinstance(body, bytes):
+        return Response(body, status=status, headers=headers)
+    # A file of the shared store, gunicorn sends it with sendfile without copying it through the worker
+    return Response(wrap_file(request.environ, open(body, 'rb')), status=status, headers=headers,
+                    direct_passthrough=True)
+
+
+@app.route('/health')
+def health():
+    """
+    Liveness, the process answers requests
+    :return:
+    """
+    return jsonify(status='ok')
+
+
+@app.route('/ready')
+def ready():
+    """
+    Readiness, 503 until the pages are loaded so a load balancer only sends traffic to a warm process
+    :return:
+    """
+    if not len(pages):
+        return jsonify(ready=False, pages=0), 503
+    return jsonify(ready=True, pages=len(pages))
+
+
+@app.route('/api/<endpoint>')
+def api(endpoint):
+    """
+    Returns published rows as JSON, filtered by country and province, projected to fields and paginated
+    :param endpoint: rows or regions
+    :return:
+    """
+    if not len(pages) and not load_pages():
+        abort(503)
+    status, headers, body = respond_api(endpoint, pages.get(ROWS_FILE), request.args.to_dict(),
+                                        request.headers.get('If-None-Match', ''))
+    return Response(body, status=status, headers=headers)
 
 
 @app.route('/')
@@ -41,11 +109,27 @@ def index():
     Returns static home page of processed html
     :return:
     """
-    # check if html file doesn't exist get it
-    if not os.path.isfile('static/index.html'):
-        first_run = ShowData()
-        first_run.update_data()
-    return current_app.send_static_file('index.html')
+    return serve('index.html')
+
+
+@app.route('/regions/<path:page>')
+def region(page):
+    """
+    Returns a region page linked from the home page
+    :param page: file name of the region page
+    :return:
+    """
+    return serve(f'regions/{page}')
+
+
+@app.route('/trends/<path:page>')
+def trend(page):
+    """
+    Returns a trend page with daily deltas and 7 day averages of a region
+    :param page: file name of the trend page
+    :return:
+    """
+    return serve(f'trends/{page}')
 
 
 if __name__ == '__main__':
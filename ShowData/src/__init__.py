@@ -1 +1,2 @@
-from .showdata import ShowData
+from .showdata import ShowData, is_refresher, load_pages, page_source, refresh, refreshes, warm_up
+from .pages import PAGES
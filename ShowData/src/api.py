@@ -0,0 +1,245 @@
+import hashlib
+import json
+import threading
+from collections import OrderedDict
+
+from werkzeug.http import parse_etags, quote_etag
+
+# Rows Data processor publishes next to the pages
+ROWS_FILE = 'rows.json'
+COUNTRY_FIELD = 'Country_Region'
+PROVINCE_FIELD = 'Province_State'
+DEFAULT_LIMIT = 100
+MAX_LIMIT = 1000
+# Responses kept per version of the rows, the most recently used ones stay
+CACHED_RESPONSES = 1024
+
+
+class QueryError(ValueError):
+    """
+    A query the API cannot answer, its message is sent to the client with a 400
+    """
+
+
+def _encode(value) -> bytes:
+    return json.dumps(value, ensure_ascii=False, separators=(',', ':')).encode()
+
+
+def _names(value: str) -> tuple:
+    """
+    :param value: comma separated names of a query parameter, e.g. Germany,Czechia
+    :return: the names without surrounding spaces, empty names left out
+    :rtype: tuple
+    """
+    return tuple(name.strip() for name in (value or '').split(',') if name.strip())
+
+
+def _number(params: dict, name: str, default: int, minimum: int, maximum: int = None) -> int:
+    """
+    :param params: query parameters
+    :param name: name of the parameter
+    :param default: value if the parameter is missing
+    :param minimum: smallest valid value
+    :param maximum: largest valid value, None for no limit
+    :return: value of the parameter
+    :rtype: int
+    """
+    value = params.get(name)
+    if value is None or value == '':
+        return default
+    try:
+        number = int(value)
+    except ValueError:
+        raise QueryError(f"{name} must be an integer")
+    if number < minimum or (maximum is not None and number > maximum):
+        raise QueryError(f"{name} must be between {minimum} and {maximum}" if maximum is not None
+                         else f"{name} must be at least {minimum}")
+    return number
+
+
+class RowIndex(object):
+    """
+    This class indexes one version of the published rows by country and province. Every row is serialized once when
+    the index is built, a response joins the serialized rows and is cached, so answering a query is a few lookups
+    """
+
+    def __init__(self, body: bytes, sha256: str):
+        """
+        :param body: content of ROWS_FILE, a JSON list of objects
+        :param sha256: SHA-256 of the content, the version of the rows in ETags
+        """
+        rows = json.loads(body)
+        self.sha256 = sha256
+        self.fields = list(rows[0]) if rows else []
+        self._field_positions = {field: position for position, field in enumerate(self.fields)}
+        self._field_names = [_encode(field) + b':' for field in self.fields]
+        # Every value serialized once, projections join them without serializing anything
+        self._values = [tuple(_encode(row.get(field)) for field in self.fields) for row in rows]
+        self._rows = [b'{' + b','.join(name + value for name, value in zip(self._field_names, values)) + b'}'
+                      for values in self._values]
+        self._by_country = {}
+        self._by_province = {}
+        self._by_region = {}
+        regions = OrderedDict()
+        for position, row in enumerate(rows):
+            country = row.get(COUNTRY_FIELD) or ''
+            province = row.get(PROVINCE_FIELD) or ''
+            # Names match case-insensitively, ?country=germany finds Germany
+            key = (country.casefold(), province.casefold())
+            self._by_country.setdefault(key[0], []).append(position)
+            self._by_province.setdefault(key[1], []).append(position)
+            self._by_region.setdefault(key, []).append(position)
+            regions[(country, province)] = regions.get((country, province), 0) + 1
+        self.regions = _encode([{'country': country, 'province': province or None, 'rows': count}
+                                for (country, province), count in regions.items()])
+        self._responses = OrderedDict()
+        self._lock = threading.Lock()
+
+    def query(self, params: dict) -> tuple:
+        """
+        Canonical form of a query, queries asking for the same rows have the same form
+        :param params: query parameters, country, province and fields are comma separated, limit and offset integers
+        :return: countries, provinces, fields, limit and offset
+        :rtype: tuple
+        """
+        fields = _names(params.get('fields'))
+        unknown = [field for field in fields if field not in self._field_positions]
+        if unknown:
+            raise QueryError(f"Unknown fields {', '.join(unknown)}, use any of: {', '.join(self.fields)}")
+        return (tuple(sorted({name.casefold() for name in _names(params.get('country'))})),
+                tuple(sorted({name.casefold() for name in _names(params.get('province'))})),
+                fields,
+                _number(params, 'limit', DEFAULT_LIMIT, 1, MAX_LIMIT),
+                _number(params, 'offset', 0, 0))
+
+    def etag(self, query: tuple) -> str:
+        """
+        :param query: canonical form of a query
+        :return: strong ETag of the response, it changes with the rows and with the query
+        :rtype: str
+        """
+        return f"{self.sha256[:16]}-{hashlib.sha256(repr(query).encode()).hexdigest()[:16]}"
+
+    def _positions(self, countries: tuple, provinces: tuple) -> list:
+        """
+        :param countries: casefolded countries, empty for every country
+        :param provinces: casefolded provinces, empty for every province
+        :return: positions of the matching rows in the order they were published
+        :rtype: list
+        """
+        if countries and provinces:
+            groups = [self._by_region.get((country, province), []) for country in countries for province in provinces]
+        elif countries:
+            groups = [self._by_country.get(country, []) for country in countries]
+        elif provinces:
+            groups = [self._by_province.get(province, []) for province in provinces]
+        else:
+            return range(len(self._rows))
+        if len(groups) == 1:
+            return groups[0]
+        return sorted(position for group in groups for position in group)
+
+    def _body(self, query: tuple) -> bytes:
+        """
+        :param query: canonical form of a query
+        :return: the page of matching rows with their total and the offset of the next page
+        :rtype: bytes
+        """
+        countries, provinces, fields, limit, offset = query
+        positions = self._positions(countries, provinces)
+        selected = positions[offset:offset + limit]
+        if fields:
+            columns = [(self._field_names[self._field_positions[field]], self._field_positions[field])
+                       for field in fields]
+            rows = [b'{' + b','.join(name + self._values[position][column] for name, column in columns) + b'}'
+                    for position in selected]
+        else:
+            rows = [self._rows[position] for position in selected]
+        next_offset = offset + limit if offset + limit < len(positions) else None
+        return (b'{"total":%d,"offset":%d,"limit":%d,"next_offset":%s,"rows":[' %
+                (len(positions), offset, limit, _encode(next_offset)) + b','.join(rows) + b']}')
+
+    def body(self, query: tuple) -> bytes:
+        """
+        :param query: canonical form of a query
+        :return: response of the query, from the cache if it was asked before
+        :rtype: bytes
+        """
+        with self._lock:
+            body = self._responses.get(query)
+            if body is not None:
+                self._responses.move_to_end(query)
+                return body
+        body = self._body(query)
+        with self._lock:
+            self._responses[query] = body
+            if len(self._responses) > CACHED_RESPONSES:
+                self._responses.popitem(last=False)
+        return body
+
+
+class RowStore(object):
+    """
+    This class holds the index of the rows ShowData serves, it is rebuilt when the rows page changes
+    """
+
+    def __init__(self):
+        self._index = None
+        self._lock = threading.Lock()
+
+    def get(self, page) -> RowIndex:
+        """
+        :param page: Page, or StoredPage of the shared store, of ROWS_FILE
+        :return: index of the rows of that page
+        :rtype: RowIndex
+        """
+        index = self._index
+        if index is not None and index.sha256 == page.sha256:
+            return index
+        # Requests arriving while a new version is indexed wait for it instead of indexing it again
+        with self._lock:
+            if self._index is None or self._index.sha256 != page.sha256:
+                body, _ = page.variant('identity')
+                if not isinstance(body, bytes):
+                    with open(body, 'rb') as f:
+                        body = f.read()
+                self._index = RowIndex(body, page.sha256)
+            return self._index
+
+
+def _json(status: int, payload) -> tuple:
+    return status, {'Content-Type': 'application/json'}, _encode(payload)
+
+
+def respond_api(endpoint: str, page, params: dict, if_none_match: str) -> tuple:
+    """
+    Answer a request of the data API, shared by the WSGI and ASGI apps
+    :param endpoint: rows or regions
+    :param page: Page, or StoredPage of the shared store, of ROWS_FILE. None if no rows were published
+    :param params: query parameters, the first value of every parameter
+    :param if_none_match: If-None-Match header of the request
+    :return: status, headers and body. The body is bytes, None for 304
+    :rtype: tuple
+    """
+    if endpoint not in ('rows', 'regions'):
+        return _json(404, {'error': f"Unknown endpoint {endpoint}, use one of: rows, regions"})
+    if page is None:
+        return _json(503, {'error': 'No rows are published yet'})
+    index = ROWS.get(page)
+    try:
+        query = index.query(params) if endpoint == 'rows' else endpoint
+    except QueryError as e:
+        return _json(400, {'error': str(e)})
+    etag = index.etag(query)
+    # Rows change with every refresh, clients revalidate and usually get a 304
+    headers = {'ETag': quote_etag(etag), 'Cache-Control': 'no-cache'}
+    if parse_etags(if_none_match).contains_weak(etag):
+        return 304, headers, None
+    body = index.body(query) if endpoint == 'rows' else index.regions
+    headers['Content-Type'] = 'application/json'
+    headers['Content-Length'] = str(len(body))
+    return 200, headers, body
+
+
+# Index of the rows of this process, every worker indexes the rows it serves
+ROWS = RowStore()
@@ -0,0 +1,158 @@
+import gzip
+import hashlib
+import mimetypes
+import os
+import threading
+
+from werkzeug.http import parse_accept_header, parse_etags, quote_etag
+
+try:
+    import brotli
+except ImportError:
+    # Brotli is optional, without it only gzip variants are served
+    brotli = None
+
+# The quality Data processor publishes its variants with, see BROTLI_QUALITY of DataProcessor/src/publish.py
+BROTLI_QUALITY = 9
+
+
+def compress(data: bytes, encoding: str) -> bytes:
+    """
+    Compress a page the same way compress of DataProcessor/src/publish.py does
+    :param data: content of the page
+    :param encoding: gzip | br
+    :return: compressed content
+    :rtype: bytes
+    """
+    if encoding == 'gzip':
+        return gzip.compress(data, 9, mtime=0)
+    if encoding == 'br':
+        return brotli.compress(data, quality=BROTLI_QUALITY)
+    raise ValueError(f"Unsupported encoding {encoding}, use one of: br, gzip")
+
+
+class Page(object):
+    """
+    A page held in memory with its compressed variants, computed once when the page is loaded so serving it is a
+    lookup
+    """
+
+    def __init__(self, body: bytes, content_type: str):
+        """
+        :param body: content of the page
+        :param content_type: Content-Type of the page
+        """
+        self.body = body
+        self.content_type = content_type
+        self.sha256 = hashlib.sha256(body).hexdigest()
+        # Preferred encoding first, a client accepting both gets brotli
+        self.encodings = {}
+        for encoding in ['br', 'gzip']:
+            if encoding == 'br' and brotli is None:
+                continue
+            compressed = compress(body, encoding)
+            # Kept only if smaller, like the variants write_release of Data processor publishes
+            if len(compressed) < len(body):
+                self.encodings[encoding] = compressed
+
+    def variant(self, encoding: str) -> tuple:
+        """
+        :param encoding: br, gzip or identity
+        :return: content and strong ETag of the page in that encoding, every encoding has its own ETag
+        :rtype: tuple
+        """
+        if encoding == 'identity':
+            return self.body, self.sha256
+        return self.encodings[encoding], f"{self.sha256}-{encoding}"
+
+
+def respond(page, accept_encoding: str, if_none_match: str) -> tuple:
+    """
+    Choose the variant of a page a client accepts and answer its conditional request, shared by the WSGI and ASGI apps
+    :param page: Page, or StoredPage of the shared store
+    :param accept_encoding: Accept-Encoding header of the request
+    :param if_none_match: If-None-Match header of the request
+    :return: status, headers and body. The body is bytes, the file_path of a StoredPage variant or None for 304
+    :rtype: tuple
+    """
+    encoding = parse_accept_header(accept_encoding).best_match(list(page.encodings), default='identity')
+    body, etag = page.variant(encoding)
+    # Pages change with every refresh, clients revalidate and usually get a 304
+    headers = {'ETag': quote_etag(etag), 'Cache-Control': 'no-cache', 'Vary': 'Accept-Encoding'}
+    if parse_etags(if_none_match).contains_weak(etag):
+        return 304, headers, None
+    headers['Content-Type'] = page.content_type
+    headers['Content-Length'] = str(len(body) if isinstance(body, bytes) else page.size(encoding))
+    if encoding != 'identity':
+        headers['Content-Encoding'] = encoding
+    return 200, headers, body
+
+
+class PageCache(object):
+    """
+    This class holds the pages ShowData serves in memory. A load builds a complete new set of pages and replaces the
+    old one in a single assignment, a request sees either the old or the new set and never a mix of both
+    """
+
+    def __init__(self):
+        self._pages = {}
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._pages)
+
+    def get(self, name: str) -> Page:
+        """
+        :param name: path of the page, e.g. index.html or regions/czechia.html
+        :return: page, None if there is no such page
+        :rtype: Page
+        """
+        return self._pages.get(name)
+
+    def items(self):
+        """
+        :return: (name, Page) pairs of the current pages
+        """
+        return self._pages.items()
+
+    def swap(self, pages: dict):
+        """
+        Replace every page at once
+        :param pages: pages by name
+        :return: None
+        """
+        self._pages = pages
+
+    def load(self, folder: str) -> int:
+        """
+        Load every file below a folder, pages whose content did not change keep their compressed variants
+        :param folder: folder the pages were downloaded into
+        :return: number of loaded pages
+        :rtype: int
+        """
+        # Two loads at the same time would compress the same pages twice
+        with self._lock:
+            current = self._pages
+            pages = {}
+            for directory, _, file_names in os.walk(folder):
+                for file_name in file_names:
+                    if file_name.startswith('.'):
+                        # Downloads in progress
+                        continue
+                    file_path = os.path.join(directory, file_name)
+                    name = os.path.relpath(file_path, folder).replace(os.sep, '/')
+                    with open(file_path, 'rb') as f:
+                        body = f.read()
+                    page = current.get(name)
+                    if page is None or page.body != body:
+                        content_type = mimetypes.guess_type(file_name)[0] or 'application/octet-stream'
+                        if content_type.startswith('text/'):
+                            content_type += '; charset=utf-8'
+                        page = Page(body, content_type)
+                    pages[name] = page
+            self.swap(pages)
+        return len(pages)
+
+
+# Pages of this process, loaded by ShowData.update_data and served by the routes
+PAGES = PageCache()
@@ -1,8 +1,29 @@
+import fcntl
+import hashlib
+import json
 import os
+import tempfile
+import threading
 import boto3
 from botocore.config import Config
 from google.cloud import storage
 
+from .api import ROWS, ROWS_FILE
+from .pages import PAGES
+from .store import SharedPageStore
+
+# Folders of the pages Data processor renders next to index.html
+PAGE_PREFIXES = ['regions/', 'trends/']
+# Held while the first pages of this process are loaded
+_load_lock = threading.Lock()
+# Held while pages are downloaded, a refresh never overlaps another one
+_update_lock = threading.Lock()
+# Last downloaded version(ETag or GCS generation) per provider
+_versions = {}
+# Shared stores by folder, and the lock file of this process once it was elected to refresh them
+_stores = {}
+_refresher_lock_file = None
+
 
 def s3_client_builder(access_key, secret_key, region) -> object:
     """
@@ -32,6 +53,73 @@ def s3_client_builder(access_key, secret_key, region) -> object:
     return s3_client
 
 
+def file_sha256(file_path: str) -> str:
+    """
+    :param file_path: path of the file
+    :return: hex SHA-256 of its content
+    :rtype: str
+    """
+    digest = hashlib.sha256()
+    with open(file_path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def download_atomic(download, file_path: str, size: int = None, sha256: str = None) -> bool:
+    """
+    Download a file next to its destination and move it into place with one rename, readers of file_path see the old
+    or the new file and never a partial one. The download is checked before it replaces anything
+    :param download: callable(path) downloading the object into path
+    :param file_path: destination
+    :param size: expected size in bytes, not checked if not provided
+    :param sha256: expected hex SHA-256, not checked if not provided. A destination which already has it is kept
+    :return: True if the file was downloaded, False if the destination already had the content
+    :rtype: bool
+    """
+    if sha256 is not None and os.path.isfile(file_path) and file_sha256(file_path) == sha256:
+        return False
+    directory = os.path.dirname(file_path)
+    os.makedirs(directory, exist_ok=True)
+    # Hidden and in the same folder, so the rename stays on one file system and the page cache skips it
+    handle, temp_path = tempfile.mkstemp(dir=directory, prefix=f".{os.path.basename(file_path)}.")
+    os.close(handle)
+    try:
+        download(temp_path)
+        if size is not None and os.path.getsize(temp_path) != size:
+            raise ValueError(f"{file_path} has {os.path.getsize(temp_path)} bytes instead of {size}")
+        if sha256 is not None and file_sha256(temp_path) != sha256:
+            raise ValueError(f"{file_path} does not match its SHA-256 {sha256}")
+        os.replace(temp_path, file_path)
+    except BaseException:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+        raise
+    return True
+
+
+def remove_stale(folder: str, names) -> int:
+    """
+    Remove the pages of a folder which a newer version no longer has, with the folders they leave empty
+    :param folder: folder the pages were downloaded into
+    :param names: names of the pages of the version, e.g. index.html or regions/czechia.html
+    :return: number of removed pages
+    :rtype: int
+    """
+    names = set(names)
+    removed = 0
+    for directory, _, file_names in os.walk(folder, topdown=False):
+        for file_name in file_names:
+            file_path = os.path.join(directory, file_name)
+            # Hidden files are downloads in progress
+            if not file_name.startswith('.') and os.path.relpath(file_path, folder).replace(os.sep, '/') not in names:
+                os.remove(file_path)
+                removed += 1
+        if directory != folder and not os.listdir(directory):
+            os.rmdir(directory)
+    return removed
+
+
 class ShowData:
     """
     This class aims to have show data as one class for using in other projects or calling it from Flask
@@ -62,42 +150,236 @@ class ShowData:
         self.gcs_bucket_name = os.getenv('GCS_UPLOAD_BUCKET')
         self.google_api_file = os.getenv('GOOGLE_API_FILE')
         self.storage_provider = os.getenv('STORAGE_PROVIDER')
+        # Object Data processor replaces with every published version, see PUBLISH_POINTER_KEY of Data processor
+        self.pointer_key = os.getenv('PUBLISH_POINTER_KEY', 'current.json')
+        self.refresh_interval_seconds = int(os.getenv('REFRESH_INTERVAL_SECONDS', 60))
+        # Workers of one host share their pages through this folder, every process keeps its own pages without it
+        self.shared_store_dir = os.getenv('SHARED_STORE_DIR')
 
-    def _update_from_s3(self):
+    def _update_from_s3(self) -> bool:
         """
-        This function downloads the latest processed html into static files in order to be served from Flask(AWS S3)
-        :return: None
+        This function downloads the latest processed html into static files in order to be served from Flask(AWS S3).
+        Only the metadata of the pointer(or of index.html without one) is read unless the published version changed
+        :return: True if pages were downloaded
+        :rtype: bool
         """
         s3_client = s3_client_builder(self.s3_access_key, self.s3_secret_key, self.s3_region)
+        try:
+            key = self.pointer_key
+            head = s3_client.head_object(Bucket=self.s3_bucket_name, Key=key)
+        except s3_client.exceptions.ClientError:
+            # Published by a Data processor without versions, it rewrites every page on every run
+            key = 'index.html'
+            head = s3_client.head_object(Bucket=self.s3_bucket_name, Key=key)
+        version = f"{head['ETag']}:{head['LastModified'].isoformat()}"
+        if _versions.get('s3') == (key, version):
+            return False
         # if static folder doesn't exist create it
         if not os.path.isdir('static'):
             os.mkdir('static')
-        download_path = os.path.join(os.getcwd(), 'static/index.html')
-        s3_client.download_file(self.s3_bucket_name, 'index.html', download_path)
+        if key == self.pointer_key:
+            # Pages of one version are immutable, they all match the pointer which was just read
+            pointer = json.loads(s3_client.get_object(Bucket=self.s3_bucket_name, Key=key)['Body'].read())
+            for name, page in pointer['pages'].items():
+                download_path = os.path.join(os.getcwd(), 'static', name)
+                # Pages which did not change since the last version are not downloaded again
+                source = pointer['prefix'] + name
+                download_atomic(lambda path: s3_client.download_file(self.s3_bucket_name, source, path),
+                                download_path, page.get('size'), page.get('sha256'))
+            # A page dropped from the version would otherwise be loaded and served with its old content
+            remove_stale(os.path.join(os.getcwd(), 'static'), pointer['pages'])
+        else:
+            download_path = os.path.join(os.getcwd(), 'static/index.html')
+            # Data processor stores the SHA-256 of every page in its metadata, pages of older publishers have none and
+            # are only checked against their size
+            download_atomic(lambda path: s3_client.download_file(self.s3_bucket_name, 'index.html', path),
+                            download_path, head['ContentLength'], head['Metadata'].get('sha256'))
+            # Region and trend pages linked from the index page
+            paginator = s3_client.get_paginator('list_objects_v2')
+            for prefix in PAGE_PREFIXES:
+                for page in paginator.paginate(Bucket=self.s3_bucket_name, Prefix=prefix):
+                    for obj in page.get('Contents', []):
+                        download_path = os.path.join(os.getcwd(), 'static', obj['Key'])
+                        # Listings do not carry metadata
+                        page_head = s3_client.head_object(Bucket=self.s3_bucket_name, Key=obj['Key'])
+                        download_atomic(lambda path: s3_client.download_file(self.s3_bucket_name, obj['Key'], path),
+                                        download_path, page_head['ContentLength'], page_head['Metadata'].get('sha256'))
+        _versions['s3'] = (key, version)
+        return True
 
-    def _update_from_gcs(self):
+    def _update_from_gcs(self) -> bool:
         """
-        This function downloads the latest processed html into static files in order to be served from Flask(GCS)
-        :return: None
+        This function downloads the latest processed html into static files in order to be served from Flask(GCS).
+        Only the metadata of the pointer(or of index.html without one) is read unless the published version changed
+        :return: True if pages were downloaded
+        :rtype: bool
         """
         client = storage.Client()
-        bucket = client.get_bucket(self.gcs_bucket_name)
-        blob = bucket.get_blob('index.html')
+        # bucket() does not send a request, get_blob reads the metadata of one object
+        bucket = client.bucket(self.gcs_bucket_name)
+        key = self.pointer_key
+        blob = bucket.get_blob(key)
+        if blob is None:
+            # Published by a Data processor without versions
+            key = 'index.html'
+            blob = bucket.get_blob(key)
+        if _versions.get('gcp') == (key, blob.generation):
+            return False
         if not os.path.isdir('static'):
             os.mkdir('static')
-        download_path = os.path.join(os.getcwd(), 'static/index.html')
-        blob.download_to_filename(download_path)
+        if key == self.pointer_key:
+            # Pages of one version are immutable, they all match the pointer which was just read
+            pointer = json.loads(blob.download_as_bytes(if_generation_match=blob.generation))
+            for name, page in pointer['pages'].items():
+                download_path = os.path.join(os.getcwd(), 'static', name)
+                # Pages which did not change since the last version are not downloaded again
+                download_atomic(bucket.blob(pointer['prefix'] + name).download_to_filename, download_path,
+                                page.get('size'), page.get('sha256'))
+            remove_stale(os.path.join(os.getcwd(), 'static'), pointer['pages'])
+        else:
+            download_path = os.path.join(os.getcwd(), 'static/index.html')
+            # Data processor stores the SHA-256 of every page in its metadata, pages of older publishers have none and
+            # are only checked against their size
+            download_atomic(lambda path: blob.download_to_filename(path, if_generation_match=blob.generation),
+                            download_path, blob.size, (blob.metadata or {}).get('sha256'))
+            # Region and trend pages linked from the index page
+            for prefix in PAGE_PREFIXES:
+                for page_blob in bucket.list_blobs(prefix=prefix):
+                    download_path = os.path.join(os.getcwd(), 'static', page_blob.name)
+                    download_atomic(page_blob.download_to_filename, download_path, page_blob.size,
+                                    (page_blob.metadata or {}).get('sha256'))
+        _versions['gcp'] = (key, blob.generation)
+        return True
+
+    def update_data(self) -> bool:
+        """
+        Class initiator, downloads the pages of every provider whose published version changed
+        :return: True if pages were downloaded
+        :rtype: bool
+        """
+        changed = False
+        with _update_lock:
+            for provider in self.storage_provider.split(','):
+                if provider == 's3':
+                    changed = self._update_from_s3() or changed
+                elif provider == 'gcp':
+                    self._set_google_api()
+                    changed = self._update_from_gcs() or changed
+                else:
+                    print('Invalid storage provider')
+            # Requests are served from memory, the downloaded pages replace the served ones at once
+            if (changed or not len(PAGES)) and os.path.isdir('static'):
+                self.load_static()
+        return changed
 
-    def update_data(self):
+    def load_static(self):
         """
-        Class initiator
+        Load the downloaded pages into memory and publish them to the other workers with a shared store
         :return: None
         """
-        for provider in self.storage_provider.split(','):
-            if provider == 's3':
-                self._update_from_s3()
-            elif provider == 'gcp':
-                self._set_google_api()
-                self._update_from_gcs()
+        PAGES.load(os.path.join(os.getcwd(), 'static'))
+        if PAGES.get(ROWS_FILE) is not None:
+            # Indexed before the first API request instead of during it
+            ROWS.get(PAGES.get(ROWS_FILE))
+        if self.shared_store_dir:
+            shared_store(self.shared_store_dir).publish(PAGES.items())
+
+
+def shared_store(directory: str) -> SharedPageStore:
+    """
+    :param directory: SHARED_STORE_DIR
+    :return: the shared store of the folder, one per process
+    :rtype: SharedPageStore
+    """
+    if directory not in _stores:
+        _stores[directory] = SharedPageStore(directory)
+    return _stores[directory]
+
+
+def page_source(directory: str = None):
+    """
+    :param directory: SHARED_STORE_DIR, None without a shared store
+    :return: pages requests are served from, the shared store or the pages of this process
+    """
+    return shared_store(directory) if directory else PAGES
+
+
+def is_refresher(directory: str) -> bool:
+    """
+    Elect one process of the host to download pages and publish them into the shared store. The first process to
+    lock the lock file keeps it until it exits, then the next process asking takes over
+    :param directory: SHARED_STORE_DIR
+    :return: True if this process is the refresher
+    :rtype: bool
+    """
+    global _refresher_lock_file
+    if _refresher_lock_file is not None:
+        return True
+    os.makedirs(directory, exist_ok=True)
+    lock_file = open(os.path.join(directory, 'refresher.lock'), 'w')
+    try:
+        fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except BlockingIOError:
+        lock_file.close()
+        return False
+    _refresher_lock_file = lock_file
+    return True
+
+
+def load_pages() -> int:
+    """
+    Make sure this process has pages to serve. Pages downloaded before the process started are loaded from disk,
+    otherwise they are downloaded. Concurrent callers share one download, they wait for it instead of starting their
+    own. With a shared store only the refresher downloads, the other workers return at once and answer 503 until it
+    published
+    :return: number of loaded pages
+    :rtype: int
+    """
+    show_data = ShowData()
+    pages = page_source(show_data.shared_store_dir)
+    if len(pages):
+        return len(pages)
+    if show_data.shared_store_dir and not is_refresher(show_data.shared_store_dir):
+        return 0
+    with _load_lock:
+        # Another caller may have loaded the pages while this one waited for the lock
+        if not len(pages):
+            if os.path.isfile('static/index.html'):
+                with _update_lock:
+                    show_data.load_static()
             else:
-                print('Invalid storage provider')
+                show_data.update_data()
+    return len(pages)
+
+
+def refreshes() -> bool:
+    """
+    :return: True if this process downloads pages, every process without a shared store and the refresher with one
+    :rtype: bool
+    """
+    directory = ShowData().shared_store_dir
+    return not directory or is_refresher(directory)
+
+
+def refresh() -> bool:
+    """
+    Download pages whose published version changed. With a shared store only the elected worker downloads, the others
+    serve what it publishes
+    :return: True if pages were downloaded
+    :rtype: bool
+    """
+    if not refreshes():
+        return False
+    return ShowData().update_data()
+
+
+def warm_up():
+    """
+    Loads the pages when the application starts, so the first request does not wait for a download
+    :return: None
+    """
+    try:
+        print(f"{load_pages()} pages loaded")
+    except Exception as e:
+        # The next request or the scheduler tries again
+        print(f"Loading pages failed: {e}")
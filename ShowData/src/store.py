@@ -0,0 +1,150 @@
+import json
+import mmap
+import os
+import shutil
+import struct
+import threading
+
+# Generation counter at the start of the control file, 0 until the first publish
+GENERATION = struct.Struct('<Q')
+INDEX_FILE = 'index.json'
+
+
+class StoredPage(object):
+    """
+    A page of the shared store, every variant is its own file so a server can send it with sendfile
+    """
+
+    def __init__(self, directory: str, entry: dict):
+        """
+        :param directory: folder of the generation
+        :param entry: entry of the page in the index of the generation
+        """
+        self.content_type = entry['content_type']
+        self.sha256 = entry['sha256']
+        self._files = {encoding: (os.path.join(directory, file_name), size)
+                       for encoding, (file_name, size) in entry['files'].items()}
+        # Preferred encoding first, identity is always there
+        self.encodings = {encoding: file for encoding, file in self._files.items() if encoding != 'identity'}
+
+    def variant(self, encoding: str) -> tuple:
+        """
+        :param encoding: br, gzip or identity
+        :return: file_path and strong ETag of the page in that encoding, the same ETags Page uses
+        :rtype: tuple
+        """
+        file_path, _ = self._files[encoding]
+        return file_path, self.sha256 if encoding == 'identity' else f"{self.sha256}-{encoding}"
+
+    def size(self, encoding: str) -> int:
+        """
+        :param encoding: br, gzip or identity
+        :return: size of the page in that encoding
+        :rtype: int
+        """
+        return self._files[encoding][1]
+
+
+class SharedPageStore(object):
+    """
+    This class shares the pages between the worker processes of one host. One process publishes every page and its
+    variants as files of a new generation folder(in /dev/shm they are shared memory) and then increments a generation
+    counter in a memory-mapped control file. The other processes compare the counter on every lookup, a memory read,
+    and only read the small index of a generation when it changed. Page content is never copied into their memory
+    """
+
+    def __init__(self, directory: str, keep: int = 2):
+        """
+        :param directory: folder of the store, created if it does not exist
+        :param keep: previous generations kept for requests which resolved a page just before a publish
+        """
+        self.directory = directory
+        self.keep = keep
+        os.makedirs(directory, exist_ok=True)
+        fd = os.open(os.path.join(directory, 'generation'), os.O_RDWR | os.O_CREAT, 0o644)
+        try:
+            if os.fstat(fd).st_size < GENERATION.size:
+                os.ftruncate(fd, GENERATION.size)
+            self._control = mmap.mmap(fd, GENERATION.size)
+        finally:
+            os.close(fd)
+        self._generation = 0
+        self._pages = {}
+        self._lock = threading.Lock()
+
+    def generation(self) -> int:
+        """
+        :return: last published generation, 0 if nothing was published yet
+        :rtype: int
+        """
+        return GENERATION.unpack_from(self._control)[0]
+
+    def publish(self, pages) -> int:
+        """
+        Publish a complete set of pages as a new generation, only the elected refresher calls it
+        :param pages: (name, Page) pairs
+        :return: the new generation
+        :rtype: int
+        """
+        generation = self.generation() + 1
+        folder = os.path.join(self.directory, f"gen-{generation}")
+        temp_folder = os.path.join(self.directory, f".gen-{generation}")
+        for path in [folder, temp_folder]:
+            # Left behind by a refresher which stopped while publishing
+            shutil.rmtree(path, ignore_errors=True)
+        os.makedirs(temp_folder)
+        index = {}
+        for name, page in pages:
+            files = {}
+            for encoding in ['identity'] + list(page.encodings):
+                body, etag = page.variant(encoding)
+                # ETags only depend on the content, identical pages share their files
+                file_path = os.path.join(temp_folder, etag)
+                if not os.path.exists(file_path):
+                    with open(file_path, 'wb') as f:
+                        f.write(body)
+                files[encoding] = [etag, len(body)]
+            index[name] = {'content_type': page.content_type, 'sha256': page.sha256, 'files': files}
+        with open(os.path.join(temp_folder, INDEX_FILE), 'w') as f:
+            json.dump(index, f)
+        # The folder is complete before any process can see its generation
+        os.rename(temp_folder, folder)
+        GENERATION.pack_into(self._control, 0, generation)
+        for entry in os.listdir(self.directory):
+            if entry.startswith('gen-') and int(entry[4:]) < generation - self.keep:
+                shutil.rmtree(os.path.join(self.directory, entry), ignore_errors=True)
+        return generation
+
+    def _refresh(self):
+        """
+        Read the index of the published generation if it changed since the last lookup
+        :return: None
+        """
+        generation = self.generation()
+        if generation == self._generation:
+            return
+        with self._lock:
+            if generation == self._generation:
+                return
+            folder = os.path.join(self.directory, f"gen-{generation}")
+            try:
+                with open(os.path.join(folder, INDEX_FILE)) as f:
+                    index = json.load(f)
+            except FileNotFoundError:
+                # Several publishes happened meanwhile, the next lookup reads the newest one
+                return
+            self._pages = {name: StoredPage(folder, entry) for name, entry in index.items()}
+            self._generation = generation
+
+    def __len__(self) -> int:
+        self._refresh()
+        return len(self._pages)
+
+    def get(self, name: str) -> StoredPage:
+        """
+        :param name: path of the page, e.g. index.html or regions/czechia.html
+        :return: page of the published generation, None if there is no such page
+        :rtype: StoredPage
+        """
+        self._refresh()
+        return self._pages.get(name)
@@ -0,0 +1,60 @@
+import asyncio
+import gzip
+import importlib
+import os
+import sys
+import threading
+
+import pytest
+
+APP_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+BODY = b'<html><body>' + b'<p>Czechia</p>' * 1000 + b'</body></html>'
+
+
+@pytest.fixture
+def asgi(tmp_path, monkeypatch):
+    """
+    The ASGI app of a worker serving a shared store with a published index page
+    """
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.syspath_prepend(APP_DIR)
+    monkeypatch.setenv('SHARED_STORE_DIR', str(tmp_path / 'store'))
+    monkeypatch.setenv('STORAGE_PROVIDER', 'none')
+    from src.pages import Page
+    from src.showdata import shared_store
+    shared_store(str(tmp_path / 'store')).publish([('index.html', Page(BODY, 'text/html; charset=utf-8'))])
+    sys.modules.pop('asgi', None)
+    yield importlib.import_module('asgi')
+    sys.modules.pop('asgi', None)
+
+
+async def get(app, path: str, headers: dict) -> tuple:
+    scope = {'type': 'http', 'method': 'GET', 'path': path, 'query_string': b'',
+             'headers': [(key.lower().encode(), value.encode()) for key, value in headers.items()]}
+    messages = []
+
+    async def send(message):
+        messages.append(message)
+
+    await app.app(scope, None, send)
+    return messages[0]['status'], dict(messages[0]['headers']), messages[1]['body']
+
+
+def test_shared_store_files_are_read_off_the_event_loop(asgi, monkeypatch):
+    threads = []
+    read_file = asgi.read_file
+
+    def recording_read_file(file_path):
+        threads.append(threading.current_thread())
+        return read_file(file_path)
+
+    monkeypatch.setattr(asgi, 'read_file', recording_read_file)
+
+    async def main():
+        return threading.current_thread(), await get(asgi, '/', {'Accept-Encoding': 'gzip'})
+
+    loop_thread, (status, headers, body) = asyncio.run(main())
+    assert status == 200
+    assert headers[b'content-encoding'] == b'gzip'
+    assert gzip.decompress(body) == BODY
+    assert threads and loop_thread not in threads
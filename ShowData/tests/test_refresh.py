@@ -0,0 +1,227 @@
+"""
+No client ever gets a truncated, empty or mixed page while ShowData refreshes its pages. Versions are published to a
+moto S3 bucket one after another and refreshed while HTTP clients and a disk reader fetch the pages, every body has to
+be one of the published versions of its page
+"""
+import gzip
+import hashlib
+import http.client
+import json
+import logging
+import os
+import random
+import string
+import threading
+import time
+
+import pytest
+
+boto3 = pytest.importorskip('boto3')
+moto = pytest.importorskip('moto')
+# moto 5 mocks every service with mock_aws, moto 4 has one mock per service
+mock_aws = getattr(moto, 'mock_aws', None) or moto.mock_s3
+
+APP_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+BUCKET = 'showdata-refresh'
+POINTER_KEY = 'current.json'
+PAGE_NAMES = ['index.html', 'regions/czechia.html', 'trends/czechia.html']
+# Only in the first version, it has to be gone once a version without it is refreshed
+DROPPED_PAGE = 'regions/dropped.html'
+REFRESHES = 5
+CLIENTS = 3
+PAGE_BYTES = 500000
+
+
+def page_body(version: int, name: str) -> bytes:
+    """
+    :param version: number of the published version
+    :param name: name of the page
+    :return: content of the page in that version, different in every version
+    :rtype: bytes
+    """
+    cell = ''.join(random.choice(string.ascii_letters) for _ in range(64))
+    row = f"<tr><td>{version}</td><td>{name}</td><td>{cell}</td></tr>\n"
+    return f"<html><body><table>\n{row * (PAGE_BYTES // len(row) + 1)}</table></body></html>".encode()
+
+
+def publish(s3_client, version: int, names: list = PAGE_NAMES) -> dict:
+    """
+    Publish a version like Data processor does, the pages below their version prefix and then the pointer
+    :param s3_client: client of the bucket
+    :param version: number of the version
+    :param names: names of the pages of the version
+    :return: SHA-256 of every page by name
+    :rtype: dict
+    """
+    prefix = f"versions/{version}/"
+    pages = {}
+    for name in names:
+        body = page_body(version, name)
+        s3_client.put_object(Bucket=BUCKET, Key=prefix + name, Body=body)
+        pages[name] = {'sha256': hashlib.sha256(body).hexdigest(), 'size': len(body)}
+    s3_client.put_object(Bucket=BUCKET, Key=POINTER_KEY,
+                         Body=json.dumps({'version': str(version), 'prefix': prefix, 'pages': pages}).encode())
+    return {name: page['sha256'] for name, page in pages.items()}
+
+
+def check_body(name: str, body: bytes, published: dict, failures: list):
+    """
+    :param name: name of the page
+    :param body: content which was received or read
+    :param published: SHA-256 of every published version of every page by name
+    :param failures: a description of the body is appended if it is not a published version
+    :return: None
+    """
+    if not body:
+        failures.append(f"{name}: empty")
+    elif hashlib.sha256(body).hexdigest() not in published[name]:
+        failures.append(f"{name}: {len(body)} bytes which are no published version")
+
+
+def http_client(port: int, stop: threading.Event, published: dict, counts: dict, failures: list):
+    """
+    Request the pages over one keep-alive connection until stopped, identity and gzip at random
+    :param port: port of ShowData
+    :param stop: set when the refreshes are done
+    :param published: SHA-256 of every published version of every page by name
+    :param counts: completed requests are counted under 'http'
+    :param failures: incomplete or mismatched responses are appended
+    :return: None
+    """
+    connection = http.client.HTTPConnection('127.0.0.1', port, timeout=30)
+    while not stop.is_set():
+        name = random.choice(PAGE_NAMES)
+        encoding = random.choice(['identity', 'gzip'])
+        try:
+            connection.request('GET', '/' if name == 'index.html' else f"/{name}",
+                               headers={'Accept-Encoding': encoding})
+            response = connection.getresponse()
+            body = response.read()
+        except (OSError, http.client.HTTPException) as e:
+            failures.append(f"{name}: {type(e).__name__} {e}")
+            connection.close()
+            connection = http.client.HTTPConnection('127.0.0.1', port, timeout=30)
+            continue
+        if response.status != 200:
+            failures.append(f"{name}: status {response.status}")
+        elif len(body) != int(response.getheader('Content-Length', -1)):
+            failures.append(f"{name}: {len(body)} bytes, Content-Length {response.getheader('Content-Length')}")
+        else:
+            if response.getheader('Content-Encoding') == 'gzip':
+                body = gzip.decompress(body)
+            check_body(name, body, published, failures)
+        counts['http'] += 1
+        # A single CPU would otherwise run the clients instead of the refresh
+        time.sleep(0.001)
+    connection.close()
+
+
+def disk_reader(workdir: str, stop: threading.Event, published: dict, counts: dict, failures: list):
+    """
+    Read the downloaded pages until stopped, a reader of the static folder never sees a partial download
+    :param workdir: working directory of ShowData
+    :param stop: set when the refreshes are done
+    :param published: SHA-256 of every published version of every page by name
+    :param counts: completed reads are counted under 'disk'
+    :param failures: incomplete or mismatched pages are appended
+    :return: None
+    """
+    while not stop.is_set():
+        name = random.choice(PAGE_NAMES)
+        try:
+            with open(os.path.join(workdir, 'static', name), 'rb') as f:
+                body = f.read()
+        except FileNotFoundError:
+            failures.append(f"{name}: missing from static")
+            continue
+        check_body(name, body, published, failures)
+        counts['disk'] += 1
+        time.sleep(0.001)
+
+
+@pytest.fixture
+def s3(tmp_path, monkeypatch):
+    """
+    A mocked bucket and a ShowData working directory of its own, ShowData downloads into its static folder
+    """
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.syspath_prepend(APP_DIR)
+    for name, value in dict(STORAGE_PROVIDER='s3', S3_BUCKET_NAME=BUCKET, S3_REGION='us-east-1',
+                            S3_ACCESS_KEY='testing', S3_SECRET_KEY='testing', PUBLISH_POINTER_KEY=POINTER_KEY,
+                            REFRESH_INTERVAL_SECONDS='86400').items():
+        monkeypatch.setenv(name, value)
+    monkeypatch.delenv('SHARED_STORE_DIR', raising=False)
+    with mock_aws():
+        s3_client = boto3.client('s3', region_name='us-east-1')
+        s3_client.create_bucket(Bucket=BUCKET)
+        from src import showdata
+        # Versions downloaded by an earlier test are not in this bucket
+        showdata._versions.clear()
+        showdata.PAGES.swap({})
+        yield s3_client
+
+
+def test_refresh_never_serves_partial_pages(s3, tmp_path):
+    from werkzeug.serving import make_server
+
+    published = {name: set() for name in PAGE_NAMES}
+    for name, sha256 in publish(s3, 0, PAGE_NAMES + [DROPPED_PAGE]).items():
+        published.setdefault(name, set()).add(sha256)
+    import main as showdata_main
+    from src import load_pages, refresh
+    assert load_pages(), 'ShowData did not load the first version'
+    # One line per request would bury the result
+    logging.getLogger('werkzeug').setLevel(logging.ERROR)
+    server = make_server('127.0.0.1', 0, showdata_main.app, threaded=True)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    failures = []
+    counts = {'http': 0, 'disk': 0}
+    stop = threading.Event()
+    workers = [threading.Thread(target=http_client, args=(server.port, stop, published, counts, failures))
+               for _ in range(CLIENTS)]
+    workers.append(threading.Thread(target=disk_reader, args=(str(tmp_path), stop, published, counts, failures)))
+    for worker in workers:
+        worker.start()
+    try:
+        for version in range(1, REFRESHES + 1):
+            # Clients may see the new version as soon as its first page is downloaded
+            latest = publish(s3, version)
+            for name, sha256 in latest.items():
+                published[name].add(sha256)
+            assert refresh(), f"version {version} was not downloaded"
+            time.sleep(0.2)
+    finally:
+        stop.set()
+        for worker in workers:
+            worker.join()
+        server.shutdown()
+    assert failures == []
+    assert counts['http'] and counts['disk']
+    # The last refresh left the last version in static and in memory
+    for name, sha256 in latest.items():
+        with open(tmp_path / 'static' / name, 'rb') as f:
+            assert hashlib.sha256(f.read()).hexdigest() == sha256
+        assert showdata_main.pages.get(name).sha256 == sha256
+    assert showdata_main.app.test_client().get(f"/{DROPPED_PAGE}").status_code == 404
+    assert not (tmp_path / 'static' / DROPPED_PAGE).exists()
+
+
+def test_legacy_pages_are_checked_against_their_sha256(s3, tmp_path, monkeypatch):
+    from src import refresh
+
+    # A bucket without pointer, written by a Data processor without versions
+    monkeypatch.setenv('PUBLISH_POINTER_KEY', 'missing.json')
+    pages = {name: page_body(0, name) for name in PAGE_NAMES}
+    for name, body in pages.items():
+        s3.put_object(Bucket=BUCKET, Key=name, Body=body, Metadata={'sha256': hashlib.sha256(body).hexdigest()})
+    assert refresh()
+    for name, body in pages.items():
+        assert (tmp_path / 'static' / name).read_bytes() == body
+    # A page whose content does not match its published SHA-256 does not replace the downloaded one
+    s3.put_object(Bucket=BUCKET, Key='regions/czechia.html', Body=page_body(1, 'regions/czechia.html'),
+                  Metadata={'sha256': hashlib.sha256(pages['regions/czechia.html']).hexdigest()[::-1]})
+    s3.put_object(Bucket=BUCKET, Key='index.html', Body=pages['index.html'] + b'\n',
+                  Metadata={'sha256': hashlib.sha256(pages['index.html'] + b'\n').hexdigest()})
+    with pytest.raises(ValueError, match='SHA-256'):
+        refresh()
+    assert (tmp_path / 'static' / 'regions' / 'czechia.html').read_bytes() == pages['regions/czechia.html']
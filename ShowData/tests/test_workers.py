@@ -0,0 +1,61 @@
+import fcntl
+import importlib
+import os
+import sys
+import time
+
+import pytest
+
+APP_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+@pytest.fixture
+def store(tmp_path, monkeypatch):
+    """
+    A shared store whose refresher lock is held by another worker
+    """
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.syspath_prepend(APP_DIR)
+    directory = tmp_path / 'store'
+    directory.mkdir()
+    monkeypatch.setenv('SHARED_STORE_DIR', str(directory))
+    # No provider, a worker which downloads by mistake finds nothing
+    monkeypatch.setenv('STORAGE_PROVIDER', 'none')
+    monkeypatch.setenv('REFRESH_INTERVAL_SECONDS', '86400')
+    from src import showdata
+    monkeypatch.setattr(showdata, '_refresher_lock_file', None)
+    lock_file = open(directory / 'refresher.lock', 'w')
+    fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+    yield lock_file
+    lock_file.close()
+    if showdata._refresher_lock_file is not None:
+        showdata._refresher_lock_file.close()
+
+
+def test_workers_do_not_wait_for_the_refresher(store):
+    from src import load_pages, refresh, refreshes
+    started = time.monotonic()
+    assert load_pages() == 0
+    assert time.monotonic() - started < 1
+    assert not refreshes()
+    assert not refresh()
+
+
+def test_only_the_refresher_schedules_refreshes(store):
+    sys.modules.pop('main', None)
+    main = importlib.import_module('main')
+    try:
+        assert not main.scheduler.running
+        response = main.app.test_client().get('/')
+        assert response.status_code == 503
+        assert main.app.test_client().get('/ready').status_code == 503
+    finally:
+        sys.modules.pop('main', None)
+    # The refresher exited, the worker started in its place takes over
+    store.close()
+    main = importlib.import_module('main')
+    try:
+        assert main.scheduler.running
+    finally:
+        main.scheduler.shutdown(wait=False)
+        sys.modules.pop('main', None)